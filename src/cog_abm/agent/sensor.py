@@ -1,6 +1,7 @@
 from cog_abm.extras.tools import abstract
 from cog_abm.ML.diversity import new_sample_specified_attributes
 from cog_abm.ML.core import normalize_sample_on_nconfig
+from cog_abm.core.environment import ArrayEnvironment, Stimulus
 
 
 class Sensor(object):
@@ -14,15 +15,28 @@ class Sensor(object):
 class SimpleSensor(Sensor):
     """ Just gives back what he got """
 
+    _masked = (None, None)
+
     def __init__(self, mask=None):
         self.mask = mask
 
     def sense(self, item):
         if self.mask is None:
             return item
+        elif item.__class__ is Stimulus:
+            return self._get_masked_env(item.env).stimuli[item.idx]
         else:
             return new_sample_specified_attributes(item, self.mask)
 
+    def _get_masked_env(self, env):
+        """ Keeps masked copy of ArrayEnvironment, so sensed stimuli are
+        still index based handles
+        """
+        if self._masked[0] is not env:
+            mask = [i for i, b in enumerate(self.mask) if b]
+            self._masked = (env, ArrayEnvironment(env.values[:, mask]))
+        return self._masked[1]
+
 
 class NormalizingSensor(object):
 
@@ -1,7 +1,12 @@
 """
 Module implementing agent in our system
 """
-from multiprocessing import Lock
+import os
+import random
+import threading
+from collections import deque
+from itertools import count
+from multiprocessing import current_process
 
 
 class Agent(object):
@@ -10,25 +15,83 @@ class Agent(object):
 
     In most cases you shouldn't change or redefine this class.
     There is special class for that: AgentState
+
+    Agents have no __dict__; interaction results and fitness measures are
+    created on first use. Only last INTER_RES_SIZE interaction results are
+    kept (None - all of them, 0 - none).
+
+    Every process takes ids from its own counter: the one of main process
+    starts after AID, the ones of other processes start at random offsets
+    (at least ID_RANGE, at most 2 ** 63 - ID_RANGE, so ids fit in int64),
+    so agents created in worker processes don't collide with each other
+    even when pids are reused.
     """
+    __slots__ = ("id", "sensor", "state", "env", "_inter_res", "_fitness")
+
     AID = 10 ** 8
-    AID_lock = Lock()
+    ID_RANGE = 2 ** 32
+    INTER_RES_SIZE = None
+
+    _ids = None
+    _ids_pid = None
+    _ids_lock = threading.Lock()
 
     def __init__(self, aid=None, state=None, sensor=None, environment=None):
         self.id = aid or Agent.get_next_id()
         self.sensor = sensor
         self.state = state
         self.env = environment
-        self.inter_res = []
-        self.fitness = {}
+        self._inter_res = None
+        self._fitness = None
 
     @classmethod
     def get_next_id(cls):
-        cls.AID_lock.acquire()
-        cls.AID += 1
-        w = cls.AID
-        cls.AID_lock.release()
-        return w
+        if Agent._ids_pid != os.getpid():
+            Agent._new_id_range()
+        return next(Agent._ids)
+
+    @staticmethod
+    def _new_id_range():
+        with Agent._ids_lock:
+            pid = os.getpid()
+            if Agent._ids_pid == pid:
+                return
+            if Agent._ids_pid is None and \
+                    current_process().name == "MainProcess":
+                start = Agent.AID + 1
+            else:
+                start = random.SystemRandom().randrange(
+                    Agent.ID_RANGE, 2 ** 63 - Agent.ID_RANGE)
+            Agent._ids = count(start)
+            Agent._ids_pid = pid
+
+    def __getstate__(self):
+        return (self.id, self.sensor, self.state, self.env, self._inter_res,
+                self._fitness)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # pickled before agents had __slots__
+            state = (state["id"], state["sensor"], state["state"],
+                     state["env"], state.get("inter_res") or None,
+                     state.get("fitness") or None)
+        self.id, self.sensor, self.state, self.env, inter_res, fitness = state
+        if inter_res is not None and not isinstance(inter_res, deque):
+            inter_res = deque(inter_res, self.INTER_RES_SIZE)
+        self._inter_res = inter_res
+        self._fitness = fitness
+
+    @property
+    def inter_res(self):
+        if self._inter_res is None:
+            self._inter_res = deque(maxlen=self.INTER_RES_SIZE)
+        return self._inter_res
+
+    @property
+    def fitness(self):
+        if self._fitness is None:
+            self._fitness = {}
+        return self._fitness
 
     def set_state(self, state):
         self.state = state
@@ -82,4 +145,5 @@ class Agent(object):
         return hash(self.id)
 
     def add_inter_result(self, res):
-        self.inter_res.append(res)
+        if self.INTER_RES_SIZE != 0:
+            self.inter_res.append(res)
@@ -0,0 +1,297 @@
+"""
+Module with simulation split between many processes (island model).
+
+Nodes of network are split into shards - ranges of node numbers, so
+neighbouring nodes of lattices, rings etc. tend to be in the same shard.
+Every shard is simulated by its own process, interactions take place only
+between agents of the same shard. Every migrate_every iterations agents
+can move along edges between shards - they are sent (pickled) to process
+of target shard.
+"""
+import cPickle
+import logging
+import random
+import traceback
+from multiprocessing import Pipe, Process
+from time import time
+
+import numpy as np
+
+from cog_abm.core.network import Network
+from cog_abm.core.simulation import Simulation, PICKLE_PROTOCOL
+from cog_abm.extras.tools import get_progressbar
+from cog_abm.extras.words_storage import store_classification
+
+log = logging.getLogger('COG-ABM')
+
+
+class ShardSimulation(Simulation):
+    """
+    Simulation of one shard, run in worker process.
+    """
+
+    def __init__(self, network, interaction, agents, topology, lo, hi, env,
+                 migration_prob):
+        """
+        @param network: network with topology of shard only
+        @param topology: topology of whole network
+        @param lo, hi: shard consists of nodes with numbers lo..hi-1
+        @param env: environment of agents (migrants get it too)
+        """
+        self.graph = network
+        self.interaction = interaction
+        self.agents = tuple(agents)
+        self.topology = topology
+        self.lo, self.hi = lo, hi
+        self.env = env
+        self.migration_prob = migration_prob
+        self.rewiring = None
+        self.monitor = None
+        self.iteration = 0
+        self.dump_often = False
+        self.update_pairable()
+
+    def update_pairable(self):
+        """
+        Finds agents which have neighbour agents inside shard (only they
+        can start interactions of two agents).
+
+        @rtype: int
+        @return: Number of such agents (of all agents for interactions of
+        one agent).
+        """
+        if self.interaction.num_agents() != 2:
+            self.pairable = self.agents
+            return len(self.pairable)
+        network = self.graph
+        self.pairable = tuple(a for a in self.agents
+            if any(node in network.nodes
+                   for node in network.graph.neighbors(network.agents[a])))
+        return len(self.pairable)
+
+    def _first_agents(self):
+        return self.pairable
+
+    def emigrants(self):
+        """
+        Every agent with probability migration_prob chooses random node
+        adjacent to its node - if it's in another shard, agent leaves.
+
+        @rtype: list
+        @return: Pairs (agent, name of target node).
+        """
+        leaving = []
+        top, network = self.topology, self.graph
+        for agent in self.agents:
+            if random.random() >= self.migration_prob:
+                continue
+            i = top.index(network.agents[agent])
+            if not top.degree_index(i):
+                continue
+            j = top.random_neighbor_index(i)
+            if not self.lo <= j < self.hi:
+                network.remove_agent(agent)
+                leaving.append((agent, top.names[j]))
+        if leaving:
+            self.agents = tuple(a for a in self.agents
+                                if a in network.agents)
+        return leaving
+
+    def immigrate(self, arriving):
+        for agent, node_name in arriving:
+            agent.env = self.env
+            self.graph.add_agent(agent, node_name)
+        self.agents += tuple(a for a, _ in arriving)
+        return self.update_pairable()
+
+
+def _shard_worker(conn, shard, seed):
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    env = shard.env
+    if env is not None and env.context_buffers is not None:
+        # buffers copied from parent process would repeat its contexts
+        block_size, _ = env._buffer_conf
+        env.use_context_buffer(block_size, seed % 2 ** 32)
+    while True:
+        command, arg = conn.recv()
+        try:
+            if command == "run":
+                shard._do_iterations(arg)
+                result = None
+            elif command == "emigrants":
+                result = shard.emigrants()
+            elif command == "immigrate":
+                result = shard.immigrate(arg)
+            elif command == "snapshot":
+                result = shard.agents
+            elif command == "stop":
+                conn.send(("ok", None))
+                return
+            conn.send(("ok", result))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+
+class ShardedSimulation(object):
+    """
+    Simulation run in many processes, one for each shard of network.
+
+    Results are the same as from Simulation: snapshots (iteration, agents)
+    with all agents sorted by id, taken when all shards have finished
+    given number of iterations (global number of interactions).
+    Iterations between migrations are split among shards in proportion to
+    numbers of their agents which have neighbour agents inside shard (see
+    ShardSimulation.update_pairable). Shards in which no agent has such
+    neighbour at start are rejected (ValueError).
+
+    @attention: Interaction and agents have to be picklable. Rewiring of
+    network isn't supported.
+    """
+
+    def __init__(self, graph, interaction, agents, shards=2,
+                 migrate_every=100, migration_prob=0.01, pb=False,
+                 colour_order=None, seed=None, monitor=None):
+        """
+        @type graph: Network
+        @param shards: number of processes
+        @param migrate_every: iterations between migrations
+        @param migration_prob: probability that agent tries to migrate
+        @param monitor: see Simulation
+        """
+        self.graph = graph
+        self.interaction = interaction
+        self.agents = tuple(agents)
+        self.shards = shards
+        self.migrate_every = migrate_every
+        self.migration_prob = migration_prob
+        self.pb = pb
+        self.colour_order = colour_order
+        self.monitor = monitor
+        self.statistic = []
+        self.dump_often = True
+        self.iteration = 0
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.rng = np.random.RandomState(seed)
+        topology = graph.graph
+        self.bounds = np.linspace(0, len(topology), shards + 1).astype(int)
+        self.env = self.agents[0].env if self.agents else None
+        self.workers = None
+
+    def _shard_of(self, node_name):
+        i = self.graph.graph.index(node_name)
+        return int(np.searchsorted(self.bounds, i, 'right')) - 1
+
+    def _start(self):
+        topology = self.graph.graph
+        placement = [[] for _ in xrange(self.shards)]
+        for agent in self.agents:
+            node_name = self.graph.agents[agent]
+            placement[self._shard_of(node_name)].append((agent, node_name))
+
+        self.workers, self.sizes = [], []
+        for k in xrange(self.shards):
+            lo, hi = self.bounds[k], self.bounds[k + 1]
+            network = Network(topology.subgraph(lo, hi))
+            for agent, node_name in placement[k]:
+                network.add_agent(agent, node_name)
+            shard = ShardSimulation(network, self.interaction,
+                [a for a, _ in placement[k]], topology, lo, hi, self.env,
+                self.migration_prob)
+            if placement[k] and not len(shard.pairable):
+                self._stop()
+                raise ValueError("No agent of shard %d (nodes %d..%d) has "
+                    "neighbours inside it - use fewer shards or other "
+                    "topology" % (k, lo, hi - 1))
+            parent, child = Pipe()
+            process = Process(target=_shard_worker,
+                args=(child, shard, int(self.rng.randint(2 ** 31))))
+            process.daemon = True
+            process.start()
+            self.workers.append((process, parent))
+            self.sizes.append(len(shard.pairable))
+
+    def _call(self, commands):
+        """ Sends (command, argument) to every worker, returns answers
+        """
+        for (_, conn), command in zip(self.workers, commands):
+            conn.send(command)
+        results = []
+        for _, conn in self.workers:
+            status, result = conn.recv()
+            if status != "ok":
+                raise Exception("Shard failed:\n" + result)
+            results.append(result)
+        return results
+
+    def _stop(self):
+        if self.workers is None:
+            return
+        self._call([("stop", None)] * self.shards)
+        for process, _ in self.workers:
+            process.join()
+        self.workers = None
+
+    def _run_iterations(self, num_iter):
+        sizes = np.array(self.sizes, dtype=float)
+        if not sizes.sum():
+            raise Exception("No agent has neighbours inside its shard")
+        split = self.rng.multinomial(num_iter, sizes / sizes.sum())
+        self._call([("run", int(k)) for k in split])
+        self.iteration += num_iter
+
+    def _migrate(self):
+        arriving = [[] for _ in xrange(self.shards)]
+        for leaving in self._call([("emigrants", None)] * self.shards):
+            for agent, node_name in leaving:
+                arriving[self._shard_of(node_name)].append((agent, node_name))
+        self.sizes = self._call([("immigrate", a) for a in arriving])
+
+    def dump_results(self, iter_num):
+        agents = []
+        for part in self._call([("snapshot", None)] * self.shards):
+            agents.extend(part)
+        agents.sort(key=lambda a: a.id)
+        for agent in agents:
+            agent.env = self.env
+        kr = (iter_num, tuple(agents))
+        self.statistic.append(kr)
+        if self.dump_often:
+            with open(str(iter_num) + ".pout", "wb") as f:
+                cPickle.dump(kr, f, PICKLE_PROTOCOL)
+            if self.colour_order:
+                store_classification(agents, self.colour_order,
+                                     str(iter_num))
+        if self.monitor is not None:
+            self.monitor(iter_num, agents)
+
+    def _do_main_loop(self, iterations, dump_freq):
+        start_time = time()
+        log.info("Sharded simulation start...")
+        it = xrange(iterations // dump_freq)
+        if self.pb:
+            it = get_progressbar()(it)
+        for _ in it:
+            left = dump_freq
+            while left > 0:
+                steps = min(left, self.migrate_every -
+                            self.iteration % self.migrate_every)
+                self._run_iterations(steps)
+                left -= steps
+                if self.iteration % self.migrate_every == 0:
+                    self._migrate()
+            self.dump_results(self.iteration)
+        log.info("Simulation end. Total time: " + str(time() - start_time))
+
+    def run(self, iterations=1000, dump_freq=10):
+        """
+        Begins simulation.
+        """
+        self._start()
+        try:
+            self.dump_results(0)
+            self._do_main_loop(iterations, dump_freq)
+        finally:
+            self._stop()
+        return self.statistic
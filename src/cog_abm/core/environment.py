@@ -2,21 +2,79 @@
 Module providing environment and it's functionality
 """
 
-from random import choice, shuffle
-from itertools import imap
+import os
+import json
+import math
+import shutil
+import tempfile
+import random as rnd
+
+from random import choice, random, shuffle
+from itertools import izip
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+from cog_abm.ML.core import Sample, NumericAttribute, euclidean_distance
+from cog_abm.extras.colour_difference import (pairwise,
+    SAMPLE_DISTANCES)
+from cog_abm.extras.sampling import AliasSampler
 
 
 class StimuliChooser(object):
 
+    weights = None
+    sampler = None
+
     def __init__(self, n=None):
         self.n = n
 
+    def set_weights(self, weights):
+        """
+        Sets sampling weights of stimuli.
+
+        @param weights: weight for every stimulus (in the order of stimuli)
+        or None for uniform sampling
+        @type weights: sequence
+        """
+        self.weights = weights
+        self.sampler = None if weights is None else AliasSampler(weights)
+
     def get_stimulus(self, stimuli):
-        return choice(stimuli)
+        if self.sampler is None:
+            return choice(stimuli)
+        return stimuli[self.sampler.sample()]
 
     def get_stimuli(self, stimuli, n=None):
         pass
 
+    def get_indices(self, env, n=None):
+        """
+        Index based version of get_stimuli used by ArrayEnvironment.
+        By default it just takes indices of chosen stimuli.
+        """
+        return [env.index_of(s) for s in self.get_stimuli(env.stimuli, n)]
+
+    def get_indices_block(self, env, n, size, rng=np.random):
+        """
+        Gives (size x n) array of indices - size contexts at once.
+        By default contexts are chosen one by one, subclasses vectorize it.
+
+        @param rng: numpy RandomState used in vectorized implementations
+        """
+        return np.array([self.get_indices(env, n) for _ in xrange(size)],
+            dtype=int).reshape((size, n))
+
+    def _draw_index(self, size):
+        if self.sampler is None:
+            return int(random() * size)
+        return self.sampler.sample()
+
+    def _draw_index_array(self, size, shape, rng):
+        if self.sampler is None:
+            return rng.randint(size, size=shape)
+        return self.sampler.sample_array(shape, rng)
+
 
 class RandomStimuliChooser(StimuliChooser):
 
@@ -29,20 +87,55 @@ class RandomStimuliChooser(StimuliChooser):
         """
         Be careful with this - can take some time when using the distance!
         """
-        n = n or self.n
+        get_stimulus = self.get_stimulus
+        return self._choose(lambda: get_stimulus(stimuli),
+            lambda x, y: x.distance(y), n or self.n)
+
+    def get_indices(self, env, n=None):
+        size = len(env.stimuli)
+        return self._choose(lambda: self._draw_index(size), env.distance,
+            n or self.n)
+
+    def get_indices_block(self, env, n, size, rng=np.random):
+        """
+        Without distance stimuli are just drawn. With distance whole contexts
+        are drawn and those with too close stimuli are rejected - so valid
+        contexts are uniform (or weighted) among all valid contexts.
+        """
+        N = len(env.stimuli)
+        if not self.use_distance:
+            return self._draw_index_array(N, (size, n), rng)
+
+        pairs = [(p, q) for p in xrange(n) for q in xrange(p + 1, n)]
+        ret, got, batch = [], 0, size
+        for _ in xrange(250):
+            cand = self._draw_index_array(N, (batch, n), rng)
+            ok = np.ones(batch, dtype=bool)
+            for p, q in pairs:
+                ok &= env.distances(cand[:, p], cand[:, q]) >= self.distance
+            if ok.any():
+                ret.append(cand[ok])
+                got += ok.sum()
+                if got >= size:
+                    return np.concatenate(ret)[:size]
+            # aim at what is missing, according to acceptance rate so far
+            batch = min(100 * size, int(1.2 * (size - got) * batch /
+                max(ok.sum(), 1)) + 1)
+        raise Exception("Couldn't get samples separated by such distance!")
+
+    def _choose(self, draw, distance, n):
         if not self.use_distance:
-            return [self.get_stimulus(stimuli) for _ in xrange(n)]
+            return [draw() for _ in xrange(n)]
 
-        dist, get_stimulus = self.distance, self.get_stimulus
-        # ^^ abandoning dots - small speed up ..
+        dist = self.distance
         for _ in xrange(250):
-            ret = [get_stimulus(stimuli)]
+            ret = [draw()]
             for _ in xrange(n - 1):
                 mind = 0
                 try_limit = 10
                 while mind < dist and try_limit > 0:
-                    tmp = get_stimulus(stimuli)
-                    mind = min(imap(tmp.distance, ret))
+                    tmp = draw()
+                    mind = min(distance(tmp, r) for r in ret)
                     try_limit -= 1
                 if mind < dist:
                     break
@@ -61,41 +154,190 @@ class OneDifferentClass(StimuliChooser):
     """
     This will return first sample of class different than others.
     This is important if we have binary classification and contex of size 4
+
+    Stimuli are bucketed by class once for a given set of stimuli, so the
+    rest of the context is drawn directly from the other classes instead of
+    being found by rejection.
     """
 
+    _stimuli = None
+
     def __init__(self, n=None):
         self.n = n
 
+    def set_weights(self, weights):
+        super(OneDifferentClass, self).set_weights(weights)
+        self._stimuli = None
+
+    def _bucket(self, stimuli):
+        """ Lays stimuli out grouped by class.
+
+        _ordered - stimuli sorted by class
+        _eligible - (stimulus, (start, end)) for every stimulus whose class
+            doesn't cover whole weight of stimuli (so rest of context can be
+            drawn); (start, end) is range of its class in _ordered
+        """
+        weights = self.weights or [1.] * len(stimuli)
+        buckets = {}
+        for s, w in izip(stimuli, weights):
+            buckets.setdefault(s.get_cls(), []).append((s, w))
+
+        ordered, ordered_weights, ranges = [], [], {}
+        for cls, members in buckets.iteritems():
+            ranges[cls] = (len(ordered), len(ordered) + len(members))
+            ordered.extend(s for s, _ in members)
+            ordered_weights.extend(w for _, w in members)
+
+        total = float(sum(ordered_weights))
+        eligible = [((s, ranges[cls]), w)
+            for cls, members in buckets.iteritems()
+            if total - sum(w for _, w in members) > 0. for s, w in members]
+        if not sum(w for _, w in eligible) > 0.:
+            # no topic can be drawn
+            eligible = []
+
+        self._ordered = ordered
+        self._ordered_weights = ordered_weights
+        self._eligible = [e for e, _ in eligible]
+        self._eligible_sampler = None
+        self._complement_samplers = {}
+        if self.sampler is not None and eligible:
+            self._eligible_sampler = AliasSampler([w for _, w in eligible])
+        self._stimuli, self._stimuli_len = stimuli, len(stimuli)
+
+    def _get_complement_sampler(self, start, end):
+        sampler = self._complement_samplers.get(start)
+        if sampler is None:
+            w = self._ordered_weights
+            sampler = AliasSampler(w[:start] + w[end:])
+            self._complement_samplers[start] = sampler
+        return sampler
+
+    def get_indices_block(self, env, n, size, rng=np.random):
+        if n == 1:
+            return self._draw_index_array(len(env.stimuli), (size, 1), rng)
+
+        stimuli = env.stimuli
+        if stimuli is not self._stimuli or len(stimuli) != self._stimuli_len:
+            self._bucket(stimuli)
+        if not self._eligible:
+            raise Exception("Couldn't get samples in different classes")
+
+        ordered_idx = np.array([env.index_of(s) for s in self._ordered])
+        eligible_idx = np.array([env.index_of(s) for s, _ in self._eligible])
+        starts = np.array([r[0] for _, r in self._eligible])
+        sizes = np.array([r[1] - r[0] for _, r in self._eligible])
+
+        if self._eligible_sampler is None:
+            k = rng.randint(len(eligible_idx), size=size)
+        else:
+            k = self._eligible_sampler.sample_array(size, rng)
+        start, csize = starts[k][:, None], sizes[k][:, None]
+
+        if self._eligible_sampler is None:
+            rest = len(ordered_idx) - csize
+            r = (rng.random_sample((size, n - 1)) * rest).astype(int)
+        else:
+            r = np.empty((size, n - 1), dtype=int)
+            for kk in np.unique(k):
+                rows = np.flatnonzero(k == kk)
+                s, e = self._eligible[kk][1]
+                r[rows] = self._get_complement_sampler(s, e).sample_array(
+                    (len(rows), n - 1), rng)
+        # index in ordered with the range of first's class cut out
+        r += (r >= start) * csize
+
+        ret = np.empty((size, n), dtype=int)
+        ret[:, 0] = eligible_idx[k]
+        ret[:, 1:] = ordered_idx[r]
+        return ret
+
     def get_stimuli(self, stimuli, n=None):
         n = n or self.n
-        for _ in xrange(100):
-            ret = [self.get_stimulus(stimuli)]
-            cls = ret[0].get_cls()
-            for _ in xrange(n - 1):
-                try_limit = 100
-                while try_limit > 0:
-                    tmp = self.get_stimulus(stimuli)
-                    if cls != tmp.get_cls():
-                        break
-                    try_limit -= 1
-                if cls == tmp.get_cls():
-                    break
-                ret.append(tmp)
-            if len(ret) == n:
-                return ret
-        raise Exception("Couldn't get samples in different classes")
+        if n == 1:
+            return [self.get_stimulus(stimuli)]
+
+        if stimuli is not self._stimuli or len(stimuli) != self._stimuli_len:
+            self._bucket(stimuli)
+        if not self._eligible:
+            raise Exception("Couldn't get samples in different classes")
+
+        if self._eligible_sampler is None:
+            first, (start, end) = choice(self._eligible)
+        else:
+            first, (start, end) = \
+                self._eligible[self._eligible_sampler.sample()]
+
+        ordered, size = self._ordered, end - start
+        rest = len(ordered) - size
+        if self._eligible_sampler is None:
+            draw = lambda: int(random() * rest)
+        else:
+            draw = self._get_complement_sampler(start, end).sample
+        ret = [first]
+        for _ in xrange(n - 1):
+            # index in ordered with the range of first's class cut out
+            i = draw()
+            if i >= start:
+                i += size
+            ret.append(ordered[i])
+        return ret
 
     def __repr__(self):
         return "OneDifferentClass"
 
 
+class ContextBuffer(object):
+    """
+    Contexts of one size generated in blocks and handed out one by one.
+
+    Blocks come from chooser's get_indices_block (vectorized where the
+    chooser supports it) and are refilled lazily when the buffer runs out.
+    """
+
+    DEF_BLOCK_SIZE = 1000
+
+    def __init__(self, env, n, block_size=None, seed=None):
+        self.env = env
+        self.n = n
+        self.block_size = block_size or ContextBuffer.DEF_BLOCK_SIZE
+        if seed is None:
+            seed = rnd.getrandbits(32)
+        self.rng = np.random.RandomState(seed)
+        self.block = None
+        self.pos = 0
+
+    def refill(self):
+        self.block = self.env.stimuli_chooser.get_indices_block(self.env,
+            self.n, self.block_size, self.rng).tolist()
+        self.pos = 0
+
+    def get_indices(self):
+        if self.block is None or self.pos == len(self.block):
+            self.refill()
+        self.pos += 1
+        return self.block[self.pos - 1]
+
+    def get_context(self):
+        """ Gives new list of stimuli
+        """
+        stimuli = self.env.stimuli
+        return [stimuli[i] for i in self.get_indices()]
+
+
 class Environment(object):
     """
     Basic class for stimuli.
     It's main function is to provide stimuli for agents
     """
 
-    def __init__(self, stimuli, stimuli_chooser=None, colour_order=None):
+    weights = None
+    context_buffers = None
+    _index = (None, None)
+    _values = None
+
+    def __init__(self, stimuli, stimuli_chooser=None, colour_order=None,
+                 weights=None):
         """
         Initialize environment
 
@@ -103,10 +345,27 @@ class Environment(object):
         @type stimuli: sequence
         @param colour_order: list of distinct stimuli in order of saving to a file (if needed)
         @type colour_order: sequence
+        @param weights: sampling weights of stimuli - sequence in the order
+        of stimuli or function stimulus -> weight; None means uniform
+        @type weights: sequence or function
         """
         self.stimuli = stimuli
         self.stimuli_chooser = stimuli_chooser or RandomStimuliChooser(1)
         self.colour_order = colour_order
+        if weights is not None:
+            self.set_weights(weights)
+
+    def set_weights(self, weights):
+        """
+        Sets how often each stimulus is chosen.
+
+        @param weights: sequence in the order of stimuli or function
+        stimulus -> weight
+        """
+        if callable(weights):
+            weights = [weights(s) for s in self.stimuli]
+        self.weights = weights
+        self.stimuli_chooser.set_weights(weights)
 
     def get_stimulus(self):
         """
@@ -127,4 +386,382 @@ class Environment(object):
         return self.stimuli
 
     def get_stimuli(self, n):
+        if self.context_buffers is not None:
+            return self._get_context_buffer(n).get_context()
         return self.stimuli_chooser.get_stimuli(self.stimuli, n)
+
+    def use_context_buffer(self, block_size=ContextBuffer.DEF_BLOCK_SIZE,
+                           seed=None):
+        """
+        Makes get_stimuli hand out contexts pre-generated in blocks.
+
+        @param block_size: how many contexts are generated at once
+        @param seed: seed of numpy generator used for contexts; by default
+        it's taken from random module, so seeding it is enough
+        """
+        self.context_buffers = {}
+        self._buffer_conf = (block_size, seed)
+
+    def _get_context_buffer(self, n):
+        buff = self.context_buffers.get(n)
+        if buff is None:
+            block_size, seed = self._buffer_conf
+            buff = ContextBuffer(self, n, block_size, seed)
+            self.context_buffers[n] = buff
+        return buff
+
+    def index_of(self, stimulus):
+        """
+        Gives position of given stimulus in the environment
+        """
+        owner, index = self._index
+        if owner != id(self.stimuli):
+            index = dict((id(s), i) for i, s in enumerate(self.stimuli))
+            self._index = (id(self.stimuli), index)
+        return index[id(stimulus)]
+
+    def get_values_array(self):
+        """
+        Gives (N x d) array with values of all stimuli
+        """
+        return np.array([s.get_values() for s in self.stimuli], dtype=float)
+
+    def distances(self, i, j):
+        """
+        Gives distances between stimuli with indices from arrays i and j
+
+        @type i, j: arrays of ints of the same shape
+        """
+        values = self._get_cached_values()
+        d = values[i] - values[j]
+        return np.sqrt((d * d).sum(axis=-1))
+
+    def _get_cached_values(self):
+        if self._values is None or len(self._values) != len(self.stimuli):
+            self._values = self.get_values_array()
+        return self._values
+
+
+class Stimulus(object):
+    """
+    Lightweight handle of a stimulus kept in ArrayEnvironment.
+
+    Values are stored in the environment's array, handle knows only its
+    index. There is exactly one handle for every index, so equality is
+    identity and hash is computed once.
+    It can be used wherever Sample is expected.
+    """
+
+    __slots__ = ('env', 'idx', '_hash')
+
+    cls = None
+    cls_meta = None
+
+    def __init__(self, env, idx):
+        self.env = env
+        self.idx = idx
+        self._hash = hash(idx)
+
+    @property
+    def values(self):
+        return self.env.values[self.idx].tolist()
+
+    @property
+    def meta(self):
+        return self.env.meta
+
+    @property
+    def dist_fun(self):
+        return self.env.dist_fun
+
+    def get_cls(self):
+        classes = self.env.classes
+        if classes is None:
+            return None
+        return classes[self.idx]
+
+    def get_values(self):
+        return self.env.values[self.idx].tolist()
+
+    def distance(self, other):
+        if other.__class__ is Stimulus and other.env is self.env:
+            return self.env.distance(self.idx, other.idx)
+        return self.env.dist_fun(self, other)
+
+    def copy_basic(self):
+        return Sample(self.get_values(), self.meta, dist_fun=self.dist_fun)
+
+    def copy_full(self):
+        return self.copy_basic()
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (Stimulus, (self.env, self.idx))
+
+    def __deepcopy__(self, memo):
+        # handles are immutable and shared with the environment
+        return self
+
+    def __str__(self):
+        return "({0}, {1})".format(str(self.get_values()), self.get_cls())
+
+    def __repr__(self):
+        return str(self)
+
+
+class ArrayEnvironment(Environment):
+    """
+    Environment keeping values of all stimuli in one (N x d) float array.
+
+    Stimuli are given out as Stimulus handles, and choosers work on indices.
+    Environment is treated as immutable - it is shared (not copied) when
+    agents are deep-copied.
+
+    Values and pairwise distance table can be published to a directory of
+    .npy files and attached (memory mapped, read only) by other processes.
+    Directory may also keep description of source of environment (e.g. file
+    and its checksum), so environment published from other source isn't
+    attached by mistake.
+
+    With colour difference metric other than Euclidean (see
+    cog_abm.extras.colour_difference) table of distances is always
+    computed, so metric is evaluated only once for every pair of stimuli.
+    """
+
+    distance_table = None
+    shared_path = None
+    metric = None
+    classes = None
+    dist_fun = staticmethod(euclidean_distance)
+
+    VALUES_FILE = "values.npy"
+    DISTANCES_FILE = "distances.npy"
+    WEIGHTS_FILE = "weights.npy"
+    METRIC_FILE = "metric.txt"
+    SOURCE_FILE = "source.json"
+    CLASSES_FILE = "classes.json"
+
+    def __init__(self, values, stimuli_chooser=None, colour_order=None,
+                 weights=None, distance_table=None, metric=None,
+                 classes=None):
+        """
+        Initialize environment
+
+        @param values: values of stimuli, one row per stimulus
+        @type values: (N x d) array or sequence of sequences
+        @param colour_order: list of indices of stimuli in order of saving
+        to a file (if needed)
+        @type colour_order: sequence
+        @param distance_table: (N x N) array of distances between stimuli
+        @param metric: name of colour difference metric (e.g. "CIEDE2000",
+        see cog_abm.extras.colour_difference.SAMPLE_DISTANCES), Euclidean
+        distance is used by default; functions aren't accepted
+        @type metric: String
+        @param classes: class of every stimulus (see Stimulus.get_cls), e.g.
+        for OneDifferentClass chooser
+        @type classes: list
+        """
+        self.values = np.asarray(values, dtype=float)
+        if classes is not None:
+            if len(classes) != len(self.values):
+                raise ValueError("Number of classes doesn't match number "
+                                 "of stimuli")
+            self.classes = list(classes)
+        self.meta = [NumericAttribute() for _ in xrange(self.values.shape[1])]
+        self.distance_table = distance_table
+        if metric is not None:
+            if callable(metric) or metric not in SAMPLE_DISTANCES:
+                # name is published and pickled instead of function
+                raise ValueError("Unknown colour difference metric: %s "
+                    "(only names of metrics are accepted)" % (metric,))
+            self.metric = metric
+            self.dist_fun = SAMPLE_DISTANCES[metric]
+            self.compute_distance_table()
+        stimuli = [Stimulus(self, i) for i in xrange(len(self.values))]
+        if colour_order is not None:
+            colour_order = [stimuli[i] for i in colour_order]
+        super(ArrayEnvironment, self).__init__(stimuli, stimuli_chooser,
+            colour_order, weights)
+
+    @classmethod
+    def from_environment(cls, env, metric=None):
+        """
+        Converts environment of samples (e.g. Colors) to ArrayEnvironment
+        with the same chooser, weights, colour order, classes of samples and
+        context buffering.
+        """
+        values = env.get_values_array()
+        colour_order = None
+        if env.colour_order is not None:
+            colour_order = [env.index_of(s) for s in env.colour_order]
+        classes = [s.get_cls() for s in env.stimuli]
+        if all(c is None for c in classes):
+            classes = None
+        new = cls(values, env.stimuli_chooser, colour_order, env.weights,
+                  metric=metric, classes=classes)
+        if env.context_buffers is not None:
+            new.use_context_buffer(*env._buffer_conf)
+        return new
+
+    def compute_distance_table(self):
+        """ Computes (if it's not there) table of distances between all
+        stimuli, which is then used by distance and distances
+        """
+        if self.distance_table is None:
+            if self.metric is None:
+                self.distance_table = cdist(self.values, self.values)
+            else:
+                self.distance_table = pairwise(self.metric, self.values)
+        return self.distance_table
+
+    def distance(self, i, j):
+        """ Distance between stimuli with indices i and j
+        """
+        if self.distance_table is not None:
+            return self.distance_table[i, j]
+        d = self.values[i] - self.values[j]
+        return math.sqrt(d.dot(d))
+
+    def distances(self, i, j):
+        if self.distance_table is not None:
+            return self.distance_table[i, j]
+        return super(ArrayEnvironment, self).distances(i, j)
+
+    def get_stimuli(self, n):
+        stimuli = self.stimuli
+        if self.context_buffers is not None:
+            indices = self._get_context_buffer(n).get_indices()
+        else:
+            indices = self.stimuli_chooser.get_indices(self, n)
+        return [stimuli[i] for i in indices]
+
+    def index_of(self, stimulus):
+        return stimulus.idx
+
+    def get_values_array(self):
+        return self.values
+
+    def _get_cached_values(self):
+        return self.values
+
+    def publish(self, path, source=None):
+        """
+        Saves values, distance table (computed if needed) and weights to
+        directory path, so that other processes can attach them.
+        Directory appears atomically - if it already exists nothing is done
+        (if source is given it is checked, see check_source).
+
+        @param source: description of source of environment (JSON
+        serializable dictionary)
+        """
+        if self.is_published(path):
+            self.check_source(path, source)
+            return
+        parent = os.path.dirname(os.path.abspath(path))
+        tmp = tempfile.mkdtemp(prefix=".publish_", dir=parent)
+        try:
+            np.save(os.path.join(tmp, self.VALUES_FILE), self.values)
+            np.save(os.path.join(tmp, self.DISTANCES_FILE),
+                    self.compute_distance_table())
+            if self.weights is not None:
+                np.save(os.path.join(tmp, self.WEIGHTS_FILE),
+                        np.asarray(self.weights, dtype=float))
+            if self.metric is not None:
+                with open(os.path.join(tmp, self.METRIC_FILE), "w") as f:
+                    f.write(self.metric)
+            if source is not None:
+                with open(os.path.join(tmp, self.SOURCE_FILE), "w") as f:
+                    json.dump(source, f, sort_keys=True)
+            if self.classes is not None:
+                with open(os.path.join(tmp, self.CLASSES_FILE), "w") as f:
+                    json.dump(self.classes, f)
+            os.rename(tmp, path)
+        except OSError:
+            # somebody else published it first
+            if not self.is_published(path):
+                raise
+            self.check_source(path, source)
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+        self.shared_path = path
+
+    @classmethod
+    def is_published(cls, path):
+        return os.path.exists(os.path.join(path, cls.VALUES_FILE))
+
+    @classmethod
+    def check_source(cls, path, source):
+        """
+        Raises ValueError if environment in path was published from other
+        source than given one (or its source isn't known). Only items of
+        source are compared, so e.g. checksum of file which doesn't exist
+        anymore can be left out.
+        """
+        if source is None:
+            return
+        published = None
+        if os.path.exists(os.path.join(path, cls.SOURCE_FILE)):
+            with open(os.path.join(path, cls.SOURCE_FILE)) as f:
+                published = json.load(f)
+        if published is None:
+            raise ValueError("Environment in %s has unknown source" % path)
+        for key, value in source.iteritems():
+            if published.get(key) != value:
+                raise ValueError("Environment in %s was published from other "
+                    "source (%s: %s instead of %s)" % (path, key,
+                    published.get(key), value))
+
+    @classmethod
+    def attach(cls, path, stimuli_chooser=None, colour_order=None,
+               source=None):
+        """
+        Creates environment on memory mapped (read only, not copied) data
+        published by publish.
+
+        @param source: expected source of environment, see check_source
+        """
+        cls.check_source(path, source)
+        load = lambda f: np.load(os.path.join(path, f), mmap_mode='r')
+        weights = None
+        if os.path.exists(os.path.join(path, cls.WEIGHTS_FILE)):
+            weights = load(cls.WEIGHTS_FILE).tolist()
+        metric = None
+        if os.path.exists(os.path.join(path, cls.METRIC_FILE)):
+            with open(os.path.join(path, cls.METRIC_FILE)) as f:
+                metric = f.read().strip()
+        classes = None
+        if os.path.exists(os.path.join(path, cls.CLASSES_FILE)):
+            with open(os.path.join(path, cls.CLASSES_FILE)) as f:
+                classes = json.load(f)
+        env = cls(load(cls.VALUES_FILE), stimuli_chooser, colour_order,
+            weights, load(cls.DISTANCES_FILE), metric, classes)
+        env.shared_path = path
+        return env
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # table is big and can be recomputed or attached again
+        state.pop('distance_table', None)
+        if isinstance(self.values, np.memmap):
+            state['values'] = np.array(self.values)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.shared_path is not None and self.is_published(self.shared_path):
+            self.distance_table = np.load(os.path.join(self.shared_path,
+                self.DISTANCES_FILE), mmap_mode='r')
+        elif self.metric is not None:
+            self.compute_distance_table()
+
+    def __deepcopy__(self, memo):
+        return self
@@ -3,6 +3,10 @@ Module represents agent allocation in cognitive system.
 """
 from random import choice
 
+import numpy as np
+
+from cog_abm.core.topology import Topology, CSRTopology, DynamicTopology
+
 
 class Node(object):
     """
@@ -63,24 +67,27 @@ class Network(object):
 
     Network is a class that describes geographical allocation of agent sets.
 
-    @attention: Network class uses graph from pygraph library.
+    @attention: Adjacency of nodes is kept in Topology (see
+    cog_abm.core.topology), graphs from pygraph library are converted.
 
     @sort: __init__, __len__, add_agent, get_neighbour_nodes,
     get_random_neighbour, get_random_neighbours
     """
 
-    def __init__(self, pygraph):
+    def __init__(self, graph):
         """
-        Initialize network with given graph from pygraph library.
+        Initialize network with given topology or graph from pygraph library.
 
-        @type graph: graph
+        @type graph: Topology or graph
         @param graph: Initializing graph.
         """
-        self.nodes = {}  # dictionary node_name -> node
+        # dictionary node_name -> node, nodes are created when first agent
+        # is added to them
+        self.nodes = {}
         self.agents = {}  # dictionary agent -> node_name
-        self.graph = pygraph
-        for node in self.graph.nodes():
-            self.nodes[node] = Node(node)
+        if not isinstance(graph, Topology):
+            graph = CSRTopology.from_pygraph(graph)
+        self.graph = graph
 
     def __len__(self):
         """
@@ -89,7 +96,14 @@ class Network(object):
         @rtype: number
         @return: Number of nodes.
         """
-        return len(self.nodes)
+        return len(self.graph)
+
+    def has_node(self, node_name):
+        try:
+            self.graph.index(node_name)
+        except KeyError:
+            return False
+        return True
 
     #UNCOMMENT jezeli zmieniamy ze agent moze nalezec do kilku wezlow
     # wtedy moze pojawic sie problem ze slownikiem ?
@@ -125,13 +139,51 @@ class Network(object):
         @type node_name: string
         @param node_name_list: Name of node that agent has to be assigned to.
         """
-        self.nodes[node_name].add_agent(agent)
+        node = self.nodes.get(node_name)
+        if node is None:
+            if not self.has_node(node_name):
+                raise KeyError(node_name)
+            node = self.nodes[node_name] = Node(node_name)
+        node.add_agent(agent)
 
         if (agent_name is None):
             self.agents[agent] = node_name
         else:
             self.agents[agent_name] = node_name
 
+    def move_agent(self, agent, node_name, agent_name=None):
+        """
+        Move agent to another node of network.
+
+        @type node_name: string
+        @param node_name: Name of node that agent has to be moved to.
+        """
+        self.remove_agent(agent, agent_name)
+        self.add_agent(agent, node_name, agent_name)
+
+    def remove_agent(self, agent, agent_name=None):
+        """
+        Remove agent from the network.
+
+        @rtype: String
+        @return: Name of node where agent was.
+        """
+        node_name = self.agents.pop(agent if agent_name is None
+                                    else agent_name)
+        node = self.nodes[node_name]
+        node.agents.remove(agent)
+        if not node.agents:
+            del self.nodes[node_name]
+        return node_name
+
+    def make_dynamic(self):
+        """
+        Change topology to DynamicTopology (if it isn't), so edges can be
+        added and removed during simulation.
+        """
+        if not isinstance(self.graph, DynamicTopology):
+            self.graph = DynamicTopology.from_topology(self.graph)
+
     def get_neighbour_nodes(self, node_name):
         """
         Return list of node names that are adjacent to the given node.
@@ -162,8 +214,9 @@ class Network(object):
 
         @attention: This function does not return random set of agents from all
         adjacent agents. Adjacent node (to the agent node) will be chosen
-        randomly from set of adjacent nodes. All agents assigned to this node
-        will be returned.
+        randomly from set of adjacent nodes (with probability proportional to
+        weight of edge, if topology has weighted edges). All agents assigned
+        to this node will be returned.
 
         @type agent: String
         @param agent: Agent asking for neighbours.
@@ -175,5 +228,49 @@ class Network(object):
         #choice nie dziala na pustym zbiorze
         #jezeli wylosowany wezel pusty ...
         agent_node_name = self.agents[agent_name]
-        node_name = choice(self.get_neighbour_nodes(agent_node_name))
-        return self.nodes[node_name].get_agents()
+        node_name = self.graph.random_neighbor(agent_node_name)
+        node = self.nodes.get(node_name)
+        if node is None:
+            return []
+        return node.get_agents()
+
+    def get_random_neighbour_batch(self, agent_names, rng=np.random):
+        """
+        Return randomly chosen neighbour agent for every given agent.
+        Neighbour nodes are drawn at once (see get_random_neighbour), empty
+        ones (all their agents moved away) are drawn again.
+
+        @type agent_names: list
+        @param agent_names: Agents asking for neighbours.
+
+        @rtype: list
+        @return: Neighbour agent for every given agent.
+
+        @raise ValueError: some agent has no neighbour agents at all
+        """
+        graph = self.graph
+        nodes = np.fromiter((graph.index(self.agents[a])
+            for a in agent_names), np.int64, len(agent_names))
+        names = graph.names
+        res = [None] * len(nodes)
+        pending = np.arange(len(nodes))
+        checked = False
+        while len(pending):
+            missed = []
+            for k, j in zip(pending,
+                            graph.random_neighbors_index(nodes[pending], rng)):
+                node = self.nodes.get(names[j])
+                if node is None:
+                    missed.append(k)
+                else:
+                    res[k] = choice(node.agents)
+            if missed and not checked:
+                # only agents which missed first time can miss again
+                for k in missed:
+                    if not any(names[j] in self.nodes
+                               for j in graph.neighbors_index(nodes[k])):
+                        raise ValueError("Agent %s has no neighbour agents"
+                                         % agent_names[k])
+                checked = True
+            pending = np.array(missed, dtype=np.int64)
+        return res
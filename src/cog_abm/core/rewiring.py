@@ -0,0 +1,86 @@
+"""
+Module with random changes of network during simulation.
+"""
+import random
+
+import numpy as np
+
+
+class Rewiring(object):
+    """
+    Batch of random events applied to network every `every` iterations:
+        - every edge disappears with probability remove_prob,
+        - on average add_rate new edges between random nodes appear,
+        - every agent moves with probability move_prob to random node
+        adjacent to its node.
+    Work done is proportional to number of changes (topology of network is
+    turned into DynamicTopology).
+    """
+
+    MAX_TRIES = 100
+
+    def __init__(self, every, remove_prob=0., add_rate=0., move_prob=0.,
+                 seed=None):
+        """
+        @param seed: seed of numpy RandomState used for events, by default
+        it is taken from random module
+        """
+        if every < 1:
+            raise ValueError("Rewiring should be applied at least every "
+                             "iteration")
+        self.every = every
+        self.remove_prob = remove_prob
+        self.add_rate = add_rate
+        self.move_prob = move_prob
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.rng = np.random.RandomState(seed)
+
+    def prepare(self, network):
+        network.make_dynamic()
+
+    def apply(self, network, agents):
+        """
+        Applies one batch of events and increases version of topology.
+
+        @param agents: agents which can move (chosen with replacement)
+        @type agents: sequence
+
+        @rtype: tuple
+        @return: (removed edges, added edges, moves)
+        """
+        top, rng = network.graph, self.rng
+
+        removed = 0
+        if self.remove_prob > 0. and top.num_edges():
+            removed = rng.binomial(top.num_edges(), self.remove_prob)
+            for _ in xrange(removed):
+                i, j = top.edge_list[rng.randint(top.num_edges())]
+                top.remove_edge_index(i, j)
+
+        added = 0
+        if self.add_rate > 0. and top.n > 1:
+            for _ in xrange(rng.poisson(self.add_rate)):
+                for _ in xrange(self.MAX_TRIES):
+                    i, j = rng.randint(top.n, size=2)
+                    if top.add_edge_index(int(i), int(j)):
+                        added += 1
+                        break
+
+        moved = 0
+        if self.move_prob > 0. and agents:
+            num = rng.binomial(len(agents), self.move_prob)
+            for k in rng.randint(len(agents), size=num):
+                agent = agents[k]
+                i = top.index(network.agents[agent])
+                if top.degree_index(i):
+                    j = top.random_neighbors_index([i], rng)[0]
+                    network.move_agent(agent, top.names[j])
+                    moved += 1
+
+        top.version += 1
+        return removed, added, moved
+
+    def __repr__(self):
+        return "Rewiring(%s, %s, %s, %s)" % (self.every, self.remove_prob,
+                                             self.add_rate, self.move_prob)
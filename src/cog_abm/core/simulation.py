@@ -7,24 +7,52 @@ from time import time
 import copy
 import cPickle
 from ..extras.tools import get_progressbar
-from ..extras.words_storage import store_words
+from ..extras.words_storage import store_classification
 
 log = logging.getLogger('COG-ABM')
 
 PICKLE_PROTOCOL = cPickle.HIGHEST_PROTOCOL
 
 
+class Snapshot(tuple):
+    """
+    (iteration, agents) dumped by simulation, it unpacks like a pair.
+    topology_version is version of dynamic topology at that moment (see
+    cog_abm.core.rewiring), None if topology doesn't change.
+    """
+
+    def __new__(cls, iteration, agents, topology_version=None):
+        self = tuple.__new__(cls, (iteration, agents))
+        self.topology_version = topology_version
+        return self
+
+    def __reduce__(self):
+        return (Snapshot, (self[0], self[1], self.topology_version))
+
+
 class Simulation(object):
     """
     This class defines what happens and when.
     """
 
+    MAX_CHOOSE_TRIES = 1000
+
     def __init__(self, graph=None, interaction=None, agents=None, pb=False, 
-                 colour_order=None):
+                 colour_order=None, rewiring=None, monitor=None):
         ''' pb - show progress bar
             colour_order - list of colours in the order used when storing agents words
+            rewiring - changes of network applied every few iterations
+            (see cog_abm.core.rewiring)
+            monitor - function(iteration, agents) called whenever results
+            are dumped
         '''
         self.graph = graph
+        self.monitor = monitor
+        self.rewiring = rewiring
+        self.iteration = 0
+        self.topology_history = []  # (iteration, version of topology)
+        if rewiring is not None:
+            rewiring.prepare(graph)
         self.interaction = interaction
         self.agents = tuple(agents)
         self.statistic = []
@@ -36,20 +64,51 @@ class Simulation(object):
     def dump_results(self, iter_num):
         cc = copy.deepcopy(self.agents)
         #cc = [a.deepcopy() for a in self.agents]
-        kr = (iter_num, cc)
+        version = None
+        if self.rewiring is not None:
+            version = self.graph.graph.version
+        kr = Snapshot(iter_num, cc, version)
         self.statistic.append(kr)
         if self.dump_often:
             f = open(str(iter_num) + ".pout", "wb")
             cPickle.dump(kr, f, PICKLE_PROTOCOL)
             f.close()
             if self.colour_order:
-                store_words(self.agents, self.colour_order, str(iter_num)+"words.pout")
+                store_classification(self.agents, self.colour_order,
+                                     str(iter_num))
+        if self.rewiring is not None:
+            self.dump_topology(iter_num)
+        if self.monitor is not None:
+            self.monitor(iter_num, self.agents)
+
+    def dump_topology(self, iter_num):
+        top = self.graph.graph
+        self.topology_history.append((iter_num, top.version))
+        if self.dump_often:
+            nodes = self.graph.agents
+            kr = {"version": top.version, "edges": top.edges_array(),
+                  "nodes": [(a.id, nodes[a]) for a in self.agents]}
+            with open(str(iter_num) + "topology.pout", "wb") as f:
+                cPickle.dump(kr, f, PICKLE_PROTOCOL)
+
+    def _first_agents(self):
+        """ Agents which can start interaction of two agents
+        """
+        return self.agents
 
     def _choose_agents(self):
         if self.interaction.num_agents() == 2:
-            a = random.choice(self.agents)
-            b = self.graph.get_random_neighbour(a)
-            return [a, b]
+            first = self._first_agents()
+            for _ in xrange(self.MAX_CHOOSE_TRIES):
+                a = random.choice(first)
+                if not self.graph.graph.degree(self.graph.agents[a]):
+                    # isolated node (e.g. after rewiring)
+                    continue
+                # neighbour node is empty if all its agents moved away
+                neighbours = self.graph.get_random_neighbours(a)
+                if neighbours:
+                    return [a, random.choice(neighbours)]
+            raise Exception("Couldn't find agent with neighbours")
         else:
             return [random.choice(self.agents)]
 
@@ -60,9 +119,19 @@ class Simulation(object):
 #                       a.add_inter_result(r)
 
     def _do_iterations(self, num_iter):
-        for _ in xrange(num_iter):
-            agents = self._choose_agents()
-            self._start_interaction(agents)
+        while num_iter > 0:
+            steps = num_iter
+            if self.rewiring is not None:
+                every = self.rewiring.every
+                steps = min(steps, every - self.iteration % every)
+            for _ in xrange(steps):
+                agents = self._choose_agents()
+                self._start_interaction(agents)
+            self.iteration += steps
+            num_iter -= steps
+            if self.rewiring is not None and \
+                    self.iteration % self.rewiring.every == 0:
+                self.rewiring.apply(self.graph, self.agents)
 
     def _do_main_loop(self, iterations, dump_freq):
         start_time = time()
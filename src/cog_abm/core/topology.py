@@ -0,0 +1,499 @@
+"""
+Module with compact representations of network topology.
+
+Nodes are numbered 0..n-1 internally, names given by user (e.g. ids from
+pygraph markup file) are mapped to these numbers.
+"""
+from random import random
+from xml.dom.minidom import parse, parseString
+
+import numpy as np
+
+from cog_abm.extras.sampling import alias_table
+
+
+def unique_edges_index(edges, directed=False):
+    """
+    Positions of first occurrences of edges (for undirected graphs edge
+    given in both directions is the same edge, pygraph markup files contain
+    them this way).
+
+    @param edges: (m x 2) array of pairs of node numbers
+    """
+    if not directed:
+        edges = np.sort(edges, axis=1)
+    if not len(edges):
+        return np.zeros(0, dtype=np.int64)
+    keys = edges[:, 0] * (edges.max() + 1) + edges[:, 1]
+    _, first = np.unique(keys, return_index=True)
+    return np.sort(first)
+
+
+def unique_edges(edges, directed=False):
+    """ Removes repeated edges (see unique_edges_index)
+    """
+    return edges[unique_edges_index(edges, directed)]
+
+
+class Topology(object):
+    """
+    Base class for topologies.
+
+    Topology knows node names (names) and gives neighbours of nodes.
+    Methods with _index suffix work on node numbers instead of names.
+    If names aren't given, nodes are named with their numbers.
+    """
+
+    directed = False
+    _index = None
+
+    def __len__(self):
+        return self.n
+
+    def _set_names(self, names):
+        if names is None:
+            self.names = xrange(self.n)
+            return
+        self.names = list(names)
+        if len(self.names) != self.n:
+            raise ValueError("Number of names differs from number of nodes")
+        self._index = dict((name, i) for i, name in enumerate(self.names))
+
+    def nodes(self):
+        """
+        @rtype: list
+        @return: Names of all nodes.
+        """
+        return list(self.names)
+
+    def index(self, name):
+        """ Number of node with given name
+        """
+        if self._index is None:
+            if not 0 <= name < self.n:
+                raise KeyError(name)
+            return name
+        return self._index[name]
+
+    def neighbors(self, name):
+        """
+        @rtype: list
+        @return: Names of nodes adjacent to the given one.
+        """
+        names = self.names
+        return [names[j] for j in self.neighbors_index(self.index(name))]
+
+    def random_neighbor(self, name):
+        """ Randomly (uniformly) chosen neighbour of given node
+        """
+        return self.names[self.random_neighbor_index(self.index(name))]
+
+    def degree(self, name):
+        return self.degree_index(self.index(name))
+
+    def _names_range(self, lo, hi):
+        return [self.names[i] for i in xrange(lo, hi)]
+
+    def subgraph(self, lo, hi):
+        """
+        Subgraph induced by nodes with numbers lo..hi-1 (names are kept).
+
+        @rtype: Topology
+        """
+        edges = np.array([(i, int(j)) for i in xrange(lo, hi)
+                          for j in self.neighbors_index(i) if lo <= j < hi],
+                         dtype=np.int64).reshape(-1, 2)
+        # edges of undirected graphs are already given in both directions
+        topology = CSRTopology.from_edges(self._names_range(lo, hi),
+                                          edges - lo, directed=True)
+        topology.directed = self.directed
+        return topology
+
+
+class CSRTopology(Topology):
+    """
+    Topology kept as adjacency in compressed sparse row form: neighbours of
+    node i are indices[indptr[i]:indptr[i + 1]].
+
+    Undirected edges are stored in both directions.
+
+    Edges can have weights (aligned with indices), then neighbours are
+    drawn with probability proportional to weight of edge leading to them,
+    using alias tables of all nodes (also aligned with indices) built once.
+    """
+
+    weights = None
+
+    def __init__(self, indptr, indices, names=None, directed=False,
+                 weights=None):
+        """
+        @param indptr: array of length n + 1
+        @param indices: array with neighbours of all nodes
+        @param names: names of nodes, 0..n-1 by default
+        @type names: sequence
+        @param weights: non negative weights of edges, aligned with indices
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.n = len(self.indptr) - 1
+        self.directed = directed
+        if weights is not None:
+            self.set_weights(weights)
+        self._set_names(names)
+
+    def set_weights(self, weights):
+        """
+        Sets weights of edges (aligned with indices) and builds alias
+        tables: entry k of neighbours of node i is taken with probability
+        alias_prob[k], otherwise entry indptr[i] + alias[k] is taken.
+        Nodes with all edges of weight 0 choose neighbours uniformly.
+        """
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != self.indices.shape:
+            raise ValueError("Weights should be aligned with indices")
+        self.weights = weights
+        self.alias_prob = np.ones(len(weights))
+        self.alias = np.zeros(len(weights), dtype=np.int32)
+        for i in xrange(self.n):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            if weights[start:end].sum() > 0.:
+                prob, alias = alias_table(weights[start:end])
+                self.alias_prob[start:end] = prob
+                self.alias[start:end] = alias
+
+    @classmethod
+    def from_edges(cls, names, edges, directed=False, weights=None):
+        """
+        Builds topology from array of edges in O(edges) time and memory.
+
+        @param names: number of nodes or sequence of their names
+        @param edges: (m x 2) array of pairs of node numbers
+        @param weights: weights of edges (optional)
+        """
+        if isinstance(names, (int, long)):
+            n, names = names, None
+        else:
+            n = len(names)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        src, dst = edges[:, 0], edges[:, 1]
+        if not directed:
+            src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+            if weights is not None:
+                weights = np.concatenate((weights, weights))
+        if len(src) and (min(src.min(), dst.min()) < 0 or
+                         max(src.max(), dst.max()) >= n):
+            raise ValueError("Edge refers to non existing node")
+        order = np.argsort(src, kind='mergesort')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)[order]
+        return cls(indptr, dst[order], names, directed, weights)
+
+    @classmethod
+    def from_pygraph(cls, graph):
+        """ Converts graph (or digraph) from pygraph library
+        """
+        names = graph.nodes()
+        index = dict((name, i) for i, name in enumerate(names))
+        edges = [(u, v) for u in names for v in graph.neighbors(u)]
+        weights = [graph.edge_weight(e) for e in edges]
+        if len(set(weights)) < 2:
+            weights = None
+        edges = [(index[u], index[v]) for u, v in edges]
+        # pygraph gives neighbours of undirected graphs in both directions
+        topology = cls.from_edges(names, edges, True, weights)
+        topology.directed = graph.DIRECTED
+        return topology
+
+    @classmethod
+    def read_markup(cls, source):
+        """
+        Reads graph written in pygraph markup (XML) format, without
+        creating pygraph object. Weights of edges are taken from "wt"
+        attributes (if they aren't all equal).
+
+        @param source: file name, file object or XML string
+        """
+        if isinstance(source, basestring) and source.lstrip().startswith("<"):
+            dom = parseString(source)
+        else:
+            dom = parse(source)
+        directed = not dom.getElementsByTagName("graph")
+        if directed and not dom.getElementsByTagName("digraph"):
+            raise ValueError("Unknown graph type")
+
+        names = [node.getAttribute("id")
+                 for node in dom.getElementsByTagName("node")]
+        index = dict((name, i) for i, name in enumerate(names))
+        edge_socks = dom.getElementsByTagName("edge")
+        edges = np.array([(index[edge.getAttribute("from")],
+                           index[edge.getAttribute("to")])
+                          for edge in edge_socks],
+                         dtype=np.int64).reshape(-1, 2)
+        weights = np.array([float(edge.getAttribute("wt") or 1.)
+                            for edge in edge_socks])
+        first = unique_edges_index(edges, directed)
+        weights = weights[first]
+        if len(np.unique(weights)) < 2:
+            weights = None
+        return cls.from_edges(names, edges[first], directed, weights)
+
+    def subgraph(self, lo, hi):
+        start, end = self.indptr[lo], self.indptr[hi]
+        indices = self.indices[start:end]
+        inside = (indices >= lo) & (indices < hi)
+        counts = np.concatenate(([0], np.cumsum(inside)))
+        weights = None
+        if self.weights is not None:
+            weights = self.weights[start:end][inside]
+        return CSRTopology(counts[self.indptr[lo:hi + 1] - start],
+            indices[inside] - lo, self._names_range(lo, hi), self.directed,
+            weights)
+
+    def neighbors_index(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def degree_index(self, i):
+        return int(self.indptr[i + 1] - self.indptr[i])
+
+    def random_neighbor_index(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        if start == end:
+            raise ValueError("Node %s has no neighbours" % self.names[i])
+        k = start + int(random() * (end - start))
+        if self.weights is not None and random() >= self.alias_prob[k]:
+            k = start + self.alias[k]
+        return int(self.indices[k])
+
+    def random_neighbors_index(self, nodes, rng=np.random):
+        """
+        Draws one neighbour for every node at once.
+
+        @param nodes: array of node numbers
+        @param rng: numpy RandomState (or numpy.random)
+
+        @rtype: array
+        @return: Numbers of chosen neighbours.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        start = self.indptr[nodes]
+        degree = self.indptr[nodes + 1] - start
+        if len(degree) and degree.min() == 0:
+            raise ValueError("Node without neighbours")
+        k = start + (rng.random_sample(len(nodes)) * degree).astype(np.int64)
+        if self.weights is not None:
+            k = np.where(rng.random_sample(len(k)) < self.alias_prob[k],
+                         k, start + self.alias[k])
+        return self.indices[k]
+
+
+class CompleteTopology(Topology):
+    """
+    Complete graph on n nodes. Adjacency is implicit, so it takes O(1)
+    memory besides node names.
+    """
+
+    def __init__(self, n, names=None):
+        self.n = n
+        self._set_names(names)
+
+    def subgraph(self, lo, hi):
+        return CompleteTopology(hi - lo, self._names_range(lo, hi))
+
+    def neighbors_index(self, i):
+        return np.delete(np.arange(self.n), i)
+
+    def degree_index(self, i):
+        return self.n - 1
+
+    def random_neighbor_index(self, i):
+        if self.n < 2:
+            raise ValueError("Node %s has no neighbours" % self.names[i])
+        j = int(random() * (self.n - 1))
+        if j >= i:
+            j += 1
+        return j
+
+    def random_neighbors_index(self, nodes, rng=np.random):
+        if self.n < 2:
+            raise ValueError("Node without neighbours")
+        nodes = np.asarray(nodes, dtype=np.int64)
+        j = rng.randint(self.n - 1, size=len(nodes))
+        return j + (j >= nodes)
+
+
+class DynamicTopology(Topology):
+    """
+    Topology which can change during simulation. Every change of edges
+    takes O(1) time: neighbours of nodes and all edges are kept in lists,
+    removed element is replaced with the last one.
+
+    Version is increased by users of topology after every batch of changes
+    (see cog_abm.core.rewiring), so snapshots can refer to it.
+
+    Edges can have weights, then neighbours are chosen with probability
+    proportional to weight of edge in O(degree) time (uniformly for nodes
+    whose edges all have zero weight) and new edges get weight 1.
+    """
+
+    MAX_COMPLETE_EDGES = 10 ** 6
+
+    def __init__(self, n, edges=(), names=None, directed=False,
+                 weights=None):
+        """
+        @param n: number of nodes
+        @param edges: pairs of node numbers
+        @param weights: non negative weights of edges (aligned with edges),
+        edges have no weights if None
+        """
+        self.n = n
+        self.directed = directed
+        self.version = 0
+        self.adj = [[] for _ in xrange(n)]
+        # weights of edges aligned with adj
+        self.adj_weights = None if weights is None else \
+            [[] for _ in xrange(n)]
+        self._adj_pos = {}  # (i, j) -> position of j in adj[i]
+        self.edge_list = []
+        self._edge_pos = {}  # edge -> position in edge_list
+        self._set_names(names)
+        if weights is None:
+            for i, j in edges:
+                self.add_edge_index(int(i), int(j))
+        else:
+            for (i, j), w in zip(edges, weights):
+                self.add_edge_index(int(i), int(j), float(w))
+
+    @classmethod
+    def from_topology(cls, topology):
+        """
+        Copies given topology with weights of its edges. CompleteTopology
+        is copied only if it has at most MAX_COMPLETE_EDGES edges, as all
+        of them have to be created.
+        """
+        n = len(topology)
+        if isinstance(topology, CompleteTopology) and \
+                n * (n - 1) / 2 > cls.MAX_COMPLETE_EDGES:
+            raise ValueError("Complete graph with %d nodes is too big to "
+                             "be changed during simulation" % n)
+        weights = getattr(topology, "weights", None)
+        edges, edge_weights = [], []
+        for i in xrange(n):
+            for k, j in enumerate(topology.neighbors_index(i)):
+                if topology.directed or i < j:
+                    edges.append((i, int(j)))
+                    if weights is not None:
+                        edge_weights.append(
+                            weights[topology.indptr[i] + k])
+        names = None if topology._index is None else topology.names
+        return cls(n, edges, names, topology.directed,
+                   None if weights is None else edge_weights)
+
+    def _edge(self, i, j):
+        if self.directed or i < j:
+            return (i, j)
+        return (j, i)
+
+    def _add_adj(self, i, j, weight):
+        self._adj_pos[(i, j)] = len(self.adj[i])
+        self.adj[i].append(j)
+        if self.adj_weights is not None:
+            self.adj_weights[i].append(weight)
+
+    def _remove_adj(self, i, j):
+        pos = self._adj_pos.pop((i, j))
+        last = self.adj[i].pop()
+        if self.adj_weights is not None:
+            last_weight = self.adj_weights[i].pop()
+        if last != j:
+            self.adj[i][pos] = last
+            self._adj_pos[(i, last)] = pos
+            if self.adj_weights is not None:
+                self.adj_weights[i][pos] = last_weight
+
+    def has_edge_index(self, i, j):
+        return self._edge(i, j) in self._edge_pos
+
+    def add_edge_index(self, i, j, weight=1.):
+        """ Adds edge between nodes i and j, returns False if it was there
+        """
+        edge = self._edge(i, j)
+        if i == j or edge in self._edge_pos:
+            return False
+        self._edge_pos[edge] = len(self.edge_list)
+        self.edge_list.append(edge)
+        self._add_adj(i, j, weight)
+        if not self.directed:
+            self._add_adj(j, i, weight)
+        return True
+
+    def remove_edge_index(self, i, j):
+        edge = self._edge(i, j)
+        pos = self._edge_pos.pop(edge)
+        last = self.edge_list.pop()
+        if last != edge:
+            self.edge_list[pos] = last
+            self._edge_pos[last] = pos
+        self._remove_adj(i, j)
+        if not self.directed:
+            self._remove_adj(j, i)
+
+    def add_edge(self, u, v, weight=1.):
+        return self.add_edge_index(self.index(u), self.index(v), weight)
+
+    def remove_edge(self, u, v):
+        self.remove_edge_index(self.index(u), self.index(v))
+
+    def num_edges(self):
+        return len(self.edge_list)
+
+    def edges_array(self):
+        """
+        @rtype: array
+        @return: (m x 2) array with current edges (node numbers).
+        """
+        return np.array(self.edge_list, dtype=np.int64).reshape(-1, 2)
+
+    def neighbors_index(self, i):
+        return list(self.adj[i])
+
+    def degree_index(self, i):
+        return len(self.adj[i])
+
+    def _pick(self, i, u):
+        """ Neighbour of node i for u drawn uniformly from [0, 1)
+        """
+        adj = self.adj[i]
+        if self.adj_weights is not None:
+            weights = self.adj_weights[i]
+            total = sum(weights)
+            if total > 0.:
+                u *= total
+                for k, w in enumerate(weights):
+                    u -= w
+                    if u < 0. and w > 0.:
+                        return adj[k]
+                # rounding errors, the last edge with positive weight
+                return adj[max(k for k, w in enumerate(weights) if w > 0.)]
+        return adj[int(u * len(adj))]
+
+    def random_neighbor_index(self, i):
+        if not self.adj[i]:
+            raise ValueError("Node %s has no neighbours" % self.names[i])
+        return self._pick(i, random())
+
+    def random_neighbors_index(self, nodes, rng=np.random):
+        adj = self.adj
+        nodes = np.asarray(nodes, dtype=np.int64)
+        degree = np.fromiter((len(adj[i]) for i in nodes), np.int64,
+                             len(nodes))
+        if len(degree) and degree.min() == 0:
+            raise ValueError("Node without neighbours")
+        if self.adj_weights is not None:
+            return np.array([self._pick(i, u) for i, u in
+                             zip(nodes, rng.random_sample(len(nodes)))],
+                            dtype=np.int64)
+        offset = (rng.random_sample(len(nodes)) * degree).astype(np.int64)
+        return np.array([adj[i][k] for i, k in zip(nodes, offset)],
+                        dtype=np.int64)
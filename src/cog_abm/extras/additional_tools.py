@@ -2,19 +2,25 @@
 import os
 
 from ..core.network import Network
+from ..core.topology import CompleteTopology
 from ..core.interaction import Interaction
 from ..core.agent import Agent
 from cog_abm.ML.core import Classifier
 
-from pygraph.algorithms.generators import generate
 
 
-def generate_simple_network(agents):
+def generate_simple_network(agents, topology=None):
+    """ Places agents one per node of topology (complete graph by default)
+    """
     n = len(agents)
-    network = Network(generate(n, n * (n - 1) // 2, directed=False))
-
-    for i, a in enumerate(agents):
-        network.add_agent(a, i)
+    if topology is None:
+        topology = CompleteTopology(n)
+    elif len(topology) != n:
+        raise ValueError("Number of agents differs from number of nodes")
+    network = Network(topology)
+
+    for a, node in zip(agents, topology.names):
+        network.add_agent(a, node)
 #        network.add_agent(a, i, a)
 #        network.add_agent(a, i, str(i))
     return network
@@ -5,6 +5,7 @@ the Stimulus' interfaces.
 import os
 
 from cog_abm.ML.core import Sample, euclidean_distance
+from cog_abm.extras.colour_difference import SAMPLE_DISTANCES
 
 
 class Color(Sample):
@@ -12,7 +13,7 @@ class Color(Sample):
     Color represented in CIE L*a*b* space
     """
 
-    def __init__(self,  L, a, b):
+    def __init__(self,  L, a, b, metric=None):
         """
         Initialize Color
 
@@ -22,8 +23,13 @@ class Color(Sample):
         @param L: lightness - should be in [0,100]
         @param a: can be negative
         @param b: can be negative
+        @param metric: name of colour difference metric (see
+        cog_abm.extras.colour_difference), Euclidean by default
         """
-        super(Color, self).__init__([L, a, b], dist_fun=euclidean_distance)
+        dist_fun = euclidean_distance
+        if metric is not None:
+            dist_fun = SAMPLE_DISTANCES[metric]
+        super(Color, self).__init__([L, a, b], dist_fun=dist_fun)
         self.L = L
         self.a = a
         self.b = b
@@ -0,0 +1,146 @@
+"""
+Module with colour difference metrics in CIE L*a*b* space.
+
+Metrics work on numpy arrays with colours in the last dimension, so they
+can be used for whole batches of colour pairs at once (with broadcasting).
+
+http://en.wikipedia.org/wiki/Color_difference
+"""
+import numpy as np
+
+from cog_abm.ML.core import euclidean_distance
+
+
+def _split(lab):
+    lab = np.asarray(lab, dtype=float)
+    return lab[..., 0], lab[..., 1], lab[..., 2]
+
+
+def cie76(lab1, lab2):
+    """ Euclidean distance in CIELab
+    """
+    d = np.asarray(lab1, dtype=float) - np.asarray(lab2, dtype=float)
+    return np.sqrt((d * d).sum(axis=-1))
+
+
+def cie94(lab1, lab2, kL=1., K1=0.045, K2=0.015):
+    """
+    CIE94 colour difference. lab1 is the reference colour - this metric is
+    not symmetric. Default constants are for graphic arts
+    (for textiles use kL=2, K1=0.048, K2=0.014).
+    """
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    dL = L1 - L2
+    dC = C1 - C2
+    da, db = a1 - a2, b1 - b2
+    dH2 = np.maximum(da * da + db * db - dC * dC, 0.)
+    SC = 1. + K1 * C1
+    SH = 1. + K2 * C1
+    return np.sqrt((dL / kL) ** 2 + (dC / SC) ** 2 + dH2 / (SH * SH))
+
+
+def ciede2000(lab1, lab2, kL=1., kC=1., kH=1.):
+    """
+    CIEDE2000 colour difference, implemented after: G. Sharma, W. Wu,
+    E. N. Dalal "The CIEDE2000 color-difference formula: implementation
+    notes, supplementary test data, and mathematical observations" (2005)
+    """
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+
+    C_bar7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2.) ** 7
+    G = 0.5 * (1. - np.sqrt(C_bar7 / (C_bar7 + 25. ** 7)))
+    a1p, a2p = (1. + G) * a1, (1. + G) * a2
+    C1p, C2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360.
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360.
+
+    chroma_zero = C1p * C2p == 0.
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180., dhp - 360., dhp)
+    dhp = np.where(dhp < -180., dhp + 360., dhp)
+    dhp = np.where(chroma_zero, 0., dhp)
+    dHp = 2. * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp / 2.))
+
+    Lp_bar = (L1 + L2) / 2.
+    Cp_bar = (C1p + C2p) / 2.
+    h_sum = h1p + h2p
+    hp_bar = np.where(np.abs(h1p - h2p) <= 180., h_sum / 2.,
+        np.where(h_sum < 360., (h_sum + 360.) / 2., (h_sum - 360.) / 2.))
+    hp_bar = np.where(chroma_zero, h_sum, hp_bar)
+
+    rad = np.radians
+    T = 1. - 0.17 * np.cos(rad(hp_bar - 30.)) \
+        + 0.24 * np.cos(rad(2. * hp_bar)) \
+        + 0.32 * np.cos(rad(3. * hp_bar + 6.)) \
+        - 0.20 * np.cos(rad(4. * hp_bar - 63.))
+    d_theta = 30. * np.exp(-((hp_bar - 275.) / 25.) ** 2)
+    Cp_bar7 = Cp_bar ** 7
+    RC = 2. * np.sqrt(Cp_bar7 / (Cp_bar7 + 25. ** 7))
+    L50 = (Lp_bar - 50.) ** 2
+    SL = 1. + 0.015 * L50 / np.sqrt(20. + L50)
+    SC = 1. + 0.045 * Cp_bar
+    SH = 1. + 0.015 * Cp_bar * T
+    RT = -np.sin(rad(2. * d_theta)) * RC
+
+    dL, dC, dH = dLp / (kL * SL), dCp / (kC * SC), dHp / (kH * SH)
+    return np.sqrt(dL * dL + dC * dC + dH * dH + RT * dC * dH)
+
+
+METRICS = {
+    "CIE76": cie76,
+    "CIE94": cie94,
+    "CIEDE2000": ciede2000,
+}
+
+
+def get_metric(metric):
+    """ Gives metric function for its name (or metric itself)
+    """
+    if callable(metric):
+        return metric
+    try:
+        return METRICS[metric]
+    except KeyError:
+        raise ValueError("Unknown colour difference metric: %s" % metric)
+
+
+def pairwise(metric, lab1, lab2=None, block=256):
+    """
+    Table of differences between every colour from lab1 and every colour
+    from lab2 (lab1 by default).
+
+    @param block: rows computed at once - bounds memory used for temporaries
+
+    @rtype: array
+    @return: (len(lab1) x len(lab2)) array
+    """
+    metric = get_metric(metric)
+    lab1 = np.asarray(lab1, dtype=float)
+    lab2 = lab1 if lab2 is None else np.asarray(lab2, dtype=float)
+    table = np.empty((len(lab1), len(lab2)))
+    for start in xrange(0, len(lab1), block):
+        rows = lab1[start:start + block, np.newaxis, :]
+        table[start:start + block] = metric(rows, lab2[np.newaxis, :, :])
+    return table
+
+
+#Sample distance functions
+def cie94_distance(sx, sy):
+    return float(cie94(sx.get_values(), sy.get_values()))
+
+
+def ciede2000_distance(sx, sy):
+    return float(ciede2000(sx.get_values(), sy.get_values()))
+
+
+SAMPLE_DISTANCES = {
+    "CIE76": euclidean_distance,
+    "CIE94": cie94_distance,
+    "CIEDE2000": ciede2000_distance,
+}
@@ -0,0 +1,128 @@
+"""
+Module with readers of big networks from edge list files.
+
+Files are read in chunks and parsed with numpy, adjacency (CSRTopology) is
+built directly from arrays of edges. Supported formats:
+    - edgelist: text, line "u v" or "u v weight" for every edge
+    - adjacency: text, line "u v1 v2 ..." with neighbours of node u
+    - npy: NumPy binary file with (m x 2) or (m x 3) (weights in last
+    column) array of edges, see save_npy_edges
+Node names are integers, lines starting with # are ignored in text files.
+"""
+import numpy as np
+
+from cog_abm.core.topology import CSRTopology, unique_edges_index
+
+CHUNK_SIZE = 2 ** 24
+
+
+def _text_chunks(source, chunk_size):
+    with open(source, 'r') as f:
+        while True:
+            lines = f.readlines(chunk_size)
+            if not lines:
+                return
+            text = ''.join(lines)
+            if '#' in text:
+                text = ''.join(l for l in lines
+                               if not l.lstrip().startswith('#'))
+            yield text
+
+
+def build_topology(edges, weights=None, directed=False):
+    """
+    Builds topology from edges given with node names (integers). Nodes are
+    numbered in order of names; if names are 0..n-1 they are numbers.
+    Repeated edges are removed.
+
+    @param edges: (m x 2) array of node names
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    first = unique_edges_index(edges, directed)
+    edges = edges[first]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[first]
+        if len(np.unique(weights)) < 2:
+            weights = None
+    names, edges = np.unique(edges, return_inverse=True)
+    edges = edges.reshape(-1, 2)
+    if len(names) and names[0] == 0 and names[-1] == len(names) - 1:
+        return CSRTopology.from_edges(len(names), edges, directed, weights)
+    return CSRTopology.from_edges(names.tolist(), edges, directed, weights)
+
+
+def read_edge_list(source, directed=False, chunk_size=CHUNK_SIZE):
+    """
+    Reads text file with one edge per line: "u v" or "u v weight".
+
+    @rtype: CSRTopology
+    """
+    cols = None
+    arrays = []
+    for text in _text_chunks(source, chunk_size):
+        data = np.fromstring(text, sep=' ')
+        if not len(data):
+            continue
+        if cols is None:
+            cols = len(next(l for l in text.splitlines() if l.strip())
+                       .split())
+            if cols not in (2, 3):
+                raise ValueError("Edge list should have 2 or 3 columns")
+        if len(data) % cols:
+            raise ValueError("Lines of edge list differ in length")
+        arrays.append(data.reshape(-1, cols))
+    if not arrays:
+        return CSRTopology.from_edges(0, [], directed)
+    data = np.concatenate(arrays)
+    weights = data[:, 2] if cols == 3 else None
+    return build_topology(data[:, :2], weights, directed)
+
+
+def read_adjacency_list(source, directed=False, chunk_size=CHUNK_SIZE):
+    """
+    Reads text file with line "u v1 v2 ..." for node u with neighbours
+    v1, v2, ...
+
+    @rtype: CSRTopology
+    """
+    src, dst = [], []
+    for text in _text_chunks(source, chunk_size):
+        for line in text.splitlines():
+            ids = np.fromstring(line, dtype=np.int64, sep=' ')
+            if len(ids) > 1:
+                src.append(np.repeat(ids[0], len(ids) - 1))
+                dst.append(ids[1:])
+    if not src:
+        return CSRTopology.from_edges(0, [], directed)
+    edges = np.column_stack((np.concatenate(src), np.concatenate(dst)))
+    return build_topology(edges, None, directed)
+
+
+def read_npy_edges(source, directed=False):
+    """
+    Reads (m x 2) or (m x 3) array of edges saved in NumPy format. File is
+    memory mapped, not read into memory at once.
+
+    @rtype: CSRTopology
+    """
+    data = np.load(source, mmap_mode='r')
+    if data.ndim != 2 or data.shape[1] not in (2, 3):
+        raise ValueError("Array of edges should have 2 or 3 columns")
+    weights = data[:, 2] if data.shape[1] == 3 else None
+    return build_topology(data[:, :2], weights, directed)
+
+
+def save_npy_edges(target, edges, weights=None):
+    """ Saves edges (and weights) in format read by read_npy_edges
+    """
+    edges = np.asarray(edges)
+    if weights is not None:
+        edges = np.column_stack((edges, weights))
+    np.save(target, edges)
+
+
+READERS = {
+    "edgelist": read_edge_list,
+    "adjacency": read_adjacency_list,
+    "npy": read_npy_edges,
+}
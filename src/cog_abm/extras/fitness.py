@@ -1,6 +1,10 @@
 """
 Provides tools to measure performance of agents/classifiers
 """
+import math
+
+import numpy as np
+
 from tools import abstract
 
 
@@ -100,3 +104,123 @@ class AverageFitnessMeasure(FitnessMeasure):
 
 def get_buffered_average(k):
     return BufferedFitnessMeasure(AverageFitnessMeasure(), k)
+
+
+class PopulationFitness(object):
+    """
+    Buffered averages (like get_buffered_average) of whole population kept
+    in arrays: (agents x k) ring buffers of payoffs and weights, running
+    sums for every agent and sum of fitnesses of all agents. Both fitness of
+    agent and average fitness of population are available in O(1).
+
+    Agents get their rows through measures(). Only shape of population is
+    pickled, every measure pickles its own row and binds it again on load,
+    so pickled agent doesn't carry rows of the others (bound - number of
+    rows which have measures).
+    """
+
+    def __init__(self, n, k):
+        self.size = n
+        self.k = k
+        self.payoffs = np.zeros((n, k))
+        self.weights = np.zeros((n, k))
+        # per agent values are updated one at a time - lists are faster
+        self.pos = [0] * n
+        self.sums = [0.] * n
+        self.wsums = [0.] * n
+        self.total = 0.
+        self.updates = 0
+        self._bound = [False] * n
+        self.bound = 0
+
+    def __reduce__(self):
+        return (PopulationFitness, (self.size, self.k))
+
+    def measures(self):
+        self._bound = [True] * self.size
+        self.bound = self.size
+        return [PopulationFitnessMeasure(self, i) for i in xrange(self.size)]
+
+    def row(self, i):
+        """ (payoffs, weights, position in ring buffer) of agent i
+        """
+        return (self.payoffs[i].copy(), self.weights[i].copy(), self.pos[i])
+
+    def bind_row(self, i, payoffs, weights, pos):
+        """ Sets row of agent i (see row)
+        """
+        old = self.fitness(i)
+        self.payoffs[i] = payoffs
+        self.weights[i] = weights
+        self.pos[i] = pos
+        self.sums[i] = float(np.dot(self.payoffs[i], self.weights[i]))
+        self.wsums[i] = float(self.weights[i].sum())
+        self.total += self.fitness(i) - old
+        if not self._bound[i]:
+            self._bound[i] = True
+            self.bound += 1
+
+    def add_payoff(self, i, payoff, weight=1.):
+        j = self.pos[i]
+        old = self.fitness(i)
+        old_weight = self.weights.item(i, j)
+        self.sums[i] += weight * payoff - old_weight * self.payoffs.item(i, j)
+        self.wsums[i] += weight - old_weight
+        self.payoffs.itemset((i, j), payoff)
+        self.weights.itemset((i, j), weight)
+        self.pos[i] = (j + 1) % self.k
+        self.total += self.fitness(i) - old
+        self.updates += 1
+        if self.updates >= self.size * self.k:
+            # rounding errors of running sums would accumulate
+            self.refresh()
+
+    def fitness(self, i):
+        wsum = self.wsums[i]
+        if wsum == 0.:
+            return 0.
+        return self.sums[i] / wsum
+
+    def fitnesses(self):
+        """ Fitness of every agent (array)
+        """
+        sums, wsums = np.array(self.sums), np.array(self.wsums)
+        res = np.zeros(self.size)
+        nonzero = wsums != 0.
+        res[nonzero] = sums[nonzero] / wsums[nonzero]
+        return res
+
+    def refresh(self):
+        """ Recomputes running sums from buffers
+        """
+        self.sums = (self.payoffs * self.weights).sum(axis=1).tolist()
+        self.wsums = self.weights.sum(axis=1).tolist()
+        self.total = math.fsum(self.fitnesses())
+        self.updates = 0
+
+    def average(self):
+        if self.size == 0:
+            return 0.
+        return self.total / self.size
+
+
+class PopulationFitnessMeasure(FitnessMeasure):
+    """ Fitness measure of one agent stored in PopulationFitness
+    """
+
+    def __init__(self, population, i):
+        self.population = population
+        self.i = i
+
+    def __getstate__(self):
+        return (self.population, self.i) + self.population.row(self.i)
+
+    def __setstate__(self, state):
+        self.population, self.i = state[:2]
+        self.population.bind_row(self.i, *state[2:])
+
+    def add_payoff(self, payoff, weight = 1.):
+        self.population.add_payoff(self.i, payoff, weight)
+
+    def get_fitness(self):
+        return self.population.fitness(self.i)
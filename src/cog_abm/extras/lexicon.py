@@ -1,4 +1,5 @@
 import random
+from array import array
 
 #from tools import *
 from itertools import groupby
@@ -26,25 +27,68 @@ class Syllable:
         return Syllable(random.choice(Syllable.allowed_syllables))
 
 
+def _coprime(n):
+    """ Random number in 1..n-1 coprime with n (1 for n < 3)
+    """
+    if n < 3:
+        return 1
+    while True:
+        a = random.randint(1, n - 1)
+        x, y = a, n
+        while y:
+            x, y = y, x % y
+        if x == 1:
+            return a
+
+
 class Word(object):
+    """
+    Word made of syllables.
+
+    Words are interned: every distinct word (string form) gets small
+    integer id, shared by all equal words in process, so words are hashed
+    and compared by id. Ids are local to process - pickled words keep only
+    syllables and get ids when loaded.
+    """
 
     max_len = 5
 
+    _ids = {}  # string form -> id
+    _table = []  # id -> Word
+
     def __init__(self, syllables):
         self.syllables = syllables
+        self._intern()
+
+    def _intern(self):
+        self._str = "".join([str(s) for s in self.syllables])
+        self.id = Word._ids.get(self._str)
+        if self.id is None:
+            self.id = Word._ids[self._str] = len(Word._table)
+            Word._table.append(self)
+
+    @staticmethod
+    def from_id(word_id):
+        return Word._table[word_id]
+
+    def __reduce__(self):
+        return (_load_word, ([str(s) for s in self.syllables],))
+
+    def __setstate__(self, state):
+        # words pickled before interning
+        self.syllables = state["syllables"]
+        self._intern()
 
     def __eq__(self, other):
-        if other is None:
+        if not isinstance(other, Word):
             return False
-        #if isinstance(other, Word):
-        return self.syllables == other.syllables
-        #return False
+        return self.id == other.id
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __str__(self):
-        return "".join([str(s) for s in self.syllables])
+        return self._str
 
     def __repr__(self):
         return str(self)
@@ -59,31 +103,153 @@ class Word(object):
         return Word([Syllable.get_random() for _ in xrange(i)])
         #return repr([Syllable.get_random() for i in range(i)])
 
+    @staticmethod
+    def space_size():
+        """ Number of words of length 1..max_len
+        """
+        k = len(Syllable.allowed_syllables)
+        return sum(k ** i for i in xrange(1, Word.max_len + 1))
+
+    @staticmethod
+    def from_code(code):
+        """ Word number code (0..space_size()-1) in space of all words,
+        shorter words first
+        """
+        syllables = Syllable.allowed_syllables
+        k = len(syllables)
+        length, size = 1, k
+        while code >= size:
+            code -= size
+            length += 1
+            size *= k
+        res = []
+        for _ in xrange(length):
+            code, d = divmod(code, k)
+            res.append(Syllable(syllables[d]))
+        return Word(res)
+
     @staticmethod
     def get_random_not_in(words):
+        """
+        Random word (see get_random) which isn't in words. If drawn word is
+        taken, words are tried in random order of whole word space (random
+        affine permutation of codes) instead of drawing again.
+        """
         w = Word.get_random()
-        while w in words:
-            w = Word.get_random()
-        return w
+        if w not in words:
+            return w
+        n = Word.space_size()
+        a, b = _coprime(n), random.randint(0, n - 1)
+        for i in xrange(n):
+            w = Word.from_code((a * i + b) % n)
+            if w not in words:
+                return w
+        raise ValueError("There are no free words")
 
     def __hash__(self):
-        return hash(str(self))
+        return self.id
+
+
+def _load_word(contents):
+    """ Word with syllables of given contents (used by pickle)
+    """
+    return Word([Syllable(c) for c in contents])
 
 
 class Lexicon(object):
+    """
+    Strengths of associations between categories and words.
+
+    Strengths are kept quantized - as levels 0..LEVELS (small integers) -
+    in index of words (ids) of every category and of categories of every
+    word, together with the strongest word of category and strongest
+    category of word. Lookups and lateral inhibition touch only affected
+    row / column.
+    """
 
     delta_inc = 0.1
     delta_inh = 0.1
     delta_dec = 0.1
     s = 0.5  # initial strength
+    LEVELS = 10
 
     #L = C x F x [0.0, 1.0]
     def __init__(self, base=None):
-        self.base = base or {}
         self.F = set()  # words
+        self._build_index()
+        for cord, weight in (base or {}).iteritems():
+            self.set_value(cord, weight)
+
+    def _build_index(self):
+        self._words = {}  # category -> {word id: level}
+        self._categories = {}  # word id -> {category: level}
+        self._best_word = {}  # category -> (level, word id)
+        self._best_category = {}  # word id -> (level, category)
+
+    def __getstate__(self):
+        words = dict((w.id, i) for i, w in enumerate(self.F))
+        words_list = list(self.F)
+        categories, word_idx, levels = array('l'), array('l'), array('b')
+        for word_id, row in self._categories.iteritems():
+            if word_id not in words:
+                words[word_id] = len(words_list)
+                words_list.append(Word.from_id(word_id))
+            for category, level in row.iteritems():
+                categories.append(category)
+                word_idx.append(words[word_id])
+                levels.append(level)
+        return {"F": len(self.F), "words": words_list,
+                "entries": (categories, word_idx, levels)}
+
+    def __setstate__(self, state):
+        self._build_index()
+        if "base" in state:
+            # pickled before quantized storage
+            self.F = state["F"]
+            for cord, weight in state["base"].iteritems():
+                self.set_value(cord, weight)
+            return
+        words = state["words"]
+        self.F = set(words[:state["F"]])
+        for category, i, level in zip(*state["entries"]):
+            self._set_level(category, words[i].id, level)
+
+    @property
+    def base(self):
+        """ Dictionary (category, word) -> strength (copy)
+        """
+        return dict(((c, Word.from_id(w)), float(level) / self.LEVELS)
+                    for c, row in self._words.iteritems()
+                    for w, level in row.iteritems())
+
+    def strength(self, category, word):
+        return float(self._words[category][word.id]) / self.LEVELS
+
+    @staticmethod
+    def _update_best(best, key, item, level):
+        """ Keeps maximum of row (or column) after change of level of item
+        """
+        cached = best.get(key)
+        if cached is None:
+            return
+        if cached[1] == item:
+            if level >= cached[0]:
+                best[key] = (level, item)
+            else:
+                del best[key]  # found again on next lookup
+        elif level > cached[0]:
+            best[key] = (level, item)
+
+    def _set_level(self, category, word_id, level):
+        self._words.setdefault(category, {})[word_id] = level
+        self._categories.setdefault(word_id, {})[category] = level
+        self._update_best(self._best_word, category, word_id, level)
+        self._update_best(self._best_category, word_id, category, level)
 
     def set_value(self, cord, weight):
-        self.base[cord] = round(max(min(1., weight), 0.), 1)
+        category, word = cord
+        self._set_level(category, word.id,
+            int(round(max(min(1., weight), 0.) * self.LEVELS)))
 
     def add_element(self, category, word=None, weight=None):
         weight = weight or Lexicon.s
@@ -95,48 +261,80 @@ class Lexicon(object):
         self.set_value((category, word), weight)
         return word
 
-    def _find_best(self, choser):
-        rval = (None, None)
-        maxx = -float('inf')
-        for k, v in self.base.iteritems():
-            if choser(k) and v > maxx:
-                maxx, rval = v, k
-
-        return rval
+    @staticmethod
+    def _find_best(best, index, key):
+        cached = best.get(key)
+        if cached is None:
+            row = index.get(key)
+            if not row:
+                return None
+            item, level = max(row.iteritems(), key=lambda (i, v): v)
+            cached = best[key] = (level, item)
+        return cached[1]
 
     def word_for(self, category):
-        return self._find_best(lambda k: k[0] == category)[1]
+        word_id = self._find_best(self._best_word, self._words, category)
+        if word_id is None:
+            return None
+        return Word.from_id(word_id)
 
     def category_for(self, word):
-        return self._find_best(lambda k: k[1] == word)[0]
+        if word is None:
+            return None
+        return self._find_best(self._best_category, self._categories,
+                               word.id)
 
     def decrease(self, category, word):
-        w = self.base.pop((category, word)) - Lexicon.delta_dec
-        self.set_value((category, word), w)
-
-    def _decreaser(self, choser):
-        for cat_word, v in self.base.items():
-            if choser(cat_word):
-                w = v - Lexicon.delta_inh
-                self.set_value(cat_word, w)
+        self.set_value((category, word),
+                       self.strength(category, word) - Lexicon.delta_dec)
+
+    def _decreaser(self, choser, skip):
+        step = self.delta_inh * self.LEVELS
+        # levels of existing pairs change in place, sizes of rows don't
+        for category, row in self._words.iteritems():
+            for word_id, level in row.iteritems():
+                cat_word = (category, Word.from_id(word_id))
+                if cat_word != skip and choser(cat_word):
+                    self._set_level(category, word_id,
+                                    max(int(round(level - step)), 0))
 
     def do_inc_decrs(self, category, word, decrasers_filters):
-        w = self.base.pop((category, word)) + self.delta_inc
+        """ Increases strength of (category, word) and decreases strengths of
+        other pairs chosen by filters - scans whole lexicon, see
+        inc_dec_categories and inc_dec_words
+        """
+        w = self.strength(category, word) + self.delta_inc
         for fun in decrasers_filters:
-            self._decreaser(fun)
+            self._decreaser(fun, (category, word))
         self.set_value((category, word), w)
 
+    def _inhibit_categories(self, category, word_id):
+        step = self.delta_inh * self.LEVELS
+        for c, level in self._categories[word_id].items():
+            if c != category:
+                self._set_level(c, word_id, max(int(round(level - step)), 0))
+
+    def _inhibit_words(self, category, word_id):
+        step = self.delta_inh * self.LEVELS
+        for w, level in self._words[category].items():
+            if w != word_id:
+                self._set_level(category, w, max(int(round(level - step)), 0))
+
     def inc_dec_categories(self, category, word):
-        self.do_inc_decrs(category, word, [lambda k: k[1] == word])
+        w = self.strength(category, word) + self.delta_inc
+        self._inhibit_categories(category, word.id)
+        self.set_value((category, word), w)
 
     def inc_dec_words(self, category, word):
-        self.do_inc_decrs(category, word, [lambda k: k[0] == category])
+        w = self.strength(category, word) + self.delta_inc
+        self._inhibit_words(category, word.id)
+        self.set_value((category, word), w)
 
     def increase_pair_decrease_other(self, category, word):
-        self.do_inc_decrs(category, word, [
-            lambda k: k[1] == word,
-            lambda k: k[0] == category]
-            )
+        w = self.strength(category, word) + self.delta_inc
+        self._inhibit_categories(category, word.id)
+        self._inhibit_words(category, word.id)
+        self.set_value((category, word), w)
 
     def known_words(self):
         return set(self.base.values())
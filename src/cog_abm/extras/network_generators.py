@@ -0,0 +1,159 @@
+"""
+Module with generators of network topologies for large populations.
+
+All generators build CSRTopology with nodes 0..n-1 in O(edges) time and
+memory. Random ones take numpy RandomState (numpy.random by default).
+"""
+import numpy as np
+
+from cog_abm.core.topology import CSRTopology, unique_edges
+
+
+def lattice(dims, periodic=False):
+    """
+    Regular lattice, every node is connected with its neighbours along each
+    axis (von Neumann neighbourhood).
+
+    @param dims: sizes of lattice in all dimensions, e.g. (100, 100)
+    @type dims: sequence of ints
+    @param periodic: whether lattice wraps around (torus)
+    """
+    dims = tuple(int(d) for d in dims)
+    n = int(np.prod(dims))
+    coords = np.arange(n).reshape(dims)
+    edges = []
+    for axis, size in enumerate(dims):
+        if size < 2:
+            continue
+        src = coords.take(np.arange(size - 1), axis=axis)
+        dst = coords.take(np.arange(1, size), axis=axis)
+        edges.append(np.column_stack((src.ravel(), dst.ravel())))
+        if periodic and size > 2:
+            src = coords.take([size - 1], axis=axis)
+            dst = coords.take([0], axis=axis)
+            edges.append(np.column_stack((src.ravel(), dst.ravel())))
+    if not edges:
+        return CSRTopology.from_edges(n, [])
+    return CSRTopology.from_edges(n, np.concatenate(edges))
+
+
+def _ring_edges(n, k):
+    if k % 2 or not 0 < k < n:
+        raise ValueError("k should be even, positive and smaller than n")
+    src = np.tile(np.arange(n), k // 2)
+    dst = (src + np.arange(1, k // 2 + 1).repeat(n)) % n
+    return src, dst
+
+
+def ring(n, k=2):
+    """
+    Ring lattice: every node is connected with k nearest nodes (k / 2 on
+    each side).
+    """
+    return CSRTopology.from_edges(n, np.column_stack(_ring_edges(n, k)))
+
+
+def watts_strogatz(n, k, p, rng=np.random):
+    """
+    Watts-Strogatz small world: ring lattice with each edge rewired with
+    probability p to a random node.
+
+    @attention: Rewired edges which would repeat existing ones are dropped,
+    so graph can have a bit less than n * k / 2 edges.
+    """
+    src, dst = _ring_edges(n, k)
+    rewired = np.flatnonzero(rng.random_sample(len(dst)) < p)
+    new = rng.randint(n - 1, size=len(rewired))
+    dst[rewired] = new + (new >= src[rewired])  # no self loops
+    edges = unique_edges(np.column_stack((src, dst)))
+    return CSRTopology.from_edges(n, edges)
+
+
+def barabasi_albert(n, m, rng=np.random):
+    """
+    Barabasi-Albert scale free network: nodes are added one by one and
+    connected to m existing nodes chosen with probability proportional
+    to their degree. Starts with star of m + 1 nodes.
+    """
+    if not 0 < m < n:
+        raise ValueError("m should be positive and smaller than n")
+    num_edges = m + (n - m - 1) * m
+    edges = np.empty((num_edges, 2), dtype=np.int64)
+    # every node appears here as many times as its degree
+    repeated = np.empty(2 * num_edges, dtype=np.int64)
+    edges[:m, 0] = m
+    edges[:m, 1] = np.arange(m)
+    repeated[:2 * m] = edges[:m].ravel()
+    filled, e = 2 * m, m
+    for node in xrange(m + 1, n):
+        targets = set()
+        while len(targets) < m:
+            targets.update(repeated[rng.randint(filled,
+                                                size=m - len(targets))])
+        edges[e:e + m, 0] = node
+        edges[e:e + m, 1] = list(targets)
+        repeated[filled:filled + 2 * m] = edges[e:e + m].ravel()
+        filled += 2 * m
+        e += m
+    return CSRTopology.from_edges(n, edges)
+
+
+def _random_pairs(total, p, rng):
+    """ Indices (in 0..total-1) of pairs chosen independently with
+    probability p - drawn with geometric skips in O(chosen)
+    """
+    if p <= 0. or total == 0:
+        return np.zeros(0, dtype=np.int64)
+    if p >= 1.:
+        return np.arange(total, dtype=np.int64)
+    chosen = []
+    last = -1
+    while last < total:
+        size = int((total - last) * p * 1.1) + 16
+        positions = last + np.cumsum(rng.geometric(p, size=size))
+        chosen.append(positions)
+        last = positions[-1]
+    chosen = np.concatenate(chosen)
+    return chosen[chosen < total]
+
+
+def _triangle_pair(idx):
+    """ Maps index of pair in lower triangle to (row, column), row > column
+    """
+    row = ((np.sqrt(8. * idx + 1.) + 1.) // 2).astype(np.int64)
+    # correction of floating point errors
+    row -= row * (row - 1) // 2 > idx
+    row += (row + 1) * row // 2 <= idx
+    return row, idx - row * (row - 1) // 2
+
+
+def stochastic_block(sizes, probs, rng=np.random):
+    """
+    Stochastic block model: nodes are split into blocks of given sizes
+    (first sizes[0] nodes are in block 0 and so on), edge between nodes from
+    blocks a and b exists with probability probs[a][b].
+
+    @param probs: symmetric matrix of probabilities
+    """
+    sizes = [int(s) for s in sizes]
+    probs = np.asarray(probs, dtype=float)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    edges = []
+    for a, size_a in enumerate(sizes):
+        pairs = _random_pairs(size_a * (size_a - 1) // 2, probs[a, a], rng)
+        row, col = _triangle_pair(pairs)
+        edges.append(np.column_stack((row, col)) + offsets[a])
+        for b in xrange(a + 1, len(sizes)):
+            pairs = _random_pairs(size_a * sizes[b], probs[a, b], rng)
+            edges.append(np.column_stack((pairs // sizes[b] + offsets[a],
+                                          pairs % sizes[b] + offsets[b])))
+    return CSRTopology.from_edges(int(offsets[-1]), np.concatenate(edges))
+
+
+GENERATORS = {
+    "lattice": lattice,
+    "ring": ring,
+    "watts_strogatz": watts_strogatz,
+    "barabasi_albert": barabasi_albert,
+    "stochastic_block": stochastic_block,
+}
@@ -1,13 +1,24 @@
 """
 Module provides parser for xml documents.
 """
+import os
+import hashlib
 import xml.dom.minidom
-from pygraph.readwrite import markup
+from ast import literal_eval
+from inspect import getargspec
+
+import numpy as np
+
 from cog_abm.core.network import Network
+from cog_abm.core.topology import CSRTopology
+from cog_abm.core.rewiring import Rewiring
 from cog_abm.core.agent import *
 from cog_abm.core.environment import *
 from cog_abm.extras.color import Color
 from cog_abm.extras.extract_colour_order import extract_colour_order
+from cog_abm.extras.additional_tools import generate_simple_network
+from cog_abm.extras.network_generators import GENERATORS
+from cog_abm.extras.edge_list import READERS
 
 
 class Parser(object):
@@ -73,6 +84,9 @@ class Parser(object):
 
         agent = Agent()
         if network is not None:
+            if not network.has_node(node_name):
+                # nodes read from edge list files have integer names
+                node_name = int(node_name)
             network.add_agent(agent, node_name)
         return agent
 
@@ -100,32 +114,149 @@ class Parser(object):
         """
         Parse environment parameters given in xml document.
 
+        @attention: If environment element in simulation file has "shared"
+        attribute, environment is published to this directory (as
+        ArrayEnvironment) or attached from it if it has already been
+        published - then doc isn't parsed at all. Environment published from
+        other source (file, its content or metric) isn't attached (nor
+        published again) - ValueError is raised.
+
         @type doc: String
         @param doc: XML document directory.
 
         @rtype: Environment
         @return: Parsed environment
         """
+        shared = main_sock.getAttribute("shared") \
+            if main_sock is not None else ""
+        if shared:
+            source = self.environment_source(doc, main_sock)
+            if ArrayEnvironment.is_published(shared):
+                return self.setup_environment(
+                    ArrayEnvironment.attach(shared, source=source), main_sock)
+
         sock = self.build_DOM(doc)
         env = sock.firstChild
         env_type = env.getAttribute("type")
         environment = self.environment_parser_map[env_type](env, main_sock)
+        if shared:
+            environment.publish(shared, source)
         return environment
 
-    def parse_graph(self, source):
+    def environment_source(self, doc, main_sock):
         """
-        Parse graph when given as pygraph in xml.
+        Description of what shared environment is made of: file (with
+        checksum of its content, if it still exists) and metric.
+
+        @rtype: dict
+        """
+        source = {"file": os.path.abspath(doc)}
+        if os.path.exists(doc):
+            with open(doc, "rb") as f:
+                source["sha1"] = hashlib.sha1(f.read()).hexdigest()
+        params = self.return_element_if_exist(main_sock, "params", False)
+        if params is not None:
+            source["metric"] = self.return_if_exist(params, "metric", "value",
+                                                    str)
+        else:
+            source["metric"] = None
+        return source
+
+    def parse_graph(self, source, format=None, directed=False):
+        """
+        Parse graph when given as pygraph in xml or in edge list file.
 
         @type source: String
         @param source: XML document for pygraph directory.
 
-        @rtype: pygraph
-        @return: Returns graph from pygraph library.
+        @type format: String
+        @param format: "markup" (default) or one of formats from
+        cog_abm.extras.edge_list: "edgelist", "adjacency", "npy".
+
+        @rtype: Network
+        @return: Returns network with CSRTopology read from the document.
         """
         if source is None:
             return None
-        with open(source, 'r') as file:
-            return Network(markup.read(file.read()))
+        if format in (None, "", "markup"):
+            return Network(CSRTopology.read_markup(source))
+        return Network(READERS[format](source, directed))
+
+    def parse_distributed(self, sock):
+        """
+        Parse distributed element of simulation, e.g.:
+        <distributed shards="4" migrate_every="100" migration_prob="0.01"/>
+
+        @rtype: dict
+        @return: Arguments of ShardedSimulation or None if there is no such
+        element.
+        """
+        sock = self.return_element_if_exist(sock, "distributed", False)
+        if sock is None:
+            return None
+        types = {"shards": int, "migrate_every": int,
+                 "migration_prob": float, "seed": int}
+        return dict((str(name), types[name](value))
+                    for name, value in sock.attributes.items())
+
+    def parse_cv_monitor(self, sock):
+        """
+        Parse cv_monitor element of simulation, e.g.:
+        <cv_monitor every="10" seed="0" width="0.05" max_samples="20000"/>
+
+        @rtype: dict
+        @return: Arguments of steels.metrics.CVMonitor or None if there is
+        no such element.
+        """
+        sock = self.return_element_if_exist(sock, "cv_monitor", False)
+        if sock is None:
+            return None
+        types = {"every": int, "seed": int, "width": float,
+                 "confidence": float, "batch": int, "max_samples": int}
+        return dict((str(name), types[name](value))
+                    for name, value in sock.attributes.items())
+
+    def parse_rewiring(self, sock):
+        """
+        Parse rewiring element of network, e.g.:
+        <rewiring every="100" remove="0.01" add="2" move="0.001" seed="5"/>
+
+        @rtype: Rewiring
+        @return: Rewiring or None if there is no such element.
+        """
+        sock = self.return_element_if_exist(sock, "rewiring", False)
+        if sock is None:
+            return None
+        value = lambda name: float(sock.getAttribute(name) or 0.)
+        seed = sock.getAttribute("seed")
+        return Rewiring(int(sock.getAttribute("every")), value("remove"),
+            value("add"), value("move"), int(seed) if seed else None)
+
+    def parse_generator(self, sock, num_agents=None):
+        """
+        Generate topology described by network element with "generator"
+        attribute, e.g.:
+        <network generator="watts_strogatz" n="1000" k="4" p="0.1" seed="3"/>
+        Other attributes are arguments of generator (see
+        cog_abm.extras.network_generators), given as python literals.
+
+        @type num_agents: int
+        @param num_agents: Used as n if it isn't given.
+
+        @rtype: Topology
+        @return: Generated topology.
+        """
+        generator = GENERATORS[sock.getAttribute("generator")]
+        kwargs = {}
+        for name, value in sock.attributes.items():
+            if name not in ("generator", "seed"):
+                kwargs[str(name)] = literal_eval(value)
+        if "n" not in kwargs and "n" in getargspec(generator).args:
+            kwargs["n"] = num_agents
+        if "rng" in getargspec(generator).args:
+            seed = sock.getAttribute("seed")
+            kwargs["rng"] = np.random.RandomState(int(seed) if seed else None)
+        return generator(**kwargs)
 
     def parse_simulation(self, source):
         """
@@ -145,8 +276,19 @@ class Parser(object):
 
         dictionary["dump_freq"] = self.return_if_exist(sock, "history",
         "freq", int)
-        dictionary["topology"] = self.parse_graph(self.return_if_exist
-            (sock, "network", "source", str))
+        network_sock = self.return_element_if_exist(sock, "network", False)
+        dictionary["rewiring"] = self.parse_rewiring(network_sock)
+        dictionary["distributed"] = self.parse_distributed(sock)
+        dictionary["cv_monitor"] = self.parse_cv_monitor(sock)
+        generator = network_sock is not None and \
+            network_sock.hasAttribute("generator")
+        if generator:
+            dictionary["topology"] = None
+        else:
+            dictionary["topology"] = self.parse_graph(self.return_if_exist
+                (sock, "network", "source", str), self.return_if_exist(sock,
+                "network", "format", str), self.return_if_exist(sock,
+                "network", "directed", str) == "true")
 
         environments = {}
         envs = sock.getElementsByTagName("environment")
@@ -159,6 +301,22 @@ class Parser(object):
         dictionary['environment'] = environments['global']
         dictionary["agents"] = self.parse_agents(self.return_if_exist
             (sock, "agents", "source", str), dictionary["topology"])
+        if generator:
+            agents = dictionary["agents"]
+            topology = self.parse_generator(network_sock,
+                agents and len(agents))
+            if agents is None:
+                # one agent per node
+                agents = [Agent() for _ in xrange(len(topology))]
+            dictionary["agents"] = agents
+            dictionary["topology"] = generate_simple_network(agents,
+                                                             topology)
+        elif dictionary["agents"] is None and \
+                dictionary["topology"] is not None:
+            network = dictionary["topology"]
+            dictionary["agents"] = [Agent() for _ in xrange(len(network))]
+            for agent, node in zip(dictionary["agents"], network.graph.names):
+                network.add_agent(agent, node)
 
         #inters = sock.getElementsByTagName("interaction")
         inter = self.return_element_if_exist(sock, "interaction", False)
@@ -174,6 +332,15 @@ class Parser(object):
             list.append(self.parse_munsell_chip(chip))
         return list
 
+    def parse_munsell_weights(self, chips):
+        """
+        Returns sampling weights given in "weight" attribute of chips
+        (default 1) or None if no chip has it.
+        """
+        if not any(chip.hasAttribute("weight") for chip in chips):
+            return None
+        return [float(chip.getAttribute("weight") or 1.) for chip in chips]
+
     def parse_munsell_chip(self, chip):
         L = float(chip.getElementsByTagName("L")[0].firstChild.data)
         a = float(chip.getElementsByTagName("a")[0].firstChild.data)
@@ -181,25 +348,64 @@ class Parser(object):
         return Color(L, a, b)
 
     def parse_munsell_environment(self, env, main_sock):
-        list_of_stimuli = self.parse_munsell_chips(env.getElementsByTagName
-                                        ("munsell_chip"))
+        chips = env.getElementsByTagName("munsell_chip")
+        environment = Environment(self.parse_munsell_chips(chips))
+        return self.setup_environment(environment, main_sock,
+                                      self.parse_munsell_weights(chips))
 
+    def setup_environment(self, environment, main_sock, weights=None):
+        """
+        Sets chooser, weights, colour order, representation (with colour
+        difference metric) and buffers of contexts according to environment
+        element from simulation file (shared environment is published by
+        parse_environment).
+
+        @rtype: Environment
+        @return: Given environment or its ArrayEnvironment version
+        """
         params = self.return_element_if_exist(main_sock, "params", False)
+        if weights is None:
+            weights = environment.weights
 
-        chooser = None
-        colour_order = None
         if params is not None:
             dist = self.return_if_exist(params, "distance", "value", float)
-            chooser = RandomStimuliChooser(use_distance=True, distance=dist)
-            
+            if dist is None:
+                environment.stimuli_chooser = RandomStimuliChooser()
+            else:
+                environment.stimuli_chooser = \
+                    RandomStimuliChooser(use_distance=True, distance=dist)
+
             word_naming_per_color = \
             self.return_if_exist(params, "word_naming_per_color", "value", str)
             if word_naming_per_color:
-                colour_order = extract_colour_order(list_of_stimuli, word_naming_per_color)
+                environment.colour_order = extract_colour_order(
+                    environment.stimuli, word_naming_per_color)
         else:
-            chooser = RandomStimuliChooser()
+            environment.stimuli_chooser = RandomStimuliChooser()
 
-        return Environment(list_of_stimuli, chooser, colour_order)
+        if weights is not None:
+            environment.set_weights(weights)
+
+        shared = main_sock.getAttribute("shared") \
+            if main_sock is not None else ""
+        representation = metric = None
+        if params is not None:
+            representation = self.return_if_exist(params, "representation",
+                                                  "value", str)
+            metric = self.return_if_exist(params, "metric", "value", str)
+        if isinstance(environment, ArrayEnvironment):
+            if metric is not None and metric != environment.metric:
+                raise ValueError("Environment published with metric %s"
+                                 % environment.metric)
+        elif representation == "array" or shared or metric is not None:
+            environment = ArrayEnvironment.from_environment(environment,
+                                                            metric)
+
+        if params is not None and \
+                self.return_element_if_exist(params, "context_buffer", False):
+            environment.use_context_buffer(self.return_if_exist(params,
+                "context_buffer", "value", int))
+        return environment
 
     def parse_discrimination_game(self, inter):
         params = self.return_element_if_exist(inter, "params", False)
@@ -0,0 +1,75 @@
+"""
+Module with tools for weighted sampling (Walker's alias method)
+"""
+from random import random
+
+import numpy as np
+
+
+def alias_table(weights):
+    """
+    Builds alias table for given weights (Vose's variant).
+
+    @param weights: non negative numbers, at least one positive
+    @type weights: sequence
+
+    @rtype: tuple
+    @return: (prob, alias) - lists of length len(weights); index i is taken
+    with probability prob[i], otherwise alias[i] is taken
+    """
+    n = len(weights)
+    total = float(sum(weights))
+    if n == 0 or total <= 0. or min(weights) < 0.:
+        raise ValueError("Weights must be non negative with positive sum")
+
+    prob = [w * n / total for w in weights]
+    alias = range(n)
+    small = [i for i, p in enumerate(prob) if p < 1.]
+    large = [i for i, p in enumerate(prob) if p >= 1.]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1. - prob[s]
+        if prob[l] < 1.:
+            small.append(l)
+        else:
+            large.append(l)
+
+    # what is left is equal to 1 up to rounding errors
+    for i in small + large:
+        prob[i] = 1.
+    return prob, alias
+
+
+class AliasSampler(object):
+    """
+    Draws indices 0..len(weights)-1 with probabilities proportional to
+    weights in O(1) time.
+    """
+
+    _arrays = None
+
+    def __init__(self, weights):
+        self.prob, self.alias = alias_table(weights)
+        self.n = len(self.prob)
+
+    def sample(self):
+        i = int(random() * self.n)
+        if random() < self.prob[i]:
+            return i
+        return self.alias[i]
+
+    def sample_array(self, size, rng=np.random):
+        """
+        Draws array of given shape of indices at once.
+
+        @param rng: numpy RandomState (or numpy.random)
+        """
+        if self._arrays is None:
+            self._arrays = (np.array(self.prob), np.array(self.alias))
+        prob, alias = self._arrays
+        i = rng.randint(self.n, size=size)
+        return np.where(rng.random_sample(size) < prob[i], i, alias[i])
+
+    def __len__(self):
+        return self.n
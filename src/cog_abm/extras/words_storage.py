@@ -5,33 +5,217 @@ Created on Dec 29, 2012
 
 @author: mlukasik 
 '''
-def store_words(agents, colour_order, out_file):
+import os
+
+import numpy as np
+
+CATEGORIES_FILE = "categories.npz"
+WORDS_FILE = "words.pout"
+
+
+def store_classification(agents, colour_order, prefix):
+    """
+    Classifies colour_order stimuli by all agents once and stores the
+    category matrix (prefix + CATEGORIES_FILE, see save_categories) and
+    words of agents (prefix + WORDS_FILE, if they have lexicons) computed
+    from it.
+
+    @return: category matrix, see category_matrix
+    """
+    categories = category_matrix(agents, colour_order)
+    save_categories(prefix + CATEGORIES_FILE, agents, colour_order,
+                    categories)
+    if all(hasattr(a.state, "word_for") for a in agents):
+        store_words(agents, colour_order, prefix + WORDS_FILE, categories)
+    return categories
+
+
+def store_words(agents, colour_order, out_file, categories=None):
     """Stores words used by agents to a file.
     
     agents - list of agents
     colour_order - list of colours as they are going to be passed to agents for namings
     out_file - output file name to store results
+    categories - category matrix of colour_order (see category_matrix), if
+    already known
     
     """
-    agents_words_string = get_agents_words(agents, colour_order)
+    agents_words_string = get_agents_words(agents, colour_order, categories)
     agents_words_numerical = convert2numerical(agents_words_string)
     save_words_to_file(agents_words_numerical, out_file)
     
-def get_agents_words(agents, colour_order):
+def get_agents_words(agents, colour_order, categories=None):
     """
     Extract agents' words assigned to each of the stimuli from colour_order.
     
     """
     #a dictionary mapping agent to a list of namings for consecutive colours:
-    agentsdict = {}
-    for colour in colour_order:#stimuli:
-        #add this colour to each agent:
-        for ind, agent in enumerate(agents):
-            #print agent.sense_and_classify(colour), 
-            word = agent.state.word_for(agent.sense_and_classify(colour))
-            agentsdict[ind] = agentsdict.get(ind, []) + [word]
-            
-    return agentsdict
+    if not len(colour_order):
+        return {}
+    matrix, words = naming_matrix(agents, colour_order, categories)
+    words = words + [None]  # -1 stands for None
+    return dict((ind, [words[w] for w in row])
+                for ind, row in enumerate(matrix.tolist()))
+
+
+def category_matrix(agents, stimuli):
+    """
+    Categories of all stimuli for all agents. Agents whose state has
+    classify_all(samples) classify all stimuli at once, others one by one.
+
+    @rtype: numpy.ndarray
+    @return: (agents x stimuli) int32 matrix of (integer) ids of categories,
+    -1 for None
+    """
+    matrix = np.empty((len(agents), len(stimuli)), dtype=np.int32)
+    for i, agent in enumerate(agents):
+        classify_all = getattr(agent.state, "classify_all", None)
+        if classify_all is not None:
+            matrix[i] = classify_all([agent.sense(s) for s in stimuli])
+        else:
+            matrix[i] = [-1 if c is None else c for c in
+                         (agent.sense_and_classify(s) for s in stimuli)]
+    return matrix
+
+
+def save_categories(fname, agents, stimuli, matrix):
+    """
+    Stores category matrix (with ids of agents and values of stimuli, so
+    its rows and columns can be matched later) in compressed npz file.
+    """
+    np.savez_compressed(fname, categories=matrix,
+        agents=np.array([a.id for a in agents], dtype=np.int64),
+        values=np.array([s.get_values() for s in stimuli], dtype=float))
+
+
+def load_categories(fname, agents, stimuli):
+    """
+    Category matrix stored by save_categories, restricted to given agents
+    and stimuli (columns are matched by values of stimuli).
+
+    @return: (agents x stimuli) matrix or None if file doesn't exist or
+    categories of some of agents or stimuli aren't stored in it
+    """
+    if not os.path.exists(fname):
+        return None
+    with np.load(fname) as data:
+        if data["agents"].tolist() != [a.id for a in agents]:
+            return None
+        columns = dict((tuple(v), j)
+                       for j, v in enumerate(data["values"].tolist()))
+        idx = [columns.get(tuple(map(float, s.get_values())))
+               for s in stimuli]
+        if None in idx:
+            return None
+        return data["categories"][:, idx]
+
+
+def naming_matrix(agents, stimuli, categories=None):
+    """
+    Names given by agents to stimuli in one pass: word of agent for every
+    stimulus is looked up once per category of agent.
+
+    @param categories: category matrix of stimuli (see category_matrix), if
+    already known - stimuli aren't classified then
+    @rtype: tuple
+    @return: (matrix, words) - (agents x stimuli) int32 matrix of numbers of
+    words (indices in list words, -1 for no word)
+    """
+    matrix = np.empty((len(agents), len(stimuli)), dtype=np.int32)
+    codes = {None: -1}
+    words = []
+    if categories is not None:
+        for i, agent in enumerate(agents):
+            ids, inverse = np.unique(categories[i], return_inverse=True)
+            row = np.empty(len(ids), dtype=np.int32)
+            for k, category in enumerate(ids.tolist()):
+                word = agent.state.word_for(None if category == -1
+                                            else category)
+                code = codes.get(word)
+                if code is None:
+                    code = codes[word] = len(words)
+                    words.append(word)
+                row[k] = code
+            matrix[i] = row[inverse]
+        return matrix, words
+
+    for i, agent in enumerate(agents):
+        category_codes = {}
+        row = matrix[i]
+        for j, stimulus in enumerate(stimuli):
+            category = agent.sense_and_classify(stimulus)
+            code = category_codes.get(category)
+            if code is None:
+                word = agent.state.word_for(category)
+                code = codes.get(word)
+                if code is None:
+                    code = codes[word] = len(words)
+                    words.append(word)
+                category_codes[category] = code
+            row[j] = code
+    return matrix, words
+
+
+def name_counts(matrix, num_words=None):
+    """
+    Counts of names of stimuli.
+
+    >>> name_counts(np.array([[0, 1, -1], [0, 0, -1]])).tolist()
+    [[2, 0], [1, 1], [0, 0]]
+
+    @return: (stimuli x words) matrix, agents without word are not counted
+    """
+    if num_words is None:
+        num_words = int(matrix.max()) + 1 if matrix.size else 0
+    num_stimuli = matrix.shape[1]
+    # column 0 collects agents without word
+    flat = np.arange(num_stimuli) * (num_words + 1) + (matrix + 1)
+    counts = np.bincount(flat.ravel(), minlength=num_stimuli * (num_words + 1))
+    return counts.reshape(num_stimuli, num_words + 1)[:, 1:]
+
+
+def mode_names(matrix, num_words=None):
+    """
+    Most common name of every stimulus and fraction of agents using it.
+
+    >>> names, fractions = mode_names(np.array([[0, 1, -1], [0, 0, -1]]))
+    >>> names.tolist(), fractions.tolist()
+    ([0, 0, -1], [1.0, 0.5, 0.0])
+    """
+    counts = name_counts(matrix, num_words)
+    if not counts.shape[1]:
+        return (np.repeat(-1, matrix.shape[1]),
+                np.zeros(matrix.shape[1]))
+    names = counts.argmax(axis=1)
+    best = counts[np.arange(len(names)), names]
+    names[best == 0] = -1
+    return names, best / float(matrix.shape[0])
+
+
+def consensus(matrix, num_words=None):
+    """
+    Probability that two different agents give stimulus the same name
+    (averaged over stimuli).
+
+    >>> consensus(np.array([[0, 1], [0, 0], [0, -1]]))
+    0.5
+    """
+    n = matrix.shape[0]
+    if n < 2 or not matrix.shape[1]:
+        return 0.
+    counts = name_counts(matrix, num_words).astype(float)
+    pairs = (counts * (counts - 1)).sum(axis=1) / (n * (n - 1))
+    return float(pairs.mean())
+
+
+def synonymy(matrix, num_words=None):
+    """
+    Number of different names of every stimulus in population.
+
+    >>> synonymy(np.array([[0, 1, -1], [0, 0, -1]])).tolist()
+    [1, 2, 0]
+    """
+    return (name_counts(matrix, num_words) > 0).sum(axis=1)
     
 def convert2numerical(agents_words):
     """ 
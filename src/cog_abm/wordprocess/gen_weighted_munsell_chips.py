@@ -33,7 +33,7 @@ if __name__ == "__main__":
 		sys.exit(1)
 	side = sys.argv[2]
 	if len(sys.argv) < 4:
-		print "3. parameter: how many time one half is going to be multiplied."
+		print "3. parameter: sampling weight of one half (how many times it is multiplied)."
 		sys.exit(1)
 	freq = int(sys.argv[3])
 	if len(sys.argv) < 5:
@@ -51,9 +51,9 @@ if __name__ == "__main__":
 	print "<environment type=\"CIELab\">"
 	
 	for x, y, z in for_each_chip(open(fname, 'r')):
-		print_munsell_chip((x, y, z))
 		if is_to_be_multiplied((x, y, z), coordinate, side, mid_pnt):
-			for _ in xrange(freq-1):
-				print_munsell_chip((x, y, z))
+			print_munsell_chip((x, y, z), weight=freq)
+		else:
+			print_munsell_chip((x, y, z))
 	
 	print "</environment>"
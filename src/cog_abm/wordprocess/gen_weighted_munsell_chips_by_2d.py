@@ -58,12 +58,12 @@ if __name__ == "__main__":
 	fout.write("<environment type=\"CIELab\">\n")
 	
 	for ind, munsell_coordinates in enumerate(for_each_chip(open(munsell_fname, 'r'))):
-		print_munsell_chip(munsell_coordinates, fout)
 		x, y = position2coordinates[ind+1]
 		if is_to_be_multiplied(x, y):
-			for _ in xrange(freq-1):
-				print_munsell_chip(munsell_coordinates, fout)
+			print_munsell_chip(munsell_coordinates, fout, freq)
 			mtx[x][y] = freq
+		else:
+			print_munsell_chip(munsell_coordinates, fout)
 		
 	fout.write("</environment>\n")
 	
@@ -269,7 +269,7 @@ def for_each_chip(f):
 		l = f.readline()
 		if not l:
 			break
-		if "<munsell_chip>" in l:
+		if "<munsell_chip" in l:
 			x = get_numerical(f.readline())
 			y = get_numerical(f.readline())
 			z = get_numerical(f.readline())
@@ -363,11 +363,16 @@ def ensure_dir(f):
 
 #############################################################################################################
 import sys
-def print_munsell_chip(point, fout=sys.stdout):
+def print_munsell_chip(point, fout=sys.stdout, weight=None):
 	'''Prints a point in a Munsell Chip manner.
+	
+	weight - sampling weight of the chip in the environment (None - default)
 	'''
 	(x, y, z) = point
-	fout.write("\t<munsell_chip>\n")
+	if weight is None:
+		fout.write("\t<munsell_chip>\n")
+	else:
+		fout.write("\t<munsell_chip weight=\"%g\">\n" % weight)
 	fout.write("\t\t<L>%f</L>\n" % x)
 	fout.write("\t\t<a>%f</a>\n" % y)
 	fout.write("\t\t<b>%f</b>\n" % z)
@@ -11,6 +11,7 @@ from presenter import grapefruit
 from cog_abm.extras.color import *
 from cog_abm.core.result import *
 from steels.steels_experiment import *
+from cog_abm.extras.words_storage import load_categories, CATEGORIES_FILE
 #from steels.analyzer import *
 from time import time
 
@@ -35,7 +36,7 @@ class AgentData(object):
 		self.focals = []
 		self.ff = find_focal
 
-	def handle_categories(self, iter, agent):
+	def handle_categories(self, iter, agent, categories=None):
 		#start_time = time()
 		self.painted.append(range(330))
 		self.focals.append({})
@@ -44,8 +45,7 @@ class AgentData(object):
 			return
 
 		dictionary = {}
-		category_set = [agent.state.classify(stimuli) 
-		                for stimuli in self.cielab]
+		category_set = self.classify(agent, categories)
 		#print category_set
 
 		for i in xrange(len(category_set)):
@@ -70,6 +70,14 @@ class AgentData(object):
 
 		#print "Focal handling lasts %f - %f percent of handling category time." % (float(time() - focal_time), float((time() - focal_time)/(time() - start_time)))
 
+	def classify(self, agent, categories=None):
+		"""categories - categories of chips stored with snapshot (row of
+		category matrix, see words_storage.load_categories), if available"""
+		if categories is None:
+			return [agent.state.classify(stimuli)
+			        for stimuli in self.cielab]
+		return [None if c == -1 else c for c in categories.tolist()]
+
 	def set_focal(self, iter, category_set, focal):
 		painted = self.painted[iter]
 		for i in xrange(len(category_set)):
@@ -113,7 +121,7 @@ class AgentDataWithLanguage(AgentData):
 		self.names = []
 		self.focal_names = []
 
-	def handle_categories(self, iter, agent):
+	def handle_categories(self, iter, agent, categories=None):
 		#start_time = time()
 		self.painted.append(range(330))
 		self.focals.append({})
@@ -123,8 +131,7 @@ class AgentDataWithLanguage(AgentData):
 		if (iter == 0):
 			return
 		dictionary = {}
-		category_set = [agent.state.classify(stimuli) 
-		                for stimuli in self.cielab]
+		category_set = self.classify(agent, categories)
 		#print category_set
 
 		for i in xrange(len(category_set)):
@@ -456,6 +463,7 @@ class MunsellPaletteInterface(object):
 		self.window.set_position(gtk.WIN_POS_CENTER)
 		self.window.set_default_size(1280,-1)
 		self.iterations = []
+		self.category_sets = []
 		self.stimuli = []
 		self.colors = []
 		self.agents_data = []
@@ -497,7 +505,8 @@ class MunsellPaletteInterface(object):
 		for j in xrange(len(self.iterations)):
 			agent = self.result_set[j]
 			for i in xrange(len(agent)):
-				self.agents_data[i].handle_categories(j, agent[i])
+				self.agents_data[i].handle_categories(j, agent[i],
+				                                      self.categories_of(j, i))
 
 	def get_results_from_folder(self, path):
 		print "From: ", path
@@ -510,9 +519,15 @@ class MunsellPaletteInterface(object):
 				self.result_set.append(self.get_iteration_from_file
 				                       (os.path.join(path, file)))
 
-		zipped = zip(self.iterations, self.result_set)
-		zipped.sort()
-		(self.iterations, self.result_set) = zip(*zipped)
+		zipped = zip(self.iterations, self.result_set, self.category_sets)
+		zipped.sort(key=lambda x: x[0])
+		(self.iterations, self.result_set, self.category_sets) = zip(*zipped)
+
+	def categories_of(self, iter, agent_nr):
+		categories = self.category_sets[iter]
+		if categories is None:
+			return None
+		return categories[agent_nr]
 
 	def get_iteration_from_file(self, source):
 		with open(source, 'r') as file:
@@ -520,6 +535,10 @@ class MunsellPaletteInterface(object):
 
 		self.iterations.append(tuple[0]) 
 		agents = tuple[1]
+		#categories of chips dumped with snapshot - no need to classify
+		self.category_sets.append(load_categories(
+			os.path.splitext(source)[0] + CATEGORIES_FILE, agents,
+			self.stimuli))
 
 		#constant number of agents for every iteration
 		self.agents_size = len(agents)
@@ -657,7 +676,8 @@ class MunsellPaletteInterfaceWithLanguage(MunsellPaletteInterface):
 			agent = self.result_set[j]
 			for i in xrange(len(agent)):
 				try:  
-					self.agents_data[i].handle_categories(j, agent[i])
+					self.agents_data[i].handle_categories(j, agent[i],
+					                                      self.categories_of(j, i))
 				except:
 					print "Could not handle agent categories:", 
 					sys.exc_info()[0]
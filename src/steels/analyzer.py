@@ -1,11 +1,19 @@
 
 
 import sys
+import os
+import re
+import anydbm
 import logging
 import cPickle
+import hashlib
 import math
+import shelve
 
-from itertools import imap
+import numpy as np
+
+from itertools import imap, izip, repeat
+from multiprocessing import Pool
 from time import time
 
 sys.path.append('../')
@@ -35,15 +43,41 @@ def wmax(lista):
 
 
 
+def get_stimuli(params, agents=None):
+    try:
+        return params['environments']['global'].stimuli
+    except:
+        if 'STIMULI' not in params and agents:
+            # snapshots read without parameters of simulation
+            return agents[0].env.stimuli
+        return params['STIMULI']
+
+
+categories_computed = {}
+# iteration -> file with categories stored with snapshot
+categories_stored = {}
+
+def categories(agents, params, it):
+    """ (agents x stimuli) category matrix (see words_storage.category_matrix)
+    stored with snapshot or computed, None if categories aren't integer ids
+    """
+    if it not in categories_computed:
+        stimuli = get_stimuli(params, agents)
+        tmpr = None
+        if it in categories_stored:
+            tmpr = load_categories(categories_stored[it], agents, stimuli)
+        if tmpr is None and all(hasattr(a.state, 'classify_all')
+                                for a in agents):
+            tmpr = category_matrix(agents, stimuli)
+        categories_computed[it] = tmpr
+    return categories_computed[it]
+
+
 cc_computed = {}
 
 def count_categ(agents, params, it):
 
     global cc_computed
-    try:
-        stimuli = params['environments']['global'].stimuli
-    except:
-        stimuli = params['STIMULI']
 
     def pom(a):
         Z = {}
@@ -53,14 +87,83 @@ def count_categ(agents, params, it):
 
     tmpr = cc_computed.get(it, None)
     if tmpr is None:
-        tmpr = [pom(a) for a in agents]
+        matrix = categories(agents, params, it)
+        if matrix is None:
+            stimuli = get_stimuli(params, agents)
+            tmpr = [pom(a) for a in agents]
+        else:
+            tmpr = [len(np.unique(row)) for row in matrix]
         cc_computed[it] = tmpr
 
     return tmpr
 
 
 
+naming_computed = {}
+
+def naming(agents, params, it):
+    """ (agents x stimuli) matrix of names, see words_storage.naming_matrix
+    """
+    tmpr = naming_computed.get(it, None)
+    if tmpr is None:
+        tmpr, _ = naming_matrix(agents, get_stimuli(params, agents),
+                                categories(agents, params, it))
+        naming_computed[it] = tmpr
+    return tmpr
+
+
+
+def context_size(params):
+    """ Size of contexts of games, the default one of DiscriminationGame if
+    parameters don't give it
+    """
+    return (params or {}).get('context_size') or \
+        DiscriminationGame.def_context_len
+
+
+frozen_computed = {}
+
+# games played by every snapshot - the same ones (common random numbers)
+EVAL_GAMES = 1000
+EVAL_SEED = 0
+
+def frozen(agents, params, it):
+    """ (DS, CS) of population evaluated without learning, see
+    evaluation.evaluate
+    """
+    tmpr = frozen_computed.get(it, None)
+    if tmpr is None:
+        tmpr = evaluate(agents, EVAL_GAMES, context_size(params), EVAL_SEED)
+        frozen_computed[it] = tmpr
+    return tmpr
+
+
+def exact_DS(agents, params, it):
+    """ DS from exact probabilities of discrimination of all stimuli, see
+    evaluation.discrimination_map, None if stimuli of contexts aren't drawn
+    independently (e.g. with distance)
+    """
+    stimuli = get_stimuli(params, agents)
+    chooser = agents[0].env.stimuli_chooser
+    if not independent_contexts(chooser):
+        return None
+    weights = getattr(chooser, 'weights', None)
+    if weights is not None and len(weights) != len(stimuli):
+        weights = None  # they are weights of other stimuli
+    matrix = categories(agents, params, it)
+    if matrix is None:
+        matrix = classification_matrix(agents, stimuli)
+    probabilities = discrimination_map(matrix, context_size(params), weights)
+    return expected_DS(probabilities, weights)
+
+
+
 from metrics import *
+from evaluation import evaluate, classification_matrix, \
+    discrimination_map, expected_DS, independent_contexts
+from steels_experiment import DiscriminationGame
+from cog_abm.extras.words_storage import naming_matrix, mode_names, \
+    consensus, synonymy, category_matrix, load_categories, CATEGORIES_FILE
 
 #def avg_cc(agents, params, it):
 #       return [float(sum(count_categ(agents, params, it))) / len(agents)]
@@ -74,7 +177,18 @@ fun_map = {
                 'DS': lambda ag, par, it: [DS(ag, it)],
                 'CSA': lambda ag, par, it: map(CS_A, ag),
                 'CS': lambda ag, par, it: [CS(ag, it)],
-                'cv': lambda ag, par, it:[cv(ag, it)]
+                'cv': lambda ag, par, it:[cv(ag, it)],
+                'DSF': lambda ag, par, it: [frozen(ag, par, it)[0]],
+                'CSF': lambda ag, par, it: [frozen(ag, par, it)[1]],
+                'DSX': lambda ag, par, it: [exact_DS(ag, par, it)],
+                'cvs': lambda ag, par, it:
+                    list((sampled_cv(ag, it) or [None] * 4)[:3]),
+                'consensus': lambda ag, par, it:
+                    [consensus(naming(ag, par, it))],
+                'mode': lambda ag, par, it: list(
+                    mode_names(naming(ag, par, it))[1]),
+                'synonymy': lambda ag, par, it: list(
+                    synonymy(naming(ag, par, it)))
                 }
 
 
@@ -92,13 +206,203 @@ def gen_res(results, params, funs):
     logging.info("Calculating stats...")
 
     pb = get_progressbar()
-    retv = [[x for f in funs for x in f(agents, params, it)]
-                                    for it, agents in pb(results)]
+    retv = []
+    for it, agents in pb(results):
+        retv.append([x for f in funs for x in f(agents, params, it)])
+        cc_computed.pop(it, None)
+        naming_computed.pop(it, None)
+        categories_computed.pop(it, None)
+        frozen_computed.pop(it, None)
 
     logging.info("Calculating stats finished. Total time: "+str(time()-start_time))
     return retv
 
 
+def get_function(arg):
+    """ Statistic for its name (e.g. "cv" or "avg_DSA"), None if unknown
+    """
+    ind = arg.find("_")
+    if ind != -1:
+        p_fun = pref_fun_map.get(arg[0:ind])
+        m_fun = fun_map.get(arg[ind+1:len(arg)])
+        if p_fun is not None and m_fun is not None:
+            return compose(p_fun, m_fun)
+    return fun_map.get(arg, None)
+
+
+SNAPSHOT_FILE = re.compile(r"^(\d+)\.pout$")
+
+
+def snapshot_files(directory):
+    """ Snapshots dumped by simulation (files <iteration>.pout) in order of
+    iterations
+    """
+    found = []
+    for name in os.listdir(directory):
+        m = SNAPSHOT_FILE.match(name)
+        if m is not None:
+            found.append((int(m.group(1)), os.path.join(directory, name)))
+    found.sort()
+    return [path for _, path in found]
+
+
+class StatsCache(object):
+    """
+    Persistent cache of statistics of snapshots (shelve file), keyed by
+    hash of content of snapshot (or path of results file and iteration, see
+    results_keys), fingerprint of parameters (see params_fingerprint) and
+    name of statistic.
+    """
+
+    def __init__(self, path):
+        self.db = shelve.open(path, protocol=cPickle.HIGHEST_PROTOCOL)
+
+    def get(self, key, name):
+        return self.db.get(key + ":" + name)
+
+    def put(self, key, name, value):
+        self.db[key + ":" + name] = value
+
+    def close(self):
+        self.db.close()
+
+
+def open_cache(path):
+    """ StatsCache in path or None if it can't be opened (e.g. read-only
+    directory)
+    """
+    try:
+        return StatsCache(path)
+    except anydbm.error + (OSError,), e:
+        logging.warning("Can't open cache %s (%s), statistics won't be "
+                        "cached", path, e)
+        return None
+
+
+def params_fingerprint(params):
+    """ Hash of parameters and constants which statistics depend on besides
+    snapshots
+    """
+    return hashlib.sha1(repr((context_size(params), EVAL_GAMES,
+                              EVAL_SEED))).hexdigest()[:16]
+
+
+def snapshot_key(snapshot):
+    """ Hash of content of snapshot file or of pickled snapshot
+    """
+    h = hashlib.sha1()
+    if isinstance(snapshot, basestring):
+        with open(snapshot, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), ""):
+                h.update(chunk)
+    else:
+        h.update(cPickle.dumps(snapshot, cPickle.HIGHEST_PROTOCOL))
+    return h.hexdigest()
+
+
+def results_keys(path, snapshots):
+    """
+    Keys of snapshots of results file in cache - its path and iterations
+    of snapshots, so statistics stay cached when snapshots are appended to
+    the file.
+    """
+    path = os.path.abspath(path)
+    return ["%s:%s" % (path, snapshot[0]) for snapshot in snapshots]
+
+
+def _compute(snapshot, params, names):
+    """ Values of statistics of snapshot (list for every name)
+    """
+    if not names:
+        return []
+    stored = None
+    if isinstance(snapshot, basestring):
+        # categories dumped with snapshot, see words_storage.store_classification
+        stored = os.path.splitext(snapshot)[0] + CATEGORIES_FILE
+        with open(snapshot, "rb") as f:
+            snapshot = cPickle.load(f)
+    it, agents = snapshot
+    if stored is not None:
+        categories_stored[it] = stored
+    try:
+        return [get_function(n)(agents, params, it) for n in names]
+    finally:
+        # every snapshot is seen once
+        categories_stored.pop(it, None)
+        cc_computed.pop(it, None)
+        naming_computed.pop(it, None)
+        categories_computed.pop(it, None)
+        frozen_computed.pop(it, None)
+
+
+_stream_params = None
+
+
+def _stream_init(params):
+    global _stream_params
+    import metrics
+    # workers of pool can't start pools of their own
+    metrics.CV_PROCESSES = 1
+    _stream_params = params
+
+
+def _stream_row(task):
+    return _compute(task[0], _stream_params, task[1])
+
+
+def stream_res(snapshots, params, names, processes=None, cache=None,
+               keys=None):
+    """
+    Computes statistics of snapshots in pool of processes, one snapshot by
+    one worker at a time. Rows are yielded in order of snapshots as soon
+    as they are ready.
+
+    @param snapshots: names of snapshot files (read by workers) or
+    snapshots (iteration, agents)
+    @param names: names of statistics (see get_function)
+    @param processes: number of workers, all processors by default, with 1
+    statistics are computed in this process
+    @param cache: only statistics missing in it are computed (and stored)
+    @type cache: StatsCache
+    @param keys: keys of snapshots in cache (e.g. results_keys), by default
+    snapshot_key of every snapshot
+    """
+    params = params or {}
+    if keys is None:
+        keys = repeat(None)
+    fingerprint = params_fingerprint(params)
+    tasks, known = [], []
+    for snapshot, key in izip(snapshots, keys):
+        values = {}
+        if cache is not None:
+            key = "%s:%s" % (key or snapshot_key(snapshot), fingerprint)
+            for n in names:
+                v = cache.get(key, n)
+                if v is not None:
+                    values[n] = v
+        known.append((key, values))
+        tasks.append((snapshot, [n for n in names if n not in values]))
+
+    pool = None
+    if processes == 1:
+        _stream_init(params)
+        results = imap(_stream_row, tasks)
+    else:
+        pool = Pool(processes, _stream_init, (params,))
+        results = pool.imap(_stream_row, tasks)
+    try:
+        for (key, values), (_, missing), computed in \
+                izip(known, tasks, results):
+            for n, v in zip(missing, computed):
+                values[n] = v
+                if cache is not None:
+                    cache.put(key, n, v)
+            yield [x for n in names for x in values[n]]
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
 def main():
 
     import optparse
@@ -116,6 +420,24 @@ def main():
     optp.add_option('-f','--file', action="store", dest='file', type="string",
                     help="input file with results. THIS OPTION IS NECESSARY!")
 
+    optp.add_option('-d','--dir', action="store", dest='dir', type="string",
+                    help="directory with snapshots (<iteration>.pout) "
+                    "read one by one - can be given instead of -f")
+
+    optp.add_option('-j','--jobs', action="store", dest='jobs', type="int",
+                    help="compute statistics of snapshots in given number "
+                    "of processes (all processors with -j 0)")
+
+    optp.add_option('--context_size', action="store", dest='context_size',
+                    type="int", help="size of contexts of games for DSF, "
+                    "CSF and DSX (by default from parameters of simulation, "
+                    "needed with -d if it isn't %s)" %
+                    DiscriminationGame.def_context_len)
+
+    optp.add_option('--cache', action="store", dest='cache', type="string",
+                    help="file with statistics computed before, new ones "
+                    "are stored in it too")
+
     optp.add_option('--xlabel', action="store", dest='xlabel', type="string",
                     help="Label of x-axis")
 
@@ -129,7 +451,7 @@ def main():
         optp.error("No argument given!")
 
 
-    if opts.file is None or opts.file == "":
+    if (opts.file is None or opts.file == "") and not opts.dir:
         optp.error("No or wrong file specified (option -f)")
 
     if opts.chart == True and len(args)<2:
@@ -150,43 +472,53 @@ def main():
     # Set up basic configuration, out to stderr with a reasonable default format.
     logging.basicConfig(level=log_level)
 
-    f = open(opts.file)
-    res, params = cPickle.load(f)
-    f.close()
+    res, params = None, None
+    if opts.file:
+        f = open(opts.file)
+        res, params = cPickle.load(f)
+        f.close()
+    if opts.dir:
+        res = snapshot_files(opts.dir)
+    if opts.context_size:
+        params = dict(params or {}, context_size=opts.context_size)
 
     funcs = []
+    names = []
     for arg in args:
-        ind = arg.find("_")
-        fun = None
-        if  ind != -1:
-            p_fun = pref_fun_map.get(arg[0:ind])
-
-            m_fun = fun_map.get(arg[ind+1:len(arg)])
-
-            if p_fun is not None and m_fun is not None:
-                fun = compose(p_fun, m_fun)
-
-
-        if fun is None:
-            fun = fun_map.get(arg, None)
+        fun = get_function(arg)
 
         if fun is not None:
             funcs.append(fun)
+            names.append(arg)
         else:
             logging.warning("Unrecognized option %s - ignoring", arg)
 
-    wyn = gen_res(res, params, funcs)
-
-    if opts.chart is not None:
-        from presenter.charts import wykres
-        data = []
-        #print wyn
-        map(lambda x: data.append((x[0], x[1:])), wyn)
-        wykres(data, opts.xlabel, opts.ylabel)
+    cache, keys = None, None
+    if opts.cache:
+        cache = open_cache(opts.cache)
+        if cache is not None and not opts.dir:
+            keys = results_keys(opts.file, res)
 
+    if opts.dir or opts.jobs is not None or cache is not None:
+        processes = 1 if opts.jobs is None else opts.jobs or None
+        wyn = stream_res(res, params, names, processes, cache, keys)
     else:
-        for r in wyn:
-            print "\t".join(imap(str, r))
+        wyn = gen_res(res, params, funcs)
+
+    try:
+        if opts.chart is not None:
+            from presenter.charts import wykres
+            data = []
+            #print wyn
+            map(lambda x: data.append((x[0], x[1:])), wyn)
+            wykres(data, opts.xlabel, opts.ylabel)
+
+        else:
+            for r in wyn:
+                print "\t".join(imap(str, r))
+    finally:
+        if cache is not None:
+            cache.close()
 
 
 
@@ -0,0 +1,301 @@
+"""
+Evaluation of frozen populations: discrimination and guessing games are
+played on snapshot of population without learning and without changing
+agents, so DS and CS are estimated from as many games as needed instead
+of sliding windows of games mixed with learning.
+
+Every agent classifies all stimuli at once (reactions of all reactive
+units to all stimuli), games only look classes and reactions up. Games
+(contexts and pairs of agents) are generated from seed, so snapshots
+evaluated with the same seed play the same games (common random
+numbers) and differences between them aren't blurred by sampling noise.
+Discrimination needs no games at all when stimuli of contexts are drawn
+independently - its probabilities for every topic follow from
+frequencies of categories (see discrimination_map).
+"""
+import cPickle
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from cog_abm.core.environment import RandomStimuliChooser
+from cog_abm.extras.lexicon import Word
+
+
+class FrozenAgent(object):
+    """
+    Classification of all stimuli by agent and its words for categories.
+    """
+
+    def __init__(self, agent, stimuli, values=None):
+        """
+        @param values: values of stimuli as sensed by agent, by default
+        they are sensed here
+        """
+        self.agent = agent
+        classifier = agent.state.classifier
+        if values is None:
+            samples = [agent.sense(s) for s in stimuli]
+        else:
+            samples = stimuli
+        self.categories, self.reactions = classifier.reactions(samples,
+                                                               values)
+        if self.categories:
+            self.classes = self.reactions.argmax(axis=1)
+        else:
+            # classify gives None for every stimulus
+            self.classes = np.repeat(-1, len(stimuli))
+        self._words = None
+        self._word_categories = {}
+
+    def category_ids(self):
+        """ Category (id) of every stimulus, -1 if agent has no categories
+        """
+        if not self.categories:
+            return self.classes.copy()
+        return np.array(self.categories)[self.classes]
+
+    def discrimination(self, contexts):
+        """ Results of discrimination games on contexts (topic first)
+
+        @param contexts: (games x context size) array of stimuli indices
+        @rtype: bool array
+        """
+        classes = self.classes[contexts]
+        return (classes == classes[:, :1]).sum(axis=1) == 1
+
+    def word(self, cls):
+        """ Word (id) for category (its position), -1 if there is none
+        """
+        if self._words is None:
+            self._words = []
+            for category in self.categories:
+                w = self.agent.state.word_for(category)
+                self._words.append(-1 if w is None else w.id)
+        return self._words[cls]
+
+    def category(self, word):
+        """ Category (position) for word (id), -1 if there is none
+        """
+        cls = self._word_categories.get(word)
+        if cls is None:
+            category = self.agent.state.category_for(Word.from_id(word))
+            cls = -1 if category is None else \
+                self.categories.index(category)
+            self._word_categories[word] = cls
+        return cls
+
+
+def freeze(agents, stimuli):
+    """ FrozenAgent for every agent, stimuli are sensed once for all of
+    them if they have simple sensors
+    """
+    values = None
+    if all(getattr(a.sensor, "mask", 0) is None for a in agents):
+        # simple sensors give stimuli as they are
+        values = np.array([s.get_values() for s in stimuli], dtype=float)
+    return [FrozenAgent(a, stimuli, values) for a in agents]
+
+
+def classification_matrix(agents, stimuli):
+    """
+    Categories of all stimuli for all agents.
+
+    @rtype: numpy.ndarray
+    @return: (agents x stimuli) int32 matrix of category ids, -1 for agents
+    without categories
+    """
+    if not agents:
+        return np.zeros((0, len(stimuli)), dtype=np.int32)
+    return np.array([f.category_ids() for f in freeze(agents, stimuli)],
+                    dtype=np.int32)
+
+
+def independent_contexts(chooser):
+    """ Whether stimuli of contexts are drawn independently by chooser (as
+    by RandomStimuliChooser without distance), see discrimination_map
+    """
+    return isinstance(chooser, RandomStimuliChooser) and \
+        not chooser.use_distance
+
+
+def discrimination_map(classes, context_size=4, weights=None):
+    """
+    Exact probabilities of success of discrimination game for every agent
+    and topic, when other stimuli of context are drawn independently (as
+    by RandomStimuliChooser without distance): game succeeds if none of
+    context_size - 1 other stimuli falls into category of topic, so it is
+    (1 - frequency of that category) ** (context_size - 1). They aren't
+    exact for other choosers (see independent_contexts), e.g. with
+    distance close stimuli - usually of the same category - never meet.
+
+    @param classes: (agents x stimuli) matrix of categories, see
+    classification_matrix
+    @param weights: probabilities of drawing stimuli (uniform if None), see
+    StimuliChooser.set_weights
+
+    >>> discrimination_map([[0, 0, 1, 2], [5, 5, 5, 5]], 3).tolist()
+    [[0.25, 0.25, 0.5625, 0.5625], [0.0, 0.0, 0.0, 0.0]]
+    """
+    classes = np.asarray(classes)
+    if weights is None:
+        weights = np.ones(classes.shape[1])
+    weights = np.asarray(weights, dtype=float) / np.sum(weights)
+    res = np.empty(classes.shape)
+    for i, row in enumerate(classes):
+        _, inverse = np.unique(row, return_inverse=True)
+        frequencies = np.bincount(inverse, weights=weights)
+        res[i] = np.maximum(1. - frequencies[inverse], 0.) ** \
+            (context_size - 1)
+    return res
+
+
+def expected_DS(probabilities, weights=None):
+    """ DS of population which plays infinitely many games (topics drawn
+    with weights), from discrimination_map
+    """
+    return float(np.average(np.mean(probabilities, axis=0),
+                            weights=weights))
+
+
+def plot_discrimination_map(probabilities, coordinates=None, filename=None):
+    """
+    Plots mean (over agents) probability of discrimination of every
+    stimulus - on grid if coordinates are given (e.g. (row, column) of chips
+    in WCS chart), otherwise by index of stimulus.
+
+    @param filename: where plot is saved, it is shown if None
+    """
+    import matplotlib.pyplot as plt
+    mean = np.mean(probabilities, axis=0)
+    if coordinates is None:
+        plt.plot(mean, ".")
+        plt.xlabel("stimulus")
+        plt.ylabel("probability of discrimination")
+    else:
+        coordinates = np.asarray(coordinates, dtype=int)
+        grid = np.empty(coordinates.max(axis=0) + 1)
+        grid.fill(np.nan)
+        grid[coordinates[:, 0], coordinates[:, 1]] = mean
+        img = plt.imshow(np.ma.masked_invalid(grid), interpolation="nearest",
+                         vmin=0., vmax=1.)
+        plt.colorbar(img)
+    if filename is None:
+        plt.show()
+    else:
+        plt.savefig(filename, bbox_inches="tight")
+        plt.close()
+
+
+def generate_games(env, context_size, games, num_agents, seed=0):
+    """
+    Contexts (chosen by stimuli chooser of env) and pairs (speaker, hearer)
+    of different agents.
+
+    @rtype: tuple
+    @return: ((games x context_size) array of stimuli indices,
+    (games x 2) array of agents positions)
+    """
+    rng = np.random.RandomState(seed)
+    state = random.getstate()
+    random.seed(seed)  # for choosers which aren't vectorized
+    try:
+        contexts = env.stimuli_chooser.get_indices_block(env, context_size,
+                                                          games, rng)
+    finally:
+        random.setstate(state)
+    contexts = np.asarray(contexts, dtype=int)
+    speakers = rng.randint(num_agents, size=games)
+    hearers = rng.randint(max(num_agents - 1, 1), size=games)
+    hearers += hearers >= speakers
+    if num_agents < 2:
+        hearers[:] = speakers
+    return contexts, np.column_stack((speakers, hearers))
+
+
+def guessing(frozen, contexts, pairs):
+    """
+    Expected results of guessing games: when more stimuli of context are
+    equally good for hearer, each of them is chosen with probability 1 /
+    their number (as after shuffle of context). As in GuessingGame, game
+    succeeds if chosen stimulus is equal to topic (also its duplicate in
+    context).
+
+    @rtype: float array
+    """
+    res = np.zeros(len(contexts))
+    disc = [f.discrimination(contexts) for f in frozen]
+    for g in xrange(len(contexts)):
+        s, h = pairs[g]
+        if not disc[s][g]:
+            continue
+        context = contexts[g]
+        speaker, hearer = frozen[s], frozen[h]
+        word = speaker.word(speaker.classes[context[0]])
+        if word == -1:
+            continue
+        cls = hearer.category(word)
+        if cls == -1:
+            continue
+        reactions = hearer.reactions[context, cls]
+        best = reactions == reactions.max()
+        res[g] = float((best & (context == context[0])).sum()) / best.sum()
+    return res
+
+
+def evaluate(agents, games=1000, context_size=4, seed=0):
+    """
+    Estimates DS (every agent plays discrimination games on all contexts)
+    and CS (guessing games between random pairs of agents) of frozen
+    population. CS is None when agents have no lexicons.
+
+    @rtype: tuple
+    @return: (DS, CS)
+    """
+    if not agents:
+        return 0., None
+    env = agents[0].env
+    frozen = freeze(agents, env.stimuli)
+    contexts, pairs = generate_games(env, context_size, games, len(agents),
+                                     seed)
+    ds = float(np.mean([f.discrimination(contexts).mean() for f in frozen]))
+    cs = None
+    if hasattr(agents[0].state, "lexicon") and len(agents) > 1:
+        cs = float(guessing(frozen, contexts, pairs).mean())
+    return ds, cs
+
+
+_eval_conf = None
+
+
+def _eval_init(conf):
+    global _eval_conf
+    _eval_conf = conf
+
+
+def _eval_snapshot(snapshot):
+    if isinstance(snapshot, basestring):
+        with open(snapshot, "rb") as f:
+            snapshot = cPickle.load(f)
+    it, agents = snapshot
+    return (it,) + evaluate(agents, **_eval_conf)
+
+
+def evaluate_snapshots(snapshots, games=1000, context_size=4, seed=0,
+                       processes=None):
+    """
+    Evaluates snapshots in pool of processes (one snapshot by one worker),
+    all of them with the same games.
+
+    @param snapshots: names of snapshot files or snapshots (iteration,
+    agents)
+    @return: (iteration, DS, CS) for every snapshot, in order of snapshots
+    """
+    conf = {"games": games, "context_size": context_size, "seed": seed}
+    pool = Pool(processes, _eval_init, (conf,))
+    try:
+        for res in pool.imap(_eval_snapshot, snapshots):
+            yield res
+    finally:
+        pool.terminate()
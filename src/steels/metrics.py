@@ -2,11 +2,20 @@
 This module implements measurements used in evaluating the outcome of the
 experiment.
 """
+import logging
 import math
+import random
+from functools import partial
+from itertools import combinations
+from multiprocessing import Pool, cpu_count
 
-from itertools import combinations, imap
+import numpy as np
 
-from cog_abm.extras.fitness import get_buffered_average
+from cog_abm.ML.core import euclidean_distance
+from cog_abm.extras.colour_difference import pairwise, SAMPLE_DISTANCES
+from cog_abm.extras.fitness import get_buffered_average, PopulationFitness
+
+log = logging.getLogger('steels')
 
 #WINDOW_SIZE = 20
 WINDOW_SIZE = 50
@@ -20,6 +29,38 @@ def get_CS_fitness():
     return get_buffered_average(WINDOW_SIZE)
 
 
+def set_population_fitness(agents, f_id):
+    """ Gives agents DS / CS (f_id "DG" / "GG") measures kept together in
+    PopulationFitness
+    """
+    population = PopulationFitness(len(agents), WINDOW_SIZE)
+    for agent, fm in zip(agents, population.measures()):
+        agent.set_fitness_measure(f_id, fm)
+    return population
+
+
+def _population(agents, f_id):
+    """ PopulationFitness with measures of exactly given (distinct) agents or
+    None, in O(1): all rows of population have to be bound to measures and
+    the first and the last agent have to share it
+    """
+    population = getattr(agents[0].get_fitness_measure(f_id),
+                         "population", None)
+    if population is None or \
+            not population.size == population.bound == len(agents) or \
+            getattr(agents[-1].get_fitness_measure(f_id), "population",
+                    None) is not population:
+        return None
+    return population
+
+
+def _average_fitness(agents, f_id):
+    population = _population(agents, f_id)
+    if population is not None:
+        return population.average()
+    return math.fsum(a.get_fitness(f_id) for a in agents) / len(agents)
+
+
 def DS_A(agent):
     return agent.get_fitness("DG")
 
@@ -27,7 +68,7 @@ def DS_A(agent):
 def DS(agents, it):
     if it == 0:
         return 0
-    return math.fsum(imap(DS_A, agents)) / len(agents)
+    return _average_fitness(agents, "DG")
 
 
 def CS_A(agent):
@@ -37,7 +78,7 @@ def CS_A(agent):
 def CS(agents, it):
     if it == 0:
         return 0
-    return math.fsum(imap(CS_A, agents)) / len(agents)
+    return _average_fitness(agents, "GG")
 
 
 def ru_dist(ru1, ru2):
@@ -45,7 +86,7 @@ def ru_dist(ru1, ru2):
     #return math.log(ru1[1], 0.001)*math.log(ru2[1], 0.001)*ru1[0].dist(ru2[0])
     #return ru1[1]*ru2[1]*ru1[0].dist(ru2[0])
     #what was in Steels:
-    return ru1[0].dist(ru2[0])
+    return ru1[0].central_value.distance(ru2[0].central_value)
 
 
 def d(A, B, m):
@@ -68,7 +109,232 @@ def D(a, ap):
     return d(a, ap, d_category)
 
 
+def _euclidean_table(x, y):
+    diff = x[:, np.newaxis, :] - y[np.newaxis, :, :]
+    return np.sqrt((diff * diff).sum(axis=2))
+
+
+def get_distance_table(dist_fun):
+    """ Function computing table of distances between rows of two arrays
+    equal to dist_fun of samples, None if it is not known
+    """
+    if dist_fun is euclidean_distance:
+        return _euclidean_table
+    for metric, fun in SAMPLE_DISTANCES.iteritems():
+        if fun is dist_fun:
+            return partial(pairwise, metric)
+    return None
+
+
+def agent_units(agent):
+    """
+    Reactive units of all categories of agent.
+
+    @rtype: tuple
+    @return: (centres, values, sizes) - central values of units (category
+    after category), their values as array, numbers of units in categories
+    """
+    units = [an.units for _, an in
+             agent.state.classifier.categories.iteritems()]
+    centres = [u.central_value for cat in units for u, _ in cat]
+    values = np.array([c.get_values() for c in centres], dtype=float)
+    return centres, values, np.array([len(cat) for cat in units])
+
+
+def vectorized_D(units1, units2, table=_euclidean_table):
+    """
+    Same as D for agents given by agent_units, computed with one table of
+    distances between all units of both agents and min-reductions over its
+    blocks (category pairs).
+
+    @param table: function giving table of distances between values of
+    units, None - distances of central values are computed one by one
+    """
+    centres1, values1, sizes1 = units1
+    centres2, values2, sizes2 = units2
+    if table is None:
+        dist = np.array([[c1.distance(c2) for c2 in centres2]
+                         for c1 in centres1], dtype=float)
+    else:
+        dist = table(values1, values2)
+    starts1 = np.concatenate(([0], np.cumsum(sizes1)[:-1]))
+    starts2 = np.concatenate(([0], np.cumsum(sizes2)[:-1]))
+    # sum over units of category A of distance to nearest unit of B
+    s1 = np.add.reduceat(np.minimum.reduceat(dist, starts2, axis=1),
+                         starts1, axis=0)
+    s2 = np.add.reduceat(np.minimum.reduceat(dist, starts1, axis=0),
+                         starts2, axis=1)
+    d_cat = (s1 + s2) / np.outer(sizes1, sizes2)
+    return (d_cat.min(axis=1).sum() + d_cat.min(axis=0).sum()) / d_cat.size
+
+
+_cv_data = None
+
+
+def _cv_init(units, table):
+    global _cv_data
+    _cv_data = units, table
+
+
+def _cv_pairs(pairs):
+    units, table = _cv_data
+    return [vectorized_D(units[i], units[j], table) for i, j in pairs]
+
+
+CV_PROCESSES = None  # None - number of processors
+CV_MIN_PARALLEL_PAIRS = 1000
+
+
+def fast_cv(agents, it, processes=None):
+    """
+    Same value as cv computed with vectorized_D, pairs of agents are split
+    among processes (for at least CV_MIN_PARALLEL_PAIRS pairs).
+
+    @param processes: number of processes, CV_PROCESSES by default
+    """
+    if it == 0:
+        return None
+    units = [agent_units(a) for a in agents]
+    nonempty = [i for i, u in enumerate(units) if len(u[2])]
+    pairs = list(combinations(nonempty, 2))
+    table = None
+    if nonempty:
+        table = get_distance_table(units[nonempty[0]][0][0].dist_fun)
+
+    processes = processes or CV_PROCESSES or cpu_count()
+    if processes > 1 and len(pairs) >= CV_MIN_PARALLEL_PAIRS:
+        chunks = [pairs[k::processes * 4] for k in xrange(processes * 4)]
+        pool = Pool(processes, _cv_init, (units, table))
+        try:
+            dists = [x for part in pool.map(_cv_pairs, chunks) for x in part]
+        finally:
+            pool.terminate()
+    else:
+        _cv_init(units, table)
+        dists = _cv_pairs(pairs)
+    return math.fsum(dists) * 2 / (len(agents) * (len(agents) - 1))
+
+
 def cv(agents, it):
+    """ See fast_cv
+    """
+    return fast_cv(agents, it)
+
+
+def _normal_quantile(p):
+    """ Inverse of standard normal distribution function (bisection)
+    """
+    lo, hi = -10., 10.
+    for _ in xrange(60):
+        mid = (lo + hi) / 2.
+        if 0.5 * (1. + math.erf(mid / math.sqrt(2.))) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2.
+
+
+def _nearest_category_distance(units1, k, units2, table):
+    """ min over categories B of agent 2 of d_category(A, B), where A is
+    k-th category of agent 1 (agents given by agent_units)
+    """
+    centres1, values1, sizes1 = units1
+    centres2, values2, sizes2 = units2
+    start = sizes1[:k].sum()
+    stop = start + sizes1[k]
+    if table is None:
+        dist = np.array([[c1.distance(c2) for c2 in centres2]
+                         for c1 in centres1[start:stop]], dtype=float)
+    else:
+        dist = table(values1[start:stop], values2)
+    starts2 = np.concatenate(([0], np.cumsum(sizes2)[:-1]))
+    s1 = np.minimum.reduceat(dist, starts2, axis=1).sum(axis=0)
+    s2 = np.add.reduceat(dist.min(axis=0), starts2)
+    return ((s1 + s2) / (sizes1[k] * sizes2)).min()
+
+
+def sampled_cv(agents, it, width=0.05, confidence=0.95, batch=50,
+               max_samples=20000, rng=None):
+    """
+    Estimate of cv with confidence interval. Samples are drawn until
+    width of interval is at most width * estimate (or there are
+    max_samples of them).
+
+    Samples are drawn from rng (random.Random), by default from a new one
+    with seed 0, never from global stream of random module, so estimates
+    don't change seeded simulations.
+
+    D of pair of agents is sum over categories of both agents of distance
+    to nearest category of the other agent, so single sample - random
+    pair of agents, one of them and its random category - gives unbiased
+    estimate of D from one row of distances between categories.
+
+    @rtype: tuple
+    @return: (estimate, low, high, number of samples), None for it == 0
+    """
+    if it == 0:
+        return None
+    if rng is None:
+        rng = random.Random(0)
+    nonempty = [a for a in agents if len(a.state.classifier.categories)]
+    if len(nonempty) < 2:
+        return 0., 0., 0., 0
+    # cv averages D over all pairs of agents, pairs with agents without
+    # categories count as 0
+    factor = float(len(nonempty) * (len(nonempty) - 1)) / \
+        (len(agents) * (len(agents) - 1))
+    z = _normal_quantile(0.5 + confidence / 2.)
+    units = {}
+    table = None
+    samples = []
+    while True:
+        for _ in xrange(batch):
+            a1, a2 = rng.sample(nonempty, 2)
+            for a in (a1, a2):
+                if a not in units:
+                    units[a] = agent_units(a)
+            if not samples:
+                table = get_distance_table(units[a1][0][0].dist_fun)
+            k = rng.randrange(len(units[a1][2]))
+            samples.append(2. * _nearest_category_distance(
+                units[a1], k, units[a2], table) / len(units[a2][2]))
+        estimate = factor * math.fsum(samples) / len(samples)
+        half = z * factor * np.std(samples, ddof=1) / math.sqrt(len(samples))
+        if 2 * half <= width * abs(estimate) or len(samples) >= max_samples:
+            return estimate, estimate - half, estimate + half, len(samples)
+
+
+class CVMonitor(object):
+    """
+    Logs sampled estimate of cv (see sampled_cv) during simulation - give
+    it as monitor of Simulation.
+    """
+
+    def __init__(self, every=1, seed=0, **kwargs):
+        """
+        @param every: estimate is computed at every every-th dump of results
+        @param seed: seed of random.Random of monitor used for all estimates
+        @param kwargs: arguments of sampled_cv
+        """
+        self.every = every
+        self.rng = random.Random(seed)
+        self.kwargs = kwargs
+        self.dumps = 0
+        self.history = []  # (iteration, estimate, low, high, samples)
+
+    def __call__(self, iteration, agents):
+        self.dumps += 1
+        if iteration == 0 or (self.dumps - 1) % self.every:
+            return
+        res = sampled_cv(agents, iteration, rng=self.rng, **self.kwargs)
+        self.history.append((iteration,) + res)
+        log.info("Iteration %s: cv ~ %.4f [%.4f, %.4f] (%s samples)" %
+                 self.history[-1])
+
+
+def slow_cv(agents, it):
+    """ cv computed directly from definition (D of every pair of agents)
+    """
     if it == 0:
         return None  # it's fine on graph
 
@@ -125,16 +391,10 @@ def cv_prim(agents_centres1, agents_centres2):
 def cat_dist(set1, set2):
     """ returns distance between 2 given sets
     """
-    sum1 = 0.
-    for e1 in set1:
-        h1 = min(basic_dist(e1, e2) for e2 in set2)
-        sum1 += h1
-
-    sum2 = 0
-    for e2 in set2:
-        h2 = min(basic_dist(e2, e1) for e1 in set1)
-        sum2 += h2
-    return 1.0 * (sum1 + sum2) / (len(set1) * len(set2))
+    dist = _euclidean_table(np.asarray(set1, dtype=float),
+                            np.asarray(set2, dtype=float))
+    return float(dist.min(axis=1).sum() + dist.min(axis=0).sum()) / \
+        (len(set1) * len(set2))
 
 
 def basic_dist(set1, set2):
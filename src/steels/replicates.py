@@ -0,0 +1,354 @@
+"""
+Running many simulations (replicates, parameter sweeps) on many hosts.
+
+Coordinator serves jobs (configurations of simulations) from a queue over
+plain TCP. Workers connect to it, take jobs one by one, run them (by
+default through steels_main.run) and send back status messages and
+results. While job is running worker sends heartbeats - jobs of workers
+which are silent for too long (or disconnected) go back to the queue.
+
+Messages are pickled tuples preceded by their length (4 bytes) and
+HMAC-SHA256 of pickle computed with key shared by coordinator and workers.
+Message is unpickled only if its HMAC is correct, so only holders of the
+key can send jobs and results (unpickling them can run any code).
+"""
+import cPickle
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import traceback
+from collections import deque
+from SocketServer import ThreadingTCPServer, StreamRequestHandler
+from time import time, sleep
+
+log = logging.getLogger('steels')
+
+HEADER = struct.Struct("!I")
+DIGEST_SIZE = hashlib.sha256().digest_size
+AUTHKEY_ENV = "STEELS_AUTHKEY"
+
+
+class AuthenticationError(Exception):
+    """ Message with wrong HMAC (sent without the shared key)
+    """
+    pass
+
+
+def _digest(authkey, data):
+    return hmac.new(authkey, data, hashlib.sha256).digest()
+
+
+def send_msg(sock, msg, authkey):
+    data = cPickle.dumps(msg, cPickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(data)) + _digest(authkey, data) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 2 ** 20))
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def recv_msg(sock, authkey):
+    size, = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    digest = _recv_exactly(sock, DIGEST_SIZE)
+    data = _recv_exactly(sock, size)
+    if not hmac.compare_digest(digest, _digest(authkey, data)):
+        raise AuthenticationError("Message with wrong HMAC")
+    return cPickle.loads(data)
+
+
+class _Handler(StreamRequestHandler):
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        authkey = coordinator.authkey
+        worker = "%s:%s" % self.client_address
+        try:
+            while True:
+                msg = recv_msg(self.connection, authkey)
+                if msg[0] == "get":
+                    worker = msg[1] or worker
+                send_msg(self.connection, coordinator.handle(worker, msg),
+                         authkey)
+        except AuthenticationError:
+            log.warning("Connection from %s:%s without valid key closed" %
+                        self.client_address)
+        except (EOFError, socket.error):
+            pass
+        finally:
+            coordinator.worker_lost(worker)
+
+
+class _Server(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator(object):
+    """
+    Serves jobs to workers and collects their results.
+    """
+
+    def __init__(self, jobs, host="127.0.0.1", port=0, heartbeat_timeout=60.,
+                 poll=0.5, authkey=None):
+        """
+        @param jobs: configurations of simulations, given to runner of worker
+        @type jobs: sequence of picklable objects
+        @param host: interface to listen on (only local connections by
+        default)
+        @param port: 0 means any free port (see address)
+        @param heartbeat_timeout: seconds without heartbeat after which job
+        is given to another worker
+        @param poll: how long (seconds) workers wait when there is no job
+        @param authkey: key shared with workers, random one is generated if
+        None (see authkey attribute)
+        """
+        self.authkey = authkey or os.urandom(32).encode("hex")
+        self.jobs = list(jobs)
+        self.pending = deque(xrange(len(self.jobs)))
+        self.running = {}  # job id -> [worker, time of last heartbeat]
+        self.results = {}
+        self.errors = {}
+        self.status = []  # (job id, worker, message)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.coordinator = self
+        self.address = self.server.server_address
+
+    def finished(self):
+        return len(self.results) + len(self.errors) == len(self.jobs)
+
+    def handle(self, worker, msg):
+        with self.lock:
+            kind = msg[0]
+            if kind == "get":
+                if self.pending:
+                    job = self.pending.popleft()
+                    self.running[job] = [worker, time()]
+                    log.info("Job %s given to %s" % (job, worker))
+                    return ("job", job, self.jobs[job])
+                if self.finished():
+                    return ("done",)
+                return ("wait", self.poll)
+
+            job = msg[1]
+            if kind == "heartbeat":
+                if job in self.running:
+                    self.running[job][1] = time()
+            elif kind == "status":
+                self.status.append((job, worker, msg[2]))
+            elif kind in ("result", "failed"):
+                self.running.pop(job, None)
+                if job in self.pending:
+                    self.pending.remove(job)
+                if job not in self.results and job not in self.errors:
+                    if kind == "result":
+                        self.results[job] = msg[2]
+                    else:
+                        log.error("Job %s failed on %s:\n%s" %
+                                  (job, worker, msg[2]))
+                        self.errors[job] = msg[2]
+            return ("ok",)
+
+    def _requeue(self, job):
+        del self.running[job]
+        if job not in self.results and job not in self.errors:
+            log.warning("Job %s lost, queued again" % job)
+            self.pending.appendleft(job)
+
+    def requeue_lost(self):
+        """ Puts back to queue jobs without heartbeat for too long
+        """
+        with self.lock:
+            limit = time() - self.heartbeat_timeout
+            for job, (_, last) in self.running.items():
+                if last < limit:
+                    self._requeue(job)
+
+    def worker_lost(self, worker):
+        with self.lock:
+            for job, (w, _) in self.running.items():
+                if w == worker:
+                    self._requeue(job)
+
+    def run(self):
+        """
+        Serves jobs until all are finished.
+
+        @rtype: list
+        @return: Results of jobs (None for failed ones, see errors).
+        """
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  kwargs={"poll_interval": self.poll})
+        thread.daemon = True
+        thread.start()
+        try:
+            while not self.finished():
+                sleep(self.poll)
+                self.requeue_lost()
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+        return [self.results.get(job) for job in xrange(len(self.jobs))]
+
+
+def run_replicate(config, status):
+    """
+    Default runner of jobs - config is dictionary with "param_file"
+    (simulation file for steels_main, default parameters if not given) and
+    optional "workdir" (where snapshots are dumped).
+
+    Simulation file and files given in it are relative to current directory,
+    so parameters are loaded before changing it to workdir.
+    """
+    from steels_main import load_params, run
+    params = load_params(config.get("param_file"))
+    cwd = os.getcwd()
+    workdir = config.get("workdir")
+    if workdir:
+        if not os.path.isdir(workdir):
+            os.makedirs(workdir)
+        os.chdir(workdir)
+    try:
+        status("started")
+        result = run(save=False, params=params)
+        status("finished")
+    finally:
+        os.chdir(cwd)
+    return result
+
+
+class Worker(object):
+    """
+    Takes jobs from coordinator and runs them until there are none left.
+    """
+
+    def __init__(self, host, port, authkey, runner=run_replicate,
+                 heartbeat=10., name=None):
+        """
+        @param authkey: key of coordinator
+        @param runner: function(config, status) running job, status is
+        function sending text message to coordinator
+        @param heartbeat: seconds between heartbeats
+        """
+        self.address = (host, port)
+        self.authkey = authkey
+        self.runner = runner
+        self.heartbeat = heartbeat
+        self.name = name or "%s:%s" % (socket.gethostname(), os.getpid())
+        self.lock = threading.Lock()
+        self.sock = None
+
+    def _call(self, msg):
+        with self.lock:
+            send_msg(self.sock, msg, self.authkey)
+            return recv_msg(self.sock, self.authkey)
+
+    def run(self):
+        """
+        @rtype: int
+        @return: Number of jobs done.
+        """
+        done = 0
+        self.sock = socket.create_connection(self.address)
+        try:
+            while True:
+                try:
+                    reply = self._call(("get", self.name))
+                except (EOFError, socket.error):
+                    # coordinator has finished
+                    break
+                if reply[0] == "job":
+                    self._do_job(reply[1], reply[2])
+                    done += 1
+                elif reply[0] == "wait":
+                    sleep(reply[1])
+                else:
+                    break
+        finally:
+            self.sock.close()
+        return done
+
+    def _do_job(self, job, config):
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat):
+                try:
+                    self._call(("heartbeat", job))
+                except (EOFError, socket.error):
+                    return
+
+        thread = threading.Thread(target=beat)
+        thread.daemon = True
+        thread.start()
+        try:
+            result = self.runner(config,
+                                 lambda text: self._call(("status", job, text)))
+        except Exception:
+            reply = ("failed", job, traceback.format_exc())
+        else:
+            reply = ("result", job, result)
+        finally:
+            stop.set()
+            thread.join()
+        self._call(reply)
+
+
+if __name__ == "__main__":
+    import optparse
+
+    optp = optparse.OptionParser(usage="%prog coordinator [options] "
+        "simulation.xml ... | %prog worker [options]")
+    optp.add_option('--host', action="store", dest="host",
+        default="127.0.0.1", help="host of coordinator (for coordinator: "
+        "interface to listen on, e.g. 0.0.0.0 for all of them)")
+    optp.add_option('--port', action="store", dest="port", type="int",
+        default=5555)
+    optp.add_option('-r', '--replicates', action="store", dest="replicates",
+        type="int", default=1, help="number of runs of every simulation")
+    optp.add_option('-t', '--heartbeat_timeout', action="store",
+        dest="timeout", type="float", default=60.)
+    optp.add_option('-k', '--authkey', action="store", dest="authkey",
+        default=os.environ.get(AUTHKEY_ENV), help="key shared by coordinator "
+        "and workers (default: $%s, coordinator generates random one if "
+        "it's not set)" % AUTHKEY_ENV)
+    opts, args = optp.parse_args()
+    if not args or args[0] not in ("coordinator", "worker"):
+        optp.error("Specify coordinator or worker")
+    if args[0] == "worker" and not opts.authkey:
+        optp.error("Specify key of coordinator (--authkey or $%s)" %
+                   AUTHKEY_ENV)
+    logging.basicConfig(level=logging.INFO)
+
+    # absolute, as workers change directory to workdirs of jobs
+    sys.path.append(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+    if args[0] == "coordinator":
+        from steels_main import save_res
+        jobs = [{"param_file": f, "workdir": "replicate_%s_%s" % (
+                    os.path.splitext(os.path.basename(f))[0], i)}
+                for f in args[1:] for i in xrange(opts.replicates)]
+        coordinator = Coordinator(jobs, opts.host, opts.port, opts.timeout,
+                                  authkey=opts.authkey)
+        if not opts.authkey:
+            print "Key for workers: %s" % coordinator.authkey
+        for job, result in zip(jobs, coordinator.run()):
+            if result is not None:
+                save_res(result, job["workdir"] + ".result")
+    else:
+        Worker(opts.host, opts.port, opts.authkey).run()
@@ -9,6 +9,8 @@ import numpy as np
 from cog_abm.core import Environment, Simulation
 from cog_abm.core.interaction import Interaction
 from cog_abm.core.environment import RandomStimuliChooser
+from cog_abm.core.topology import Topology
+from cog_abm.core.distributed import ShardedSimulation
 from cog_abm.agent.sensor import SimpleSensor
 from cog_abm.ML.core import Classifier
 from cog_abm.extras.additional_tools import generate_simple_network
@@ -131,6 +133,60 @@ class SteelsClassifier(Classifier):
         return max(self.categories.iteritems(),
             key=lambda kr: kr[1].reaction(sample))[0]
 
+    def reactions(self, samples, values=None):
+        """
+        Reactions of all categories to all samples at once - distances
+        between samples and central values of all units are computed as one
+        table (if distance function has vectorized version).
+
+        @param values: values of samples as array, if already known
+        @rtype: tuple
+        @return: (ids of categories, (samples x categories) array of
+        reactions)
+        """
+        ids, centres, mdub, weights, sizes = [], [], [], [], []
+        for category, an in self.categories.iteritems():
+            ids.append(category)
+            sizes.append(len(an.units))
+            for u, w in an.units:
+                centres.append(u.central_value)
+                mdub.append(u.mdub_sqr_sig)
+                weights.append(w)
+        res = np.zeros((len(samples), len(ids)), dtype=np.longdouble)
+        if not centres:
+            return ids, res
+
+        table = metrics.get_distance_table(centres[0].dist_fun)
+        if table is None:
+            dist = np.array([[c.distance(s) for c in centres]
+                             for s in samples], dtype=float)
+        else:
+            if values is None:
+                values = np.array([s.get_values() for s in samples],
+                                  dtype=float)
+            # central value is the reference colour (see
+            # ReactiveUnit.value_for), that matters for asymmetric metrics
+            dist = table(np.array([c.get_values() for c in centres],
+                                  dtype=float), values).T
+        unit_reactions = np.exp(dist.astype(np.longdouble) ** 2 *
+            np.array(mdub, dtype=np.longdouble)) * \
+            np.array(weights, dtype=np.longdouble)
+        sizes = np.array(sizes)
+        nonempty = np.flatnonzero(sizes)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[nonempty]
+        res[:, nonempty] = np.add.reduceat(unit_reactions, starts, axis=1)
+        return ids, res
+
+    def classify_all(self, samples, values=None):
+        """ Same as classify for every sample, -1 instead of None
+
+        @rtype: numpy.ndarray
+        """
+        if len(self.categories) == 0:
+            return np.repeat(-1, len(samples))
+        ids, reactions = self.reactions(samples, values)
+        return np.array(ids)[reactions.argmax(axis=1)]
+
     def increase_samples_category(self, sample):
         category_id = self.classify(sample)
         self.categories[category_id].increase_sample(sample)
@@ -146,9 +202,11 @@ class SteelsClassifier(Classifier):
 class DiscriminationGame(Interaction):
 
     def_inc_category_treshold = 0.95
+    def_context_len = 4
 
-    def __init__(self, context_len=4, inc_category_treshold=None):
-        self.context_len = context_len
+    def __init__(self, context_len=None, inc_category_treshold=None):
+        self.context_len = def_value(context_len,
+            DiscriminationGame.def_context_len)
         self.inc_category_treshold = def_value(inc_category_treshold,
             DiscriminationGame.def_inc_category_treshold)
 
@@ -404,6 +462,9 @@ class SteelsAgentState(object):
     def classify(self, sample):
         return self.classifier.classify(sample)
 
+    def classify_all(self, samples, values=None):
+        return self.classifier.classify_all(samples, values)
+
     def classify_pval(self, sample):
         return self.classifier.classify_pval(sample)
 
@@ -433,9 +494,14 @@ class SteelsAgentStateWithLexicon(SteelsAgentState):
 def steels_uniwersal_basic_experiment(num_iter, agents,
         interaction, classifier=SteelsClassifier, topology=None,
         inc_category_treshold=None, dump_freq=50, stimuli=None, chooser=None,
-        env=None):
+        env=None, rewiring=None, distributed=None, monitor=None):
 
-    topology = topology or generate_simple_network(agents)
+    # topology can be also given as Topology or as function generating it
+    # for given number of agents (see cog_abm.extras.network_generators)
+    if callable(topology):
+        topology = topology(len(agents))
+    if topology is None or isinstance(topology, Topology):
+        topology = generate_simple_network(agents, topology)
 
 #       if stimuli == None:
 #               stimuli = def_value(None, default_stimuli())
@@ -448,7 +514,17 @@ def steels_uniwersal_basic_experiment(num_iter, agents,
     for agent in agents:
         agent.env = env
     
-    s = Simulation(topology, interaction, agents, colour_order=env.colour_order)
+    if distributed:
+        # dictionary with arguments of ShardedSimulation
+        if rewiring is not None:
+            raise ValueError("Rewiring isn't supported in distributed mode")
+        s = ShardedSimulation(topology, interaction, agents,
+                              colour_order=env.colour_order, monitor=monitor,
+                              **distributed)
+    else:
+        s = Simulation(topology, interaction, agents,
+                       colour_order=env.colour_order, rewiring=rewiring,
+                       monitor=monitor)
     res = s.run(num_iter, dump_freq)
 
 #       import pprint
@@ -457,7 +533,8 @@ def steels_uniwersal_basic_experiment(num_iter, agents,
 #               s = sum(error_counter.values())
 #               for k,v in error_counter.iteritems():
 #                       print "%s: %s" % (k, float(v)/s)
-        for a in agents:
+        # agents of distributed simulation live in other processes
+        for a in res[-1][1]:
             print "[%s]:%s" % (len(a.state.lexicon.known_words()),
                                                     a.state.lexicon.known_words())
         print "OK"
@@ -470,7 +547,8 @@ def steels_uniwersal_basic_experiment(num_iter, agents,
 def steels_basic_experiment_DG(inc_category_treshold=0.95, classifier=None,
         interaction_type="DG", beta=1., context_size=4, stimuli=None,
         agents=None, dump_freq=50, alpha=0.1, sigma=1., num_iter=1000,
-        topology=None, environment=None):
+        topology=None, environment=None, rewiring=None, distributed=None,
+        monitor=None):
 
     classifier, classif_arg = SteelsClassifier, []
 
@@ -478,7 +556,7 @@ def steels_basic_experiment_DG(inc_category_treshold=0.95, classifier=None,
     for agent in agents:
         agent.set_state(SteelsAgentState(classifier(*classif_arg)))
         agent.set_sensor(SimpleSensor())
-        agent.set_fitness_measure("DG", metrics.get_DS_fitness())
+    metrics.set_population_fitness(agents, "DG")
 
     AdaptiveNetwork.def_alpha = float(alpha)
     AdaptiveNetwork.def_beta = float(beta)
@@ -487,13 +565,15 @@ def steels_basic_experiment_DG(inc_category_treshold=0.95, classifier=None,
 
     return steels_uniwersal_basic_experiment(num_iter, agents,
         DiscriminationGame(context_size), topology=topology,
-            dump_freq=dump_freq, stimuli=stimuli, env=environment)
+            dump_freq=dump_freq, stimuli=stimuli, env=environment,
+            rewiring=rewiring, distributed=distributed, monitor=monitor)
 
 
 def steels_basic_experiment_GG(inc_category_treshold=0.95, classifier=None,
         interaction_type="GG", beta=1., context_size=4, stimuli=None,
         agents=None, dump_freq=50, alpha=0.1, sigma=1., num_iter=1000,
-        topology=None, environment=None):
+        topology=None, environment=None, rewiring=None, distributed=None,
+        monitor=None):
 
     classifier, classif_arg = SteelsClassifier, []
     #agents = [Agent(SteelsAgentStateWithLexicon(classifier()), SimpleSensor())\
@@ -503,8 +583,8 @@ def steels_basic_experiment_GG(inc_category_treshold=0.95, classifier=None,
     for agent in agents:
         agent.set_state(SteelsAgentStateWithLexicon(classifier(*classif_arg)))
         agent.set_sensor(SimpleSensor())
-        agent.set_fitness_measure("DG", metrics.get_DS_fitness())
-        agent.set_fitness_measure("GG", metrics.get_CS_fitness())
+    metrics.set_population_fitness(agents, "DG")
+    metrics.set_population_fitness(agents, "GG")
 
     AdaptiveNetwork.def_alpha = float(alpha)
     AdaptiveNetwork.def_beta = float(beta)
@@ -513,4 +593,5 @@ def steels_basic_experiment_GG(inc_category_treshold=0.95, classifier=None,
 
     return steels_uniwersal_basic_experiment(num_iter, agents,
         GuessingGame(None, context_size), topology=topology,
-            dump_freq=dump_freq, stimuli=stimuli, env = environment)
+            dump_freq=dump_freq, stimuli=stimuli, env = environment,
+            rewiring=rewiring, distributed=distributed, monitor=monitor)
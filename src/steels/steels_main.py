@@ -38,6 +38,50 @@ def default_params():
     }
 
 
+def run(param_file=None, out_file=None, save=True, game=None, params=None,
+        cv_every=None):
+    """
+    Runs experiment with parameters from param_file (default ones if it's
+    None) and saves results with save_res.
+
+    @param game: type of game ("DG" or "GG") overriding the one from
+    parameters
+    @param params: parameters already loaded with load_params (param_file
+    isn't read then)
+    @param cv_every: if given, metrics.CVMonitor logs estimate of cv at
+    every cv_every-th dump of results (overrides "every" of cv_monitor
+    element of parameters)
+
+    @rtype: tuple
+    @return: (results, params)
+    """
+    from steels.steels_experiment import steels_basic_experiment_DG, \
+        steels_basic_experiment_GG
+
+    if params is None:
+        params = load_params(param_file)
+    if game is not None:
+        params["interaction_type"] = game
+    cv_monitor = params.pop("cv_monitor", None)
+    if cv_every is not None:
+        cv_monitor = dict(cv_monitor or {}, every=cv_every)
+    if cv_monitor is not None:
+        from steels.metrics import CVMonitor
+        params["monitor"] = CVMonitor(**cv_monitor)
+
+    #print params
+
+    if params["interaction_type"] == "DG":
+        #r = steels_basic_experiment_DG
+        r = steels_basic_experiment_DG(**params)
+    elif params["interaction_type"] == "GG":
+        r = steels_basic_experiment_GG(**params)
+
+    if save:
+        save_res((r, params), out_file)
+    return r, params
+
+
 if __name__ == "__main__":
 
     #import analyzer
@@ -48,11 +92,15 @@ if __name__ == "__main__":
     optp.add_option('-v', '--verbose', dest='verbose', action='count',
         help="Increase verbosity (specify multiple times for more)")
     optp.add_option('-g', '--game', action="store", type="string", dest="game",
-        help="Which type of game agents play", default="DG")
+        help="Which type of game agents play (DG or GG), by default the "
+        "one from parameters")
     optp.add_option('-f', '--file', action="store", dest='file', type="string",
         help="output file with results")
     optp.add_option('-p', '--params_file', action="store", dest='param_file',
         type="string", help="file with parameters")
+    optp.add_option('--cv_every', action="store", dest='cv_every',
+        type="int", help="log sampled estimate of cv at every N-th dump of "
+        "results")
 
     # Parse the arguments (defaults to parsing sys.argv).
     opts, args = optp.parse_args()
@@ -67,25 +115,10 @@ if __name__ == "__main__":
     # Set up basic configuration, out to stderr with a reasonable default format.
     logging.basicConfig(level=log_level)
 
-    #if opts.game not in ["DG","GG"]:
-    #       optp.error("Wrong or no game specified. Allowed: DG, GG")
+    if opts.game not in [None, "DG", "GG"]:
+        optp.error("Wrong game specified. Allowed: DG, GG")
 
     sys.path.append('../')
     sys.path.append('')
-    from steels.steels_experiment import steels_basic_experiment_DG, \
-        steels_basic_experiment_GG
-
-    params = load_params(opts.param_file)
-
-    #print params
-
-    if opts.game is not None:
-        params["interaction_type"] == opts.game
-
-    if params["interaction_type"] == "DG":
-        #r = steels_basic_experiment_DG
-        r = steels_basic_experiment_DG(**params)
-    elif params["interaction_type"] == "GG":
-        r = steels_basic_experiment_GG(**params)
 
-    save_res((r, params), opts.file)
+    run(opts.param_file, opts.file, game=opts.game, cv_every=opts.cv_every)
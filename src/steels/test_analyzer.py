@@ -0,0 +1,202 @@
+import cPickle
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import metrics
+import analyzer
+from analyzer import gen_res, get_function, snapshot_files, stream_res, \
+    StatsCache, open_cache, results_keys
+from steels_experiment import SteelsAgentState, SteelsClassifier
+from cog_abm.core.agent import Agent
+from cog_abm.agent.sensor import SimpleSensor
+from cog_abm.core.environment import Environment
+from cog_abm.extras.color import Color
+from cog_abm.extras.words_storage import store_classification, \
+    save_categories, CATEGORIES_FILE
+
+
+class TestStreamingAnalyzer(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rnd = random.Random(4)
+        colours = [Color(rnd.uniform(0, 100), rnd.uniform(-50, 50),
+                         rnd.uniform(-50, 50)) for _ in xrange(20)]
+        env = Environment(colours)
+        self.res = []
+        for it in (0, 10, 20):
+            agents = []
+            for _ in xrange(5):
+                classifier = SteelsClassifier()
+                for _ in xrange(rnd.randint(1, 3)):
+                    c = classifier.add_category()
+                    classifier.add_category(rnd.choice(colours), c)
+                agents.append(Agent(state=SteelsAgentState(classifier),
+                                    sensor=SimpleSensor(), environment=env))
+            metrics.set_population_fitness(agents, "DG")
+            for a in agents:
+                a.add_payoff("DG", rnd.randint(0, 1))
+            self.res.append((it, agents))
+            with open(os.path.join(self.dir, "%s.pout" % it), "wb") as f:
+                cPickle.dump((it, agents), f, cPickle.HIGHEST_PROTOCOL)
+        # files which aren't snapshots
+        open(os.path.join(self.dir, "10words.pout"), "w").close()
+        self.params = {"STIMULI": colours}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_snapshot_files(self):
+        self.assertEqual(["0.pout", "10.pout", "20.pout"],
+                         [os.path.basename(p)
+                          for p in snapshot_files(self.dir)])
+
+    def test_same_as_gen_res(self):
+        names = ["it", "DS", "cc", "avg_cc", "cv", "DSF", "CSF", "DSX"]
+        expected = gen_res(self.res, self.params,
+                           [get_function(n) for n in names])
+        rows = list(stream_res(snapshot_files(self.dir), None, names, 2))
+        self.assertEqual([0, 10, 20], [r[0] for r in rows])
+        for row, exp in zip(rows, expected):
+            self.assertEqual(len(exp), len(row))
+            for x, y in zip(row, exp):
+                if x is None:
+                    self.assertEqual(None, y)
+                else:
+                    self.assertAlmostEqual(y, x)
+
+        rows = list(stream_res(self.res, self.params, names, 2))
+        self.assertEqual(len(expected), len(rows))
+
+    def test_cache(self):
+        calls = []
+
+        def counting(name):
+            def fun(agents, params, it):
+                calls.append((name, it))
+                return [it]
+            return fun
+
+        analyzer.fun_map["test1"] = counting("test1")
+        analyzer.fun_map["test2"] = counting("test2")
+        path = os.path.join(self.dir, "stats.cache")
+        try:
+            cache = StatsCache(path)
+            rows = list(stream_res(snapshot_files(self.dir), None,
+                                   ["test1"], 1, cache))
+            cache.close()
+            self.assertEqual([[0], [10], [20]], rows)
+            self.assertEqual(3, len(calls))
+
+            del calls[:]
+            cache = StatsCache(path)
+            rows = list(stream_res(snapshot_files(self.dir), None,
+                                   ["test1", "test2", "it"], 1, cache))
+            self.assertEqual([[0, 0, 0], [10, 10, 10], [20, 20, 20]], rows)
+            self.assertEqual([("test2", 0), ("test2", 10), ("test2", 20)],
+                             calls)
+
+            # new snapshot
+            del calls[:]
+            with open(os.path.join(self.dir, "30.pout"), "wb") as f:
+                cPickle.dump((30, self.res[-1][1]), f)
+            rows = list(stream_res(snapshot_files(self.dir), None,
+                                   ["test1", "test2"], 1, cache))
+            self.assertEqual([30, 30], rows[-1])
+            self.assertEqual([("test1", 30), ("test2", 30)], calls)
+
+            # other parameters of evaluation
+            del calls[:]
+            rows = list(stream_res(snapshot_files(self.dir)[:1],
+                                   {"context_size": 5}, ["test1"], 1, cache))
+            self.assertEqual([("test1", 0)], calls)
+
+            # given keys
+            del calls[:]
+            rows = list(stream_res(self.res, None, ["test1"], 1, cache,
+                                   ["res:0", "res:1", "res:2"]))
+            rows = list(stream_res(self.res, None, ["test1"], 1, cache,
+                                   ["res:0", "res:1", "res:2"]))
+            self.assertEqual([[0], [10], [20]], rows)
+            self.assertEqual(3, len(calls))
+            cache.close()
+        finally:
+            del analyzer.fun_map["test1"], analyzer.fun_map["test2"]
+
+    def test_results_keys(self):
+        calls = []
+
+        def counting(agents, params, it):
+            calls.append(it)
+            return [it]
+
+        analyzer.fun_map["test1"] = counting
+        path = os.path.join(self.dir, "results")
+        cache = StatsCache(os.path.join(self.dir, "stats.cache"))
+        try:
+            list(stream_res(self.res, None, ["test1"], 1, cache,
+                            results_keys(path, self.res)))
+            # snapshot appended to the same file
+            longer = self.res + [(30, self.res[-1][1])]
+            rows = list(stream_res(longer, None, ["test1"], 1, cache,
+                                   results_keys(path, longer)))
+            self.assertEqual([[0], [10], [20], [30]], rows)
+            self.assertEqual([0, 10, 20, 30], calls)
+            self.assertNotEqual(results_keys(path, self.res),
+                                results_keys(path + "2", self.res))
+        finally:
+            cache.close()
+            del analyzer.fun_map["test1"]
+
+    def test_context_size(self):
+        self.assertEqual(4, analyzer.context_size(None))
+        self.assertEqual(4, analyzer.context_size({"context_size": None}))
+        self.assertEqual(3, analyzer.context_size({"context_size": 3}))
+        names = ["DSX", "DSF"]
+        it, agents = self.res[1]
+        default = gen_res([(it, agents)], {},
+                          [get_function(n) for n in names])
+        self.assertEqual(default, gen_res([(it, agents)],
+            {"context_size": None}, [get_function(n) for n in names]))
+        self.assertNotEqual(default, gen_res([(it, agents)],
+            {"context_size": 2}, [get_function(n) for n in names]))
+
+    def test_exact_DS_with_distance(self):
+        from cog_abm.core.environment import RandomStimuliChooser
+        it, agents = self.res[1]
+        self.assertTrue(analyzer.exact_DS(agents, self.params, it) > 0)
+        env = agents[0].env
+        chooser = env.stimuli_chooser
+        env.stimuli_chooser = RandomStimuliChooser(use_distance=True,
+                                                   distance=10.)
+        try:
+            self.assertEqual(None, analyzer.exact_DS(agents, self.params, it))
+        finally:
+            env.stimuli_chooser = chooser
+
+    def test_open_cache(self):
+        path = os.path.join(self.dir, "missing", "stats.cache")
+        self.assertEqual(None, open_cache(path))
+        cache = open_cache(os.path.join(self.dir, "stats.cache"))
+        self.assertTrue(isinstance(cache, StatsCache))
+        cache.close()
+
+    def test_stored_categories(self):
+        agents = self.res[1][1]
+        colours = self.params["STIMULI"]
+        matrix = store_classification(agents, colours,
+                                      os.path.join(self.dir, "10"))
+        expected = [len(set(row)) for row in matrix.tolist()]
+        rows = list(stream_res(snapshot_files(self.dir), None, ["cc"], 1))
+        self.assertEqual(expected, rows[1])
+
+        # categories stored with snapshot aren't computed again
+        save_categories(os.path.join(self.dir, "10" + CATEGORIES_FILE),
+                        agents, colours[::-1], np.zeros(matrix.shape))
+        rows = list(stream_res(snapshot_files(self.dir), None, ["cc"], 1))
+        self.assertEqual([1] * len(agents), rows[1])
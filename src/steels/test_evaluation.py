@@ -0,0 +1,177 @@
+import cPickle
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from evaluation import evaluate, evaluate_snapshots, generate_games, \
+    classification_matrix, discrimination_map, expected_DS, \
+    independent_contexts, guessing
+from steels_experiment import SteelsAgentStateWithLexicon, SteelsClassifier
+from cog_abm.core.agent import Agent
+from cog_abm.agent.sensor import SimpleSensor
+from cog_abm.core.environment import Environment, RandomStimuliChooser, \
+    OneDifferentClass, ArrayEnvironment
+from cog_abm.extras.color import Color
+from cog_abm.extras.lexicon import Word, Syllable
+
+
+class ReactionsOnly(object):
+    """ Frozen agent with one category (word 0) given by its reactions,
+    which discriminates everything
+    """
+
+    def __init__(self, reactions):
+        self.reactions = np.array(reactions, dtype=float)[:, np.newaxis]
+        self.classes = np.zeros(len(reactions), dtype=int)
+
+    def discrimination(self, contexts):
+        return np.ones(len(contexts), dtype=bool)
+
+    def word(self, cls):
+        return 0
+
+    def category(self, word):
+        return 0
+
+
+class TestEvaluation(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.colours = [Color(rnd.uniform(0, 100), rnd.uniform(-50, 50),
+                              rnd.uniform(-50, 50)) for _ in xrange(30)]
+        self.env = Environment(self.colours)
+        words = [Word([Syllable(s)]) for s in "abcd"]
+        self.agents = []
+        for i in xrange(6):
+            classifier = SteelsClassifier()
+            state = SteelsAgentStateWithLexicon(classifier)
+            # the last agent has no categories
+            for _ in xrange(rnd.randint(2, 5) if i < 5 else 0):
+                c = classifier.add_category()
+                for _ in xrange(rnd.randint(1, 3)):
+                    classifier.add_category(rnd.choice(self.colours), c)
+                if rnd.random() < 0.9:
+                    state.lexicon.add_element(c, rnd.choice(words),
+                                              rnd.random())
+            self.agents.append(Agent(state=state, sensor=SimpleSensor(),
+                                     environment=self.env))
+
+    def play(self, games, context_size, seed):
+        """ Games played one by one with agents' own classification """
+        contexts, pairs = generate_games(self.env, context_size, games,
+                                         len(self.agents), seed)
+        stimuli = self.env.stimuli
+        disc = {}
+        for a in self.agents:
+            for g, context in enumerate(contexts):
+                classes = [a.sense_and_classify(stimuli[i]) for i in context]
+                disc[a, g] = classes.count(classes[0]) == 1
+        ds = sum(disc.values()) / float(len(disc))
+        cs = 0.
+        for g, (s, h) in enumerate(pairs):
+            speaker, hearer = self.agents[s], self.agents[h]
+            context = [stimuli[i] for i in contexts[g]]
+            if not disc[speaker, g]:
+                continue
+            word = speaker.state.word_for(
+                speaker.sense_and_classify(context[0]))
+            category = hearer.state.category_for(word)
+            if category is None:
+                continue
+            strengths = [hearer.state.sample_strength(category, s)
+                         for s in context]
+            best = [x for x in strengths if x == max(strengths)]
+            if strengths[0] == max(strengths):
+                cs += 1. / len(best)
+        return ds, cs / len(pairs)
+
+    def test_same_as_games(self):
+        ds, cs = evaluate(self.agents, 300, 4, seed=3)
+        exp_ds, exp_cs = self.play(300, 4, 3)
+        self.assertAlmostEqual(exp_ds, ds)
+        self.assertAlmostEqual(exp_cs, cs)
+        self.assertTrue(0 < cs < ds < 1)
+
+    def test_frozen(self):
+        for a in self.agents:
+            a.set_fitness_measure("DG", None)
+        before = cPickle.dumps(self.agents, cPickle.HIGHEST_PROTOCOL)
+        state = random.getstate()
+        evaluate(self.agents, 100, 3, seed=1)
+        self.assertEqual(state, random.getstate())
+        self.assertEqual(before, cPickle.dumps(self.agents,
+                                               cPickle.HIGHEST_PROTOCOL))
+
+    def test_common_random_numbers(self):
+        self.assertEqual(evaluate(self.agents, 200, 4, seed=5),
+                         evaluate(self.agents, 200, 4, seed=5))
+        self.assertNotEqual(evaluate(self.agents, 200, 4, seed=5),
+                            evaluate(self.agents, 200, 4, seed=6))
+
+    def test_snapshots(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "10.pout")
+            with open(path, "wb") as f:
+                cPickle.dump((10, self.agents), f, cPickle.HIGHEST_PROTOCOL)
+            res = list(evaluate_snapshots([path, (20, self.agents[:3])],
+                                          100, 4, seed=2, processes=2))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([(10,) + evaluate(self.agents, 100, 4, seed=2),
+                          (20,) + evaluate(self.agents[:3], 100, 4, seed=2)],
+                         res)
+
+    def test_classification_matrix(self):
+        classes = classification_matrix(self.agents, self.colours)
+        self.assertEqual((6, 30), classes.shape)
+        self.assertEqual(
+            [[a.sense_and_classify(c) for c in self.colours]
+             for a in self.agents[:5]], classes[:5].tolist())
+        self.assertEqual([-1] * 30, classes[5].tolist())
+
+    def test_classification_matrix_asymmetric_metric(self):
+        env = ArrayEnvironment([c.get_values() for c in self.colours],
+                               metric="CIE94")
+        for a in self.agents:
+            categories = a.state.classifier.categories
+            for an in categories.itervalues():
+                for u, _ in an.units:
+                    # closest stimulus of the environment as central value
+                    u.central_value = min(env.stimuli,
+                        key=lambda s: s.distance(u.central_value))
+        self.assertEqual(
+            [[a.sense_and_classify(s) for s in env.stimuli]
+             for a in self.agents[:5]],
+            classification_matrix(self.agents, env.stimuli)[:5].tolist())
+
+    def test_guessing_duplicated_topic(self):
+        frozen = [ReactionsOnly([1., 1., 0.5, 1.])] * 2
+        contexts = np.array([[0, 0, 2, 3], [0, 2, 1, 2], [2, 0, 1, 2]])
+        res = guessing(frozen, contexts, np.array([[0, 1]] * 3))
+        self.assertEqual([2. / 3, 0.5, 0.], res.tolist())
+
+    def test_discrimination_map(self):
+        classes = [[0, 0, 1, 2], [5, 5, 5, 5]]
+        self.assertEqual([[0.25, 0.25, 0.5625, 0.5625], [0.] * 4],
+                         discrimination_map(classes, 3).tolist())
+        self.assertEqual([[1.] * 4] * 2,
+                         discrimination_map(classes, 1).tolist())
+        weighted = discrimination_map(classes, 2, [2, 0, 1, 1])
+        self.assertEqual([0.5, 0.5, 0.75, 0.75], weighted[0].tolist())
+
+        probabilities = discrimination_map(
+            classification_matrix(self.agents, self.colours), 4)
+        ds, _ = evaluate(self.agents, 20000, 4, seed=4)
+        self.assertAlmostEqual(expected_DS(probabilities), ds, delta=0.01)
+
+    def test_independent_contexts(self):
+        self.assertTrue(independent_contexts(self.env.stimuli_chooser))
+        self.assertFalse(independent_contexts(
+            RandomStimuliChooser(use_distance=True, distance=10.)))
+        self.assertFalse(independent_contexts(OneDifferentClass()))
@@ -0,0 +1,106 @@
+import copy
+import cPickle
+import unittest
+import random
+
+import metrics
+from metrics import DS, set_population_fitness, get_DS_fitness, cv, \
+    slow_cv, fast_cv, cat_dist, basic_dist, sampled_cv, CVMonitor
+from steels_experiment import SteelsAgentState, SteelsClassifier
+from cog_abm.core.agent import Agent
+from cog_abm.extras.color import Color
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_population_DS(self):
+        agents = [Agent() for _ in xrange(10)]
+        others = [Agent() for _ in xrange(10)]
+        population = set_population_fitness(agents, "DG")
+        for a in others:
+            a.set_fitness_measure("DG", get_DS_fitness())
+        for _ in xrange(200):
+            k = random.randint(0, 9)
+            payoff = random.randint(0, 1)
+            agents[k].add_payoff("DG", payoff)
+            others[k].add_payoff("DG", payoff)
+        self.assertEqual(population.average(), DS(agents, 1))
+        self.assertAlmostEqual(DS(others, 1), DS(agents, 1))
+        # not the whole population - measures are summed one by one
+        self.assertAlmostEqual(DS(others[:5], 1), DS(agents[:5], 1))
+        self.assertEqual(0, DS(agents, 0))
+        # snapshots bind their own copy of population
+        copies = copy.deepcopy(agents)
+        restored = copies[0].get_fitness_measure("DG").population
+        self.assertTrue(restored is not population)
+        self.assertEqual(restored.average(), DS(copies, 1))
+        self.assertAlmostEqual(DS(agents, 1), DS(copies, 1))
+        half = cPickle.loads(cPickle.dumps(agents[:5], 2))
+        self.assertEqual(None, metrics._population(half, "DG"))
+        self.assertAlmostEqual(DS(agents[:5], 1), DS(half, 1))
+
+    def random_agents(self, n, metric=None):
+        rnd = random.Random(3)
+        agents = []
+        for _ in xrange(n):
+            classifier = SteelsClassifier()
+            for _ in xrange(rnd.randint(0, 4)):
+                c = classifier.add_category()
+                for _ in xrange(rnd.randint(1, 3)):
+                    classifier.add_category(Color(rnd.uniform(0, 100),
+                        rnd.uniform(-50, 50), rnd.uniform(-50, 50), metric),
+                        c)
+            agents.append(Agent(state=SteelsAgentState(classifier)))
+        return agents
+
+    def test_cv(self):
+        agents = self.random_agents(12)
+        self.assertEqual(None, cv(agents, 0))
+        self.assertAlmostEqual(slow_cv(agents, 1), cv(agents, 1))
+        agents = self.random_agents(6, "CIE94")
+        self.assertAlmostEqual(slow_cv(agents, 1), cv(agents, 1))
+
+    def test_parallel_cv(self):
+        agents = self.random_agents(12)
+        old = metrics.CV_MIN_PARALLEL_PAIRS
+        metrics.CV_MIN_PARALLEL_PAIRS = 1
+        try:
+            self.assertAlmostEqual(slow_cv(agents, 1),
+                                   fast_cv(agents, 1, processes=2))
+        finally:
+            metrics.CV_MIN_PARALLEL_PAIRS = old
+
+    def test_cat_dist(self):
+        set1 = [[0., 0.], [1., 2.], [3., 1.]]
+        set2 = [[2., 2.], [0., 1.]]
+        expected = (sum(min(basic_dist(a, b) for b in set2) for a in set1) +
+                    sum(min(basic_dist(a, b) for a in set1) for b in set2)) \
+            / 6.
+        self.assertAlmostEqual(expected, cat_dist(set1, set2))
+
+    def test_sampled_cv(self):
+        agents = self.random_agents(15)
+        exact = cv(agents, 1)
+        est, low, high, n = sampled_cv(agents, 1, width=0.02,
+                                       rng=random.Random(5))
+        self.assertTrue(low <= exact <= high)
+        self.assertTrue(high - low <= 0.02 * est or n >= 20000)
+        self.assertAlmostEqual(exact, est, delta=0.05 * exact)
+        self.assertEqual(None, sampled_cv(agents, 0))
+        state = random.getstate()
+        self.assertEqual(sampled_cv(agents, 1), sampled_cv(agents, 1))
+        self.assertEqual(state, random.getstate())
+
+        est, low, high, n = sampled_cv(agents, 1, width=0.5, batch=10,
+                                       rng=random.Random(5))
+        self.assertTrue(n < 1000)
+
+    def test_cv_monitor(self):
+        agents = self.random_agents(8)
+        monitor = CVMonitor(every=2, width=0.2)
+        state = random.getstate()
+        for it in xrange(0, 50, 10):
+            monitor(it, agents)
+        self.assertEqual(state, random.getstate())
+        self.assertEqual([20, 40], [h[0] for h in monitor.history])
+        self.assertEqual(5, len(monitor.history[0]))
@@ -0,0 +1,155 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from time import sleep
+
+from replicates import Coordinator, Worker, send_msg, recv_msg, \
+    run_replicate
+
+SIMULATION = """<?xml version="1.0" ?>
+<simulation>
+    <history freq="10"/>
+    <network source="graph2.xml"/>
+    <agents source="agent2.xml"/>
+    <interaction id="1" type="DiscriminationGame">
+        <params>
+            <alpha value="0.1"/>
+            <beta value="1"/>
+            <sigma value="1"/>
+            <num_iter value="20"/>
+            <context_size value="3"/>
+            <inc_category_treshold value="0.95"/>
+            <classifier name="SteelsClassifier"/>
+        </params>
+    </interaction>
+    <environment name="global" source="env.xml">
+        <params><distance value="5"/></params>
+    </environment>
+</simulation>
+"""
+
+CHIP = """<munsell_chip><L>%f</L><a>%f</a><b>%f</b></munsell_chip>"""
+
+
+def square(config, status):
+    status("squaring %s" % config)
+    return config * config
+
+
+def failing(config, status):
+    raise ValueError("bad config")
+
+
+class TestReplicates(unittest.TestCase):
+
+    def start(self, coordinator):
+        res = []
+        thread = threading.Thread(target=lambda: res.append(coordinator.run()))
+        thread.daemon = True
+        thread.start()
+        return thread, res
+
+    def work(self, coordinator, runner, n=1, **kwargs):
+        host, port = coordinator.address
+        threads = [threading.Thread(target=Worker(host, port,
+                                                  coordinator.authkey, runner,
+                                                  name="w%s" % i,
+                                                  **kwargs).run)
+                   for i in xrange(n)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        return threads
+
+    def test_results_in_order(self):
+        coordinator = Coordinator(range(10), poll=0.05)
+        thread, res = self.start(coordinator)
+        self.work(coordinator, square, 3, heartbeat=0.05)
+        thread.join(10)
+        self.assertEqual(res, [[x * x for x in xrange(10)]])
+        self.assertEqual(len(coordinator.status), 10)
+        self.assertEqual(set(w for _, w, _ in coordinator.status) -
+                         set(["w0", "w1", "w2"]), set())
+
+    def test_failed_job(self):
+        coordinator = Coordinator([1], poll=0.05)
+        thread, res = self.start(coordinator)
+        self.work(coordinator, failing)
+        thread.join(10)
+        self.assertEqual(res, [[None]])
+        self.assertTrue("bad config" in coordinator.errors[0])
+
+    def test_lost_worker(self):
+        coordinator = Coordinator([2, 3], heartbeat_timeout=0.2, poll=0.05)
+        thread, res = self.start(coordinator)
+        # worker which takes job and never sends heartbeat
+        sock = socket.create_connection(coordinator.address)
+        send_msg(sock, ("get", "silent"), coordinator.authkey)
+        reply = recv_msg(sock, coordinator.authkey)
+        self.assertEqual(reply[0], "job")
+        sleep(0.1)
+        self.work(coordinator, square, heartbeat=0.05)
+        thread.join(10)
+        sock.close()
+        self.assertEqual(res, [[4, 9]])
+
+    def test_disconnected_worker(self):
+        coordinator = Coordinator([5], heartbeat_timeout=100., poll=0.05)
+        thread, res = self.start(coordinator)
+        sock = socket.create_connection(coordinator.address)
+        send_msg(sock, ("get", "broken"), coordinator.authkey)
+        self.assertEqual(recv_msg(sock, coordinator.authkey)[0], "job")
+        sock.close()
+        self.work(coordinator, square)
+        thread.join(10)
+        self.assertEqual(res, [[25]])
+
+    def test_wrong_key(self):
+        coordinator = Coordinator([6], poll=0.05, authkey="secret")
+        self.assertEqual("127.0.0.1", coordinator.address[0])
+        thread, res = self.start(coordinator)
+        sock = socket.create_connection(coordinator.address)
+        send_msg(sock, ("get", "intruder"), "guess")
+        self.assertRaises(EOFError, recv_msg, sock, "guess")
+        sock.close()
+        self.assertEqual([], coordinator.running.keys())
+        self.work(coordinator, square)
+        thread.join(10)
+        self.assertEqual(res, [[36]])
+
+
+class TestRunReplicate(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in ["graph2.xml", "agent2.xml"]:
+            shutil.copy(os.path.join(here, name), self.dir)
+        with open(os.path.join(self.dir, "env.xml"), "w") as f:
+            f.write('<?xml version="1.0" ?><environment type="CIELab">')
+            for i in xrange(10):
+                f.write(CHIP % (10. * i, i, -i))
+            f.write('</environment>')
+        with open(os.path.join(self.dir, "simulation.xml"), "w") as f:
+            f.write(SIMULATION)
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_relative_paths(self):
+        statuses = []
+        res, params = run_replicate({"param_file": "simulation.xml",
+                                     "workdir": "replicate_0"},
+                                    statuses.append)
+        self.assertEqual(["started", "finished"], statuses)
+        self.assertEqual(os.path.realpath(self.dir),
+                         os.path.realpath(os.getcwd()))
+        self.assertEqual(20, params["num_iter"])
+        self.assertEqual([0, 10, 20], [it for it, _ in res])
+        self.assertTrue(os.path.exists("replicate_0/20.pout"))
@@ -6,6 +6,7 @@ import numpy as np
 from steels_experiment import (ReactiveUnit,
     AdaptiveNetwork, SteelsClassifier)
 from cog_abm.ML.core import Sample
+from cog_abm.core.environment import ArrayEnvironment
 
 
 S = Sample
@@ -175,6 +176,25 @@ class TestSteelsClassifier(unittest.TestCase):
         wc.sort()
         self.assertEqual(wc[0], wc[-1])
 
+    def test_reactions_asymmetric_metric(self):
+        # CIE94 isn't symmetric, reactions use central values of units as
+        # reference colours as value_for does
+        rng = np.random.RandomState(3)
+        values = np.column_stack((50 + 4 * rng.rand(40),
+                                  10 + 10 * rng.rand(40, 2)))
+        env = ArrayEnvironment(values, metric="CIE94")
+        self.sc = SteelsClassifier()
+        for s in env.stimuli[:5]:
+            self.sc.add_category(s)
+        ids, reactions = self.sc.reactions(env.stimuli)
+        for k, category in enumerate(ids):
+            an = self.sc.categories[category]
+            np.testing.assert_allclose(
+                [float(an.reaction(s)) for s in env.stimuli],
+                reactions[:, k].astype(float), rtol=1e-9)
+        self.assertEqual([self.sc.classify(s) for s in env.stimuli],
+                         self.sc.classify_all(env.stimuli).tolist())
+
 
 class TestSteelsExperiment(unittest.TestCase):
 
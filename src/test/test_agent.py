@@ -1,10 +1,76 @@
 import sys
 sys.path.append('../')
+import cPickle
 import unittest
+from multiprocessing import Process, Queue
 from cog_abm.core.agent import *
 
 
+def _child_ids(queue):
+    queue.put([Agent().id for _ in xrange(5)])
+
+
 class TestAgent(unittest.TestCase):
 
     def setUp(self):
         pass
+
+    def test_no_dict(self):
+        a = Agent()
+        self.assertFalse(hasattr(a, "__dict__"))
+        self.assertRaises(AttributeError, setattr, a, "foo", 1)
+
+    def test_ids(self):
+        ids = [Agent().id for _ in xrange(100)]
+        self.assertEqual(ids, range(ids[0], ids[0] + 100))
+        self.assertEqual(5, Agent(aid=5).id)
+
+    def test_ids_in_other_processes(self):
+        queue = Queue()
+        processes = [Process(target=_child_ids, args=(queue,))
+                     for _ in xrange(3)]
+        for p in processes:
+            p.start()
+        ids = [Agent().id for _ in xrange(5)]
+        for _ in processes:
+            ids.extend(queue.get())
+        for p in processes:
+            p.join()
+        self.assertEqual(20, len(set(ids)))
+        self.assertTrue(all(Agent.ID_RANGE <= i < 2 ** 63 - Agent.ID_RANGE
+                            for i in ids[5:]))
+
+    def test_inter_res(self):
+        self.assertEqual(None, Agent().inter_res.maxlen)
+        a = Agent()
+        old_size = Agent.INTER_RES_SIZE
+        try:
+            Agent.INTER_RES_SIZE = 3
+            for i in xrange(5):
+                a.add_inter_result(i)
+            self.assertEqual([2, 3, 4], list(a.inter_res))
+            b = Agent()
+            Agent.INTER_RES_SIZE = 0
+            b.add_inter_result(1)
+            self.assertEqual(None, b._inter_res)
+        finally:
+            Agent.INTER_RES_SIZE = old_size
+
+    def test_pickle(self):
+        a = Agent(state="state")
+        a.add_inter_result(("DG", True))
+        a.set_fitness_measure("DG", 0.5)
+        for protocol in xrange(cPickle.HIGHEST_PROTOCOL + 1):
+            b = cPickle.loads(cPickle.dumps(a, protocol))
+            self.assertEqual(a.id, b.id)
+            self.assertEqual("state", b.state)
+            self.assertEqual([("DG", True)], list(b.inter_res))
+            self.assertEqual(0.5, b.get_fitness_measure("DG"))
+
+    def test_old_state(self):
+        a = Agent.__new__(Agent)
+        a.__setstate__({"id": 7, "sensor": None, "state": None, "env": None,
+                        "inter_res": [1, 2], "fitness": {}})
+        self.assertEqual(7, a.id)
+        self.assertEqual([1, 2], list(a.inter_res))
+        self.assertEqual({}, a.fitness)
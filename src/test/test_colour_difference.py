@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from cog_abm.extras.colour_difference import (cie76, cie94, ciede2000,
+    pairwise, get_metric)
+from cog_abm.extras.color import Color
+
+# G. Sharma, W. Wu, E. N. Dalal - supplementary test data (selected pairs)
+SHARMA = [
+    ((50.0000, 2.6772, -79.7751), (50.0000, 0.0000, -82.7485), 2.0425),
+    ((50.0000, 0.0000, 0.0000), (50.0000, -1.0000, 2.0000), 2.3669),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0009), 7.1792),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0011), 7.2195),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0009, -2.4900), 4.8045),
+    ((50.0000, 2.5000, 0.0000), (73.0000, 25.0000, -18.0000), 27.1492),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((2.0776, 0.0795, -1.1350), (0.9033, -0.0636, -0.5514), 0.9082),
+]
+
+
+class TestColourDifference(unittest.TestCase):
+
+    def test_ciede2000(self):
+        for lab1, lab2, expected in SHARMA:
+            self.assertAlmostEqual(expected, ciede2000(lab1, lab2), 4)
+            self.assertAlmostEqual(expected, ciede2000(lab2, lab1), 4)
+
+    def test_batch(self):
+        lab1 = np.array([p[0] for p in SHARMA])
+        lab2 = np.array([p[1] for p in SHARMA])
+        np.testing.assert_almost_equal([p[2] for p in SHARMA],
+            ciede2000(lab1, lab2), 4)
+
+        for metric in ["CIE76", "CIE94", "CIEDE2000"]:
+            table = pairwise(metric, lab1, lab2, block=3)
+            self.assertEqual((8, 8), table.shape)
+            for i in xrange(8):
+                for j in xrange(8):
+                    self.assertAlmostEqual(table[i, j],
+                        get_metric(metric)(lab1[i], lab2[j]))
+
+    def test_cie76_cie94(self):
+        self.assertAlmostEqual(5., cie76((0, 3, 4), (0, 0, 0)))
+        self.assertAlmostEqual(1.3950, cie94(SHARMA[0][0], SHARMA[0][1]), 4)
+        self.assertAlmostEqual(10., cie94((50, 0, 0), (60, 0, 0)))
+
+    def test_color_metric(self):
+        c1, c2 = Color(*SHARMA[5][0]), Color(*SHARMA[5][1])
+        self.assertAlmostEqual(c1.distance(c2), cie76(c1.values, c2.values))
+        c1 = Color(*SHARMA[5][0], metric="CIEDE2000")
+        self.assertAlmostEqual(SHARMA[5][2], c1.distance(c2), 4)
+        self.assertRaises(ValueError, get_metric, "CIE2042")
+
+
+if __name__ == '__main__':
+    unittest.main()
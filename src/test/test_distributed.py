@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cog_abm.core.agent import Agent
+from cog_abm.core.interaction import Interaction
+from cog_abm.core.distributed import ShardedSimulation
+from cog_abm.core.network import Network
+from cog_abm.extras.additional_tools import generate_simple_network
+from cog_abm.extras.network_generators import ring
+
+
+class CountingInteraction(Interaction):
+    """ Counts interactions in agents themselves
+    """
+
+    def num_agents(self):
+        return 2
+
+    def interact(self, a, b):
+        a.inter_res.append(b.id)
+        b.inter_res.append(a.id)
+
+
+class TestShardedSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_snapshots(self):
+        agents = [Agent() for _ in xrange(30)]
+        network = generate_simple_network(agents, ring(30, 4))
+        simulation = ShardedSimulation(network, CountingInteraction(),
+            agents, shards=3, migrate_every=7, migration_prob=0.3, seed=1)
+        res = simulation.run(60, 20)
+
+        self.assertEqual([0, 20, 40, 60], [it for it, _ in res])
+        ids = sorted(a.id for a in agents)
+        for it, snapshot in res:
+            self.assertEqual(ids, [a.id for a in snapshot])
+            self.assertEqual(2 * it, sum(len(a.inter_res) for a in snapshot))
+        self.assertTrue(os.path.exists("60.pout"))
+
+        # agents migrated between shards, so some met agents from other ones
+        block = dict((a.id, i // 10) for i, a in enumerate(agents))
+        self.assertTrue(any(block[a.id] != block[b]
+                            for a in res[-1][1] for b in a.inter_res))
+        # original agents are not changed by simulation
+        self.assertEqual(0, sum(len(a.inter_res) for a in agents))
+
+
+    def _placed(self, nodes):
+        agents = [Agent() for _ in nodes]
+        network = Network(ring(10, 2))
+        for agent, node in zip(agents, nodes):
+            network.add_agent(agent, node)
+        return agents, network
+
+    def test_isolated_shard(self):
+        # shards of ring are nodes 0..4 and 5..9, agents at 4 and 5 are
+        # neighbours only across the border
+        agents, network = self._placed([4, 5])
+        simulation = ShardedSimulation(network, CountingInteraction(),
+            agents, shards=2, seed=1)
+        self.assertRaises(ValueError, simulation.run, 10, 10)
+
+    def test_isolated_agents(self):
+        # agent at 9 has no neighbour agents inside second shard, so only
+        # others start interactions there
+        agents, network = self._placed([0, 1, 5, 6, 9])
+        simulation = ShardedSimulation(network, CountingInteraction(),
+            agents, shards=2, migration_prob=0., seed=1)
+        res = simulation.run(40, 40)
+        counts = dict((a.id, len(a.inter_res)) for a in res[-1][1])
+        self.assertEqual(80, sum(counts.values()))
+        self.assertEqual(0, counts[agents[4].id])
+
+
+if __name__ == '__main__':
+    unittest.main()
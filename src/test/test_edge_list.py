@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from cog_abm.extras.edge_list import (read_edge_list, read_adjacency_list,
+    read_npy_edges, save_npy_edges)
+
+
+def neighbours(top, name):
+    return sorted(top.neighbors(name))
+
+
+class TestEdgeList(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_edge_list(self):
+        path = self.write("edges.txt",
+            "# comment\n0 1\n1 2\n\n2 0\n1 0\n2 3\n")
+        top = read_edge_list(path, chunk_size=4)
+        self.assertEqual(4, len(top))
+        self.assertEqual([1, 2], neighbours(top, 0))
+        self.assertEqual([0, 1, 3], neighbours(top, 2))
+        self.assertTrue(top.weights is None)
+
+        top = read_edge_list(path, directed=True)
+        self.assertEqual([1], neighbours(top, 0))
+        self.assertEqual([0, 2], neighbours(top, 1))
+
+    def test_names_and_weights(self):
+        path = self.write("edges.txt", "10 20 1\n20 30 0\n")
+        top = read_edge_list(path)
+        self.assertEqual([10, 20, 30], top.nodes())
+        self.assertEqual([10, 30], neighbours(top, 20))
+        self.assertTrue(all(top.random_neighbor(20) == 10
+                            for _ in xrange(30)))
+
+    def test_adjacency_list(self):
+        path = self.write("adj.txt", "0 1 2\n1 0\n# comment\n3 2\n")
+        top = read_adjacency_list(path)
+        self.assertEqual([1, 2], neighbours(top, 0))
+        self.assertEqual([0, 3], neighbours(top, 2))
+
+    def test_npy(self):
+        path = os.path.join(self.dir, "edges.npy")
+        save_npy_edges(path, [(0, 1), (1, 2)], [1., 3.])
+        top = read_npy_edges(path)
+        self.assertEqual([0, 2], neighbours(top, 1))
+        chosen = [top.random_neighbor(1) for _ in xrange(400)]
+        self.assertTrue(chosen.count(2) > chosen.count(0))
+
+        save_npy_edges(path, np.array([(0, 1), (1, 2)]))
+        self.assertEqual([1], neighbours(read_npy_edges(path), 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
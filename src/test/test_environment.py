@@ -1,7 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
+import copy
+import cPickle
 from cog_abm.core.environment import (OneDifferentClass,
-    Environment, RandomStimuliChooser)
-from cog_abm.ML.core import Sample, load_samples_arff
+    Environment, RandomStimuliChooser, ArrayEnvironment, Stimulus)
+from cog_abm.agent.sensor import SimpleSensor
+from cog_abm.extras.colour_difference import ciede2000
+from cog_abm.ML.core import Sample, NominalAttribute, load_samples_arff
 
 
 class TestChoosers(unittest.TestCase):
@@ -23,6 +30,42 @@ class TestChoosers(unittest.TestCase):
         chooser = OneDifferentClass(40)
         self.assertRaises(Exception, chooser.get_stimuli, samples)
 
+    def test_OneDifferent_dominating_class(self):
+        meta = NominalAttribute(["big", "small"])
+        samples = [Sample([x], cls=0, cls_meta=meta) for x in xrange(1000)]
+        samples.append(Sample([1000], cls=1, cls_meta=meta))
+        chooser = OneDifferentClass(4)
+
+        for _ in xrange(100):
+            clss = [x.get_cls() for x in chooser.get_stimuli(samples)]
+            self.assertEqual(1, clss.count(clss[0]))
+            self.assertEqual(4, len(clss))
+
+    def test_OneDifferent_weighted(self):
+        meta = NominalAttribute(["a", "b", "c"])
+        samples = [Sample([x], cls=x % 3, cls_meta=meta) for x in xrange(30)]
+        chooser = OneDifferentClass(3)
+        chooser.set_weights([1. if x in (0, 1, 2) else 0. for x in xrange(30)])
+
+        for _ in xrange(50):
+            chosen = chooser.get_stimuli(samples)
+            self.assertTrue(all(s.get_values()[0] in (0, 1, 2)
+                for s in chosen))
+            clss = [x.get_cls() for x in chosen]
+            self.assertEqual(1, clss.count(clss[0]))
+
+    def test_OneDifferent_weight_in_one_class(self):
+        meta = NominalAttribute(["a", "b"])
+        samples = [Sample([x], cls=x % 2, cls_meta=meta) for x in xrange(10)]
+        chooser = OneDifferentClass(3)
+        # there are stimuli of other class, but none of them can be drawn
+        chooser.set_weights([float(x % 2 == 0) for x in xrange(10)])
+        self.assertRaisesRegexp(Exception, "different classes",
+                                chooser.get_stimuli, samples)
+        env = Environment(samples, chooser)
+        self.assertRaisesRegexp(Exception, "different classes",
+                                chooser.get_indices_block, env, 3, 10)
+
 
 class TestEnvironment(unittest.TestCase):
 
@@ -61,6 +104,17 @@ class TestEnvironment(unittest.TestCase):
 
         self.assertRaises(Exception, chooser.get_stimuli, samples, 100)
 
+    def test_weighted_stimuli(self):
+        stimuli = range(10)
+        env = Environment(stimuli, weights=[0.] * 9 + [1.])
+        for _ in xrange(50):
+            self.assertEqual(9, env.get_stimulus())
+
+        env = Environment(stimuli, RandomStimuliChooser(5),
+            weights=lambda x: x % 2)
+        for _ in xrange(20):
+            self.assertTrue(all(x % 2 for x in env.get_stimuli(5)))
+
     def test_random_without_distance(self):
         stimuli = range(10)
         chooser = RandomStimuliChooser(4, False)
@@ -69,5 +123,150 @@ class TestEnvironment(unittest.TestCase):
                 self.assertTrue(x in stimuli)
 
 
+class TestArrayEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = [Sample([x, 2 * x, 0.]) for x in xrange(10)]
+        self.env = ArrayEnvironment.from_environment(Environment(self.samples,
+            colour_order=self.samples[::-1]))
+
+    def test_handles(self):
+        env = self.env
+        self.assertEqual(10, len(env.stimuli))
+        for s, h in zip(self.samples, env.stimuli):
+            self.assertEqual(s.get_values(), h.get_values())
+            self.assertAlmostEqual(s.distance(self.samples[0]),
+                h.distance(env.stimuli[0]))
+            self.assertAlmostEqual(s.distance(self.samples[0]),
+                h.distance(self.samples[0]))
+        self.assertEqual(env.stimuli[::-1], env.colour_order)
+        self.assertNotEqual(Stimulus(env, 1), env.stimuli[1])
+        self.assertEqual(len(set(env.stimuli + env.stimuli)), 10)
+
+    def test_copy_and_pickle(self):
+        env = self.env
+        data = [env.stimuli[3], env.stimuli[3], env]
+        cp = copy.deepcopy(data)
+        self.assertTrue(cp[0] is env.stimuli[3] and cp[2] is env)
+
+        cp = cPickle.loads(cPickle.dumps(data))
+        self.assertTrue(cp[0] is cp[1])
+        self.assertTrue(cp[0] is cp[2].stimuli[3])
+        self.assertEqual([3., 6., 0.], cp[0].get_values())
+
+    def test_published_table_not_pickled(self):
+        path = tempfile.mkdtemp()
+        shared = os.path.join(path, "env")
+        try:
+            self.env.publish(shared)
+            env = ArrayEnvironment.attach(shared)
+            self.assertEqual(self.env.distance_table.tolist(),
+                env.distance_table.tolist())
+            self.assertAlmostEqual(5 ** 0.5, env.distance(0, 1))
+
+            cp = cPickle.loads(cPickle.dumps(env, 2))
+            self.assertTrue(cp.distance_table is not None)
+            del cp.shared_path
+            self.assertTrue(
+                cPickle.loads(cPickle.dumps(cp, 2)).distance_table is None)
+        finally:
+            shutil.rmtree(path)
+
+    def test_classes(self):
+        self.assertEqual(None, self.env.stimuli[0].get_cls())
+        meta = NominalAttribute(["a", "b", "c"])
+        samples = [Sample([x], cls=x % 3, cls_meta=meta) for x in xrange(30)]
+        env = ArrayEnvironment.from_environment(
+            Environment(samples, OneDifferentClass()))
+        self.assertEqual([s.get_cls() for s in samples],
+                         [s.get_cls() for s in env.stimuli])
+        for _ in xrange(50):
+            clss = [x.get_cls() for x in env.get_stimuli(4)]
+            self.assertEqual(1, clss.count(clss[0]))
+        self.assertRaises(ValueError, ArrayEnvironment, [[0.], [1.]],
+                          classes=["a"])
+
+        path = tempfile.mkdtemp()
+        shared = os.path.join(path, "env")
+        try:
+            env.publish(shared)
+            attached = ArrayEnvironment.attach(shared)
+            self.assertEqual(env.classes, attached.classes)
+        finally:
+            shutil.rmtree(path)
+
+    def test_get_stimuli_with_distance(self):
+        env = ArrayEnvironment([[x] for x in xrange(10)],
+            RandomStimuliChooser(None, True, 3))
+        for _ in xrange(10):
+            sort = sorted([x.get_values()[0] for x in env.get_stimuli(4)])
+            self.assertEqual([0, 3, 6, 9], sort)
+        self.assertRaises(Exception, env.get_stimuli, 5)
+
+    def test_metric_table(self):
+        env = ArrayEnvironment.from_environment(Environment(self.samples),
+            metric="CIEDE2000")
+        self.assertEqual((10, 10), env.distance_table.shape)
+        for i in (0, 3, 9):
+            self.assertAlmostEqual(env.distance_table[i, 2],
+                ciede2000(self.samples[i].get_values(),
+                          self.samples[2].get_values()))
+            self.assertAlmostEqual(env.distance_table[i, 2],
+                env.stimuli[i].distance(env.stimuli[2]))
+            self.assertAlmostEqual(env.distance_table[i, 2],
+                env.stimuli[i].distance(self.samples[2]))
+
+        cp = cPickle.loads(cPickle.dumps(env, 2))
+        self.assertEqual(env.distance_table.tolist(),
+            cp.distance_table.tolist())
+
+        for metric in (ciede2000, "CIE2000"):
+            self.assertRaises(ValueError, ArrayEnvironment.from_environment,
+                              Environment(self.samples), metric)
+
+    def test_masked_sensor(self):
+        sensor = SimpleSensor([True, False, True])
+        sensed = sensor.sense(self.env.stimuli[4])
+        self.assertTrue(isinstance(sensed, Stimulus))
+        self.assertEqual([4., 0.], sensed.get_values())
+        self.assertTrue(sensed is sensor.sense(self.env.stimuli[4]))
+
+
+class TestContextBuffer(unittest.TestCase):
+
+    def test_buffered_distance(self):
+        samples = [Sample([x]) for x in xrange(10)] * 10
+        for env in [Environment(samples, RandomStimuliChooser(None, True, 3)),
+                    ArrayEnvironment([[x] for x in xrange(10)] * 10,
+                        RandomStimuliChooser(None, True, 3))]:
+            env.use_context_buffer(7, seed=5)
+            for _ in xrange(20):
+                sort = sorted([x.get_values()[0] for x in env.get_stimuli(4)])
+                self.assertEqual([0, 3, 6, 9], sort)
+            self.assertRaises(Exception, env.get_stimuli, 5)
+
+    def test_buffered_one_different(self):
+        meta = NominalAttribute(["a", "b", "c"])
+        samples = [Sample([x], cls=int(x > 0) + int(x > 90), cls_meta=meta)
+            for x in xrange(100)]
+        for weights in [None, [1.] * 95 + [0.] * 5]:
+            env = Environment(samples, OneDifferentClass(), weights=weights)
+            env.use_context_buffer(50)
+            for _ in xrange(120):
+                context = env.get_stimuli(4)
+                clss = [x.get_cls() for x in context]
+                self.assertEqual(1, clss.count(clss[0]))
+                if weights is not None:
+                    self.assertTrue(all(x.get_values()[0] < 95
+                        for x in context))
+
+    def test_seeded_buffers_repeat(self):
+        env = ArrayEnvironment([[x] for x in xrange(50)])
+        env.use_context_buffer(10, seed=3)
+        first = [env.get_stimuli(3) for _ in xrange(25)]
+        env.use_context_buffer(10, seed=3)
+        self.assertEqual(first, [env.get_stimuli(3) for _ in xrange(25)])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,6 @@
 import sys
 sys.path.append('../')
+import random
 import unittest
 
 from cog_abm.extras.fitness import *
@@ -25,3 +26,44 @@ class TestFitness(unittest.TestCase):
         self.assertRaises(NotImplementedError, fm.add_payoff, None, None)
         self.assertRaises(NotImplementedError, fm.update_removed, None, None)
         self.assertRaises(NotImplementedError, fm.get_fitness)
+
+    def test_population_fitness(self):
+        pop = PopulationFitness(3, 4)
+        measures = pop.measures()
+        buffered = [get_buffered_average(4) for _ in xrange(3)]
+        rnd = random.Random(1)
+        self.assertEqual(0., pop.average())
+        for _ in xrange(100):
+            i = rnd.randint(0, 2)
+            payoff, weight = rnd.randint(0, 1), rnd.choice([1., 0.5, 2.])
+            measures[i].add_payoff(payoff, weight)
+            buffered[i].add_payoff(payoff, weight)
+            for m, b in zip(measures, buffered):
+                self.assertAlmostEqual(b.get_fitness(), m.get_fitness())
+            self.assertAlmostEqual(
+                sum(b.get_fitness() for b in buffered) / 3, pop.average())
+        pop.refresh()
+        self.assertAlmostEqual(
+            sum(b.get_fitness() for b in buffered) / 3, pop.average())
+
+    def test_population_fitness_pickle(self):
+        import cPickle
+        pop = PopulationFitness(100, 5)
+        measures = pop.measures()
+        rnd = random.Random(2)
+        for _ in xrange(300):
+            measures[rnd.randint(0, 99)].add_payoff(rnd.randint(0, 1))
+        one = cPickle.dumps(measures[3], cPickle.HIGHEST_PROTOCOL)
+        self.assertTrue(len(one) < pop.payoffs.nbytes / 10)
+        m = cPickle.loads(one)
+        self.assertEqual(measures[3].get_fitness(), m.get_fitness())
+        self.assertEqual(1, m.population.bound)
+        for protocol in xrange(cPickle.HIGHEST_PROTOCOL + 1):
+            copies = cPickle.loads(cPickle.dumps(measures, protocol))
+            restored = copies[0].population
+            self.assertTrue(all(c.population is restored for c in copies))
+            self.assertEqual(100, restored.bound)
+            self.assertAlmostEqual(pop.average(), restored.average())
+            copies[5].add_payoff(1)
+            self.assertEqual(pop.fitnesses()[6:].tolist(),
+                             restored.fitnesses()[6:].tolist())
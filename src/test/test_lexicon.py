@@ -1,5 +1,7 @@
 import sys
 sys.path.append('../')
+import cPickle
+import random
 import unittest
 from cog_abm.extras.lexicon import *
 
@@ -22,6 +24,39 @@ class TestWords(unittest.TestCase):
         self.assertNotEqual(w1, Word(["a", "z"]))
         self.assertNotEqual(w2, Word(["a", "z"]))
 
+    def test_interning(self):
+        w1 = Word([Syllable("a"), Syllable("b")])
+        w2 = Word(["a", "b"])
+        self.assertEqual(w1.id, w2.id)
+        self.assertEqual(hash(w1), hash(w2))
+        self.assertTrue(Word.from_id(w1.id) == w1)
+        self.assertNotEqual(w1.id, Word(["b", "a"]).id)
+        w3 = cPickle.loads(cPickle.dumps(w1, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(w1, w3)
+        self.assertEqual("ab", str(w3))
+        self.assertTrue(all(isinstance(x, Syllable) for x in w3.syllables))
+        self.assertEqual(["a", "b"], [x.content for x in w3.syllables])
+
+    def test_word_space(self):
+        syllables, max_len = Syllable.allowed_syllables, Word.max_len
+        Syllable.set_allowed_syllables(["a", "b", "c"])
+        Word.set_max_len(2)
+        try:
+            self.check_word_space()
+        finally:
+            Syllable.set_allowed_syllables(syllables)
+            Word.set_max_len(max_len)
+
+    def check_word_space(self):
+        self.assertEqual(12, Word.space_size())
+        words = [Word.from_code(i) for i in xrange(12)]
+        self.assertEqual(12, len(set(words)))
+        self.assertEqual("a", str(words[0]))
+        used = set(words[:11])
+        for _ in xrange(10):
+            self.assertEqual(words[11], Word.get_random_not_in(used))
+        self.assertRaises(ValueError, Word.get_random_not_in, set(words))
+
 
 class TestLexicon(unittest.TestCase):
 
@@ -85,6 +120,68 @@ class TestLexicon(unittest.TestCase):
         self.assertIn(str(0.7), str(self.l))
         self.assertIn(str(0.8), str(self.l))
 
+    def test_index_matches_base(self):
+        words = self.words
+        rnd = random.Random(2)
+        for _ in xrange(500):
+            c, w = rnd.randint(0, 5), rnd.choice(words)
+            op = rnd.randint(0, 4)
+            if op == 0 or (c, w) not in self.l.base:
+                self.l.add_element(c, w, rnd.random())
+            elif op == 1:
+                self.l.decrease(c, w)
+            elif op == 2:
+                self.l.inc_dec_categories(c, w)
+            elif op == 3:
+                self.l.inc_dec_words(c, w)
+            else:
+                self.l.increase_pair_decrease_other(c, w)
+
+            base = self.l.base
+            for c in xrange(6):
+                row = [v for (c2, _), v in base.iteritems() if c2 == c]
+                if row:
+                    self.assertEqual(max(row),
+                                     base[(c, self.l.word_for(c))])
+                else:
+                    self.assertEqual(None, self.l.word_for(c))
+            for w in words:
+                col = [v for (_, w2), v in base.iteritems() if w2 == w]
+                if col:
+                    self.assertEqual(max(col),
+                                     base[(self.l.category_for(w), w)])
+
+    def test_do_inc_decrs(self):
+        rnd = random.Random(4)
+        for _ in xrange(30):
+            self.l.add_element(rnd.randint(0, 5), rnd.choice(self.words),
+                               rnd.random())
+        c, w = 1, self.words[0]
+        self.l.add_element(c, w, 0.5)
+        other = cPickle.loads(cPickle.dumps(self.l, cPickle.HIGHEST_PROTOCOL))
+        self.l.do_inc_decrs(c, w, [lambda k: k[1] == w,
+                                   lambda k: k[0] == c])
+        other.increase_pair_decrease_other(c, w)
+        self.assertEqual(other.base, self.l.base)
+        self.assertEqual(other.word_for(c), self.l.word_for(c))
+
+    def test_pickle(self):
+        w = Word.get_random()
+        self.l.add_element(0, w, 0.8)
+        self.l.add_element(1, w, 0.7)
+        l2 = cPickle.loads(cPickle.dumps(self.l, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(self.l.base, l2.base)
+        self.assertEqual(0, l2.category_for(w))
+        self.assertEqual(w, l2.word_for(1))
+        self.assertEqual(set([w]), l2.F)
+
+    def test_old_pickle(self):
+        w = Word.get_random()
+        l2 = Lexicon.__new__(Lexicon)
+        l2.__setstate__({"base": {(0, w): 0.8, (1, w): 0.7}, "F": set([w])})
+        self.assertEqual(0, l2.category_for(w))
+        self.assertEqual(0.7, l2.strength(1, w))
+
 
 if __name__ == '__main__':
     unittest.main()
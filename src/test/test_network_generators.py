@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from cog_abm.extras.network_generators import (lattice, ring,
+    watts_strogatz, barabasi_albert, stochastic_block)
+
+
+def edge_set(top):
+    return set((i, int(j)) for i in xrange(len(top))
+               for j in top.neighbors_index(i))
+
+
+class TestNetworkGenerators(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(7)
+
+    def check_simple(self, top):
+        edges = edge_set(top)
+        self.assertEqual(len(edges), len(top.indices))
+        for i, j in edges:
+            self.assertNotEqual(i, j)
+            self.assertTrue((j, i) in edges)
+
+    def test_lattice(self):
+        top = lattice((3, 4))
+        self.check_simple(top)
+        self.assertEqual([1, 4, 6, 9], sorted(top.neighbors(5)))
+        self.assertEqual(2, top.degree(0))
+        top = lattice((3, 4), periodic=True)
+        self.check_simple(top)
+        self.assertTrue(all(top.degree(i) == 4 for i in xrange(12)))
+
+    def test_ring(self):
+        top = ring(10, 4)
+        self.check_simple(top)
+        self.assertEqual([1, 2, 8, 9], sorted(top.neighbors(0)))
+        self.assertRaises(ValueError, ring, 10, 3)
+
+    def test_watts_strogatz(self):
+        self.assertEqual(edge_set(ring(20, 4)),
+                         edge_set(watts_strogatz(20, 4, 0., self.rng)))
+        top = watts_strogatz(200, 4, 0.3, self.rng)
+        self.check_simple(top)
+        self.assertTrue(350 < len(top.indices) / 2 <= 400)
+
+    def test_barabasi_albert(self):
+        top = barabasi_albert(500, 3, self.rng)
+        self.check_simple(top)
+        self.assertEqual(3 + 496 * 3, len(top.indices) / 2)
+        self.assertTrue(min(top.degree(i) for i in xrange(500)) >= 1)
+
+    def test_stochastic_block(self):
+        top = stochastic_block([30, 20], [[1., 0.], [0., 1.]], self.rng)
+        self.check_simple(top)
+        self.assertEqual(29, top.degree(0))
+        self.assertEqual(19, top.degree(45))
+
+        top = stochastic_block([300, 200], [[0.1, 0.01], [0.01, 0.2]],
+                               self.rng)
+        self.check_simple(top)
+        expected = 0.1 * 300 * 299 / 2 + 0.01 * 300 * 200 + 0.2 * 200 * 199 / 2
+        self.assertTrue(abs(len(top.indices) / 2 - expected) < 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import sys
+sys.path.append('../')
+import os
+import shutil
+import tempfile
+import unittest
+import xml.dom.minidom
+
+from cog_abm.core.environment import Environment, ArrayEnvironment
+from cog_abm.extras.parser import Parser
+
+CHIP = """
+    <munsell_chip%s>
+        <L>%f</L>
+        <a>%f</a>
+        <b>%f</b>
+    </munsell_chip>"""
+
+
+class TestParseEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.env_file = os.path.join(self.dir, "env.xml")
+        with open(self.env_file, "w") as f:
+            f.write('<?xml version="1.0" ?><environment type="CIELab">')
+            for i in xrange(5):
+                weight = ' weight="3"' if i == 0 else ''
+                f.write(CHIP % (weight, 10. * i, i, -i))
+            f.write('</environment>')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def env_element(self, params="", attrs=""):
+        doc = '<environment name="global" source="%s" %s>' \
+              '<params>%s</params></environment>' % \
+              (self.env_file, attrs, params)
+        return xml.dom.minidom.parseString(doc).firstChild
+
+    def test_plain(self):
+        env = Parser().parse_environment(self.env_file)
+        self.assertTrue(type(env) is Environment)
+        self.assertEqual(5, len(env.stimuli))
+        self.assertEqual([3., 1., 1., 1., 1.], env.weights)
+        self.assertEqual([20., 2., -2.], env.stimuli[2].get_values())
+
+    def test_array_with_buffer(self):
+        main_sock = self.env_element('<distance value="5"/>'
+            '<representation value="array"/><context_buffer value="10"/>')
+        env = Parser().parse_environment(self.env_file, main_sock)
+        self.assertTrue(isinstance(env, ArrayEnvironment))
+        self.assertEqual(5., env.stimuli_chooser.distance)
+        self.assertEqual(3, len(env.get_stimuli(3)))
+        self.assertEqual(1, len(env.context_buffers))
+
+    def test_params_without_distance(self):
+        for params in ['<representation value="array"/>',
+                       '<metric value="CIE94"/>',
+                       '<context_buffer value="10"/>']:
+            env = Parser().parse_environment(self.env_file,
+                                             self.env_element(params))
+            self.assertFalse(env.stimuli_chooser.use_distance)
+            for _ in xrange(20):
+                context = env.get_stimuli(3)
+                self.assertEqual(3, len(context))
+                self.assertTrue(all(s in env.stimuli for s in context))
+
+    def test_metric(self):
+        main_sock = self.env_element('<metric value="CIE94"/>')
+        env = Parser().parse_environment(self.env_file, main_sock)
+        self.assertTrue(isinstance(env, ArrayEnvironment))
+        self.assertEqual("CIE94", env.metric)
+        self.assertEqual((5, 5), env.distance_table.shape)
+
+        shared = os.path.join(self.dir, "shared")
+        main_sock = self.env_element('<metric value="CIE94"/>',
+                                     'shared="%s"' % shared)
+        env = Parser().parse_environment(self.env_file, main_sock)
+        attached = Parser().parse_environment(self.env_file, main_sock)
+        self.assertEqual("CIE94", attached.metric)
+        self.assertEqual(env.distance_table.tolist(),
+                         attached.distance_table.tolist())
+        self.assertRaises(ValueError, Parser().parse_environment,
+            self.env_file, self.env_element('<metric value="CIEDE2000"/>',
+                                            'shared="%s"' % shared))
+
+    def test_shared(self):
+        shared = os.path.join(self.dir, "shared")
+        main_sock = self.env_element(attrs='shared="%s"' % shared)
+        env = Parser().parse_environment(self.env_file, main_sock)
+        self.assertTrue(ArrayEnvironment.is_published(shared))
+
+        os.remove(self.env_file)
+        attached = Parser().parse_environment(self.env_file, main_sock)
+        self.assertEqual(env.values.tolist(), attached.values.tolist())
+        self.assertEqual(env.weights, attached.weights)
+        self.assertFalse(attached.distance_table.flags.writeable)
+        self.assertAlmostEqual((100 + 1 + 1) ** 0.5,
+            attached.stimuli[0].distance(attached.stimuli[1]))
+
+    def test_shared_other_source(self):
+        shared = os.path.join(self.dir, "shared")
+        main_sock = self.env_element(attrs='shared="%s"' % shared)
+        Parser().parse_environment(self.env_file, main_sock)
+        self.assertTrue(Parser().parse_environment(self.env_file, main_sock)
+                        .shared_path)
+
+        # the same file with other chips
+        with open(self.env_file, "w") as f:
+            f.write('<?xml version="1.0" ?><environment type="CIELab">')
+            f.write(CHIP % ('', 1., 2., 3.))
+            f.write('</environment>')
+        self.assertRaises(ValueError, Parser().parse_environment,
+                          self.env_file, main_sock)
+
+        # published without description of source
+        os.remove(os.path.join(shared, ArrayEnvironment.SOURCE_FILE))
+        self.assertRaises(ValueError, Parser().parse_environment,
+                          self.env_file, main_sock)
+
+
+class TestParseSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        env_file = os.path.join(self.dir, "env.xml")
+        with open(env_file, "w") as f:
+            f.write('<?xml version="1.0" ?><environment type="CIELab">')
+            for i in xrange(5):
+                f.write(CHIP % ('', 10. * i, i, -i))
+            f.write('</environment>')
+        self.sim_file = os.path.join(self.dir, "sim.xml")
+        with open(self.sim_file, "w") as f:
+            f.write('<simulation><history freq="10"/>'
+                '<network generator="ring" n="12" k="4"/>'
+                '<environment name="global" source="%s"/>'
+                '<interaction type="DiscriminationGame"/></simulation>'
+                % env_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_generated_network(self):
+        params = Parser().parse_simulation(self.sim_file)
+        agents, network = params["agents"], params["topology"]
+        self.assertEqual(12, len(agents))
+        self.assertEqual(12, len(network))
+        for _ in xrange(20):
+            neighbour = network.get_random_neighbour(agents[0])
+            self.assertTrue(neighbour in [agents[i] for i in (1, 2, 10, 11)])
+
+    def test_edge_list_network(self):
+        edges = os.path.join(self.dir, "edges.txt")
+        with open(edges, "w") as f:
+            f.write("0 1\n1 2\n")
+        with open(self.sim_file) as f:
+            sim = f.read()
+        with open(self.sim_file, "w") as f:
+            f.write(sim.replace('generator="ring" n="12" k="4"',
+                                'source="%s" format="edgelist"' % edges))
+        params = Parser().parse_simulation(self.sim_file)
+        agents, network = params["agents"], params["topology"]
+        self.assertEqual(3, len(agents))
+        self.assertEqual(agents[1], network.get_random_neighbour(agents[0]))
+
+    def test_cv_monitor(self):
+        params = Parser().parse_simulation(self.sim_file)
+        self.assertTrue(params["cv_monitor"] is None)
+        with open(self.sim_file) as f:
+            sim = f.read()
+        with open(self.sim_file, "w") as f:
+            f.write(sim.replace('<history freq="10"/>', '<history freq="10"/>'
+                                '<cv_monitor every="5" width="0.1"/>'))
+        params = Parser().parse_simulation(self.sim_file)
+        self.assertEqual({"every": 5, "width": 0.1}, params["cv_monitor"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import sys
+sys.path.append('../')
+import unittest
+import random
+
+from cog_abm.extras.sampling import alias_table, AliasSampler
+
+
+class TestAliasTable(unittest.TestCase):
+
+    def test_probabilities(self):
+        weights = [1., 2., 0., 5.]
+        prob, alias = alias_table(weights)
+        n = len(weights)
+        got = [0.] * n
+        for i in xrange(n):
+            got[i] += prob[i] / n
+            got[alias[i]] += (1. - prob[i]) / n
+        for g, w in zip(got, weights):
+            self.assertAlmostEqual(w / sum(weights), g)
+
+    def test_wrong_weights(self):
+        self.assertRaises(ValueError, alias_table, [])
+        self.assertRaises(ValueError, alias_table, [0., 0.])
+        self.assertRaises(ValueError, alias_table, [1., -1., 2.])
+
+
+class TestAliasSampler(unittest.TestCase):
+
+    def test_zero_weight_never_drawn(self):
+        sampler = AliasSampler([0., 3., 0., 1.])
+        random.seed(3)
+        counts = [0] * 4
+        for _ in xrange(4000):
+            counts[sampler.sample()] += 1
+        self.assertEqual(0, counts[0])
+        self.assertEqual(0, counts[2])
+        self.assertTrue(counts[1] > 2 * counts[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
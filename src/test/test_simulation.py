@@ -1,5 +1,6 @@
 import sys
 sys.path.append('../')
+import cPickle
 import unittest
 from cog_abm.core.simulation import *
 
@@ -9,6 +10,83 @@ class TestSimulation(unittest.TestCase):
     def setUp(self):
         pass
 
+    def test_monitor(self):
+        from cog_abm.core.agent import Agent
+        from cog_abm.core.interaction import Interaction
+        from cog_abm.extras.additional_tools import generate_simple_network
+
+        class NoInteraction(Interaction):
+
+            def num_agents(self):
+                return 1
+
+            def interact(self, a):
+                pass
+
+        calls = []
+        agents = [Agent() for _ in xrange(3)]
+        simulation = Simulation(generate_simple_network(agents),
+            NoInteraction(), agents,
+            monitor=lambda it, ags: calls.append((it, len(ags))))
+        simulation.dump_often = False
+        simulation.run(20, 5)
+        self.assertEqual([(i, 3) for i in xrange(0, 21, 5)], calls)
+
+
+class TestRewiringSimulation(unittest.TestCase):
+
+    def test_topology_versions(self):
+        from cog_abm.core.agent import Agent
+        from cog_abm.core.interaction import Interaction
+        from cog_abm.core.rewiring import Rewiring
+        from cog_abm.extras.additional_tools import generate_simple_network
+        from cog_abm.extras.network_generators import ring
+
+        class CountingInteraction(Interaction):
+            count = 0
+
+            def num_agents(self):
+                return 2
+
+            def interact(self, a, b):
+                CountingInteraction.count += 1
+
+        agents = [Agent() for _ in xrange(10)]
+        network = generate_simple_network(agents, ring(10, 2))
+        simulation = Simulation(network, CountingInteraction(), agents,
+            rewiring=Rewiring(4, remove_prob=0.3, add_rate=1., seed=2))
+        simulation.dump_often = False
+        res = simulation.run(20, 10)
+        self.assertEqual(20, CountingInteraction.count)
+        self.assertEqual([(0, 0), (10, 2), (20, 5)],
+                         simulation.topology_history)
+        self.assertEqual([0, 2, 5], [s.topology_version for s in res])
+        it, snapshot_agents = res[1]
+        self.assertEqual(10, it)
+        loaded = cPickle.loads(cPickle.dumps(res[1], 2))
+        self.assertEqual((10, 2), (loaded[0], loaded.topology_version))
+
+
+    def test_isolated_agents(self):
+        from cog_abm.core.agent import Agent
+        from cog_abm.core.interaction import Interaction
+        from cog_abm.core.network import Network
+        from cog_abm.core.topology import DynamicTopology
+
+        class PairInteraction(Interaction):
+            def num_agents(self):
+                return 2
+
+        agents = [Agent() for _ in xrange(4)]
+        network = Network(DynamicTopology(4, [(0, 1)]))
+        for i, a in enumerate(agents):
+            network.add_agent(a, i)
+        simulation = Simulation(network, PairInteraction(), agents)
+        for _ in xrange(20):
+            self.assertEqual(set(agents[:2]),
+                             set(simulation._choose_agents()))
+        network.graph.remove_edge(0, 1)
+        self.assertRaises(Exception, simulation._choose_agents)
 
 
 class TestMultiThreadSimulation(unittest.TestCase):
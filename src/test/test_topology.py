@@ -0,0 +1,214 @@
+import random
+import unittest
+
+import numpy as np
+from pygraph.classes.graph import graph
+from pygraph.readwrite import markup
+
+from cog_abm.core.network import Network
+from cog_abm.core.topology import (CSRTopology, CompleteTopology,
+    DynamicTopology)
+from cog_abm.core.rewiring import Rewiring
+
+
+def ring_graph(n):
+    g = graph()
+    g.add_nodes(range(n))
+    for i in xrange(n):
+        g.add_edge((i, (i + 1) % n))
+    return g
+
+
+class TestCSRTopology(unittest.TestCase):
+
+    def setUp(self):
+        self.top = CSRTopology.from_edges(["a", "b", "c", "d"],
+                                          [(0, 1), (1, 2), (2, 0)])
+
+    def test_neighbors(self):
+        self.assertEqual(["b", "c"], sorted(self.top.neighbors("a")))
+        self.assertEqual(2, self.top.degree("c"))
+        self.assertEqual([], self.top.neighbors("d"))
+        for _ in xrange(20):
+            self.assertTrue(self.top.random_neighbor("b") in ("a", "c"))
+        self.assertRaises(ValueError, self.top.random_neighbor, "d")
+
+    def test_random_neighbors_index(self):
+        nodes = np.array([0, 1, 2] * 100)
+        chosen = self.top.random_neighbors_index(nodes)
+        self.assertTrue((chosen != nodes).all())
+        self.assertTrue((chosen < 3).all())
+        self.assertEqual(set([1, 2]), set(chosen[nodes == 0]))
+        self.assertRaises(ValueError, self.top.random_neighbors_index, [3])
+
+    def test_from_pygraph_and_markup(self):
+        g = ring_graph(6)
+        for top in [CSRTopology.from_pygraph(g),
+                    CSRTopology.read_markup(markup.write(g))]:
+            self.assertEqual(6, len(top))
+            for node in g.nodes():
+                self.assertEqual(sorted(str(x) for x in g.neighbors(node)),
+                    sorted(str(x) for x in top.neighbors(top.nodes()[
+                        [str(x) for x in top.nodes()].index(str(node))])))
+
+
+    def test_weighted(self):
+        g = ring_graph(4)
+        g.set_edge_weight((0, 1), 9)
+        for top in [CSRTopology.from_pygraph(g),
+                    CSRTopology.read_markup(markup.write(g))]:
+            zero = top.nodes()[[str(x) for x in top.nodes()].index("0")]
+            chosen = [str(top.random_neighbor(zero)) for _ in xrange(2000)]
+            self.assertTrue(1600 < chosen.count("1") < 1950)
+            self.assertEqual(set(["1", "3"]), set(chosen))
+
+            nodes = np.repeat(top.index(zero), 2000)
+            chosen = [str(top.names[j])
+                      for j in top.random_neighbors_index(nodes)]
+            self.assertTrue(1600 < chosen.count("1") < 1950)
+
+    def test_zero_weight(self):
+        top = CSRTopology.from_edges(3, [(0, 1), (0, 2)], weights=[0., 1.])
+        self.assertTrue(all(top.random_neighbor(0) == 2 for _ in xrange(50)))
+        self.assertTrue((top.random_neighbors_index([0] * 50) == 2).all())
+        self.assertEqual(0, top.random_neighbor(1))
+
+
+class TestCompleteTopology(unittest.TestCase):
+
+    def test_neighbors(self):
+        top = CompleteTopology(5)
+        self.assertEqual([0, 1, 3, 4], list(top.neighbors(2)))
+        self.assertEqual(4, top.degree(0))
+        for _ in xrange(50):
+            self.assertNotEqual(3, top.random_neighbor(3))
+        nodes = np.arange(5).repeat(50)
+        chosen = top.random_neighbors_index(nodes)
+        self.assertTrue((chosen != nodes).all())
+        self.assertEqual(set(range(5)), set(chosen))
+        self.assertRaises(KeyError, top.index, 5)
+
+
+class TestDynamicTopology(unittest.TestCase):
+
+    def test_changes(self):
+        top = DynamicTopology.from_topology(CompleteTopology(4))
+        self.assertEqual(6, top.num_edges())
+        top.remove_edge(0, 1)
+        top.remove_edge(3, 0)
+        self.assertEqual([2], top.neighbors(0))
+        self.assertEqual([0, 1, 3], sorted(top.neighbors(2)))
+        self.assertFalse(top.has_edge_index(1, 0))
+        self.assertTrue(top.add_edge(1, 0))
+        self.assertFalse(top.add_edge(0, 1))
+        self.assertFalse(top.add_edge(2, 2))
+        self.assertEqual(set([(0, 1), (0, 2), (1, 2), (1, 3), (2, 3)]),
+                         set(map(tuple, top.edges_array())))
+        for _ in xrange(20):
+            self.assertTrue(top.random_neighbor(3) in (1, 2))
+        self.assertEqual(set([1, 2]),
+                         set(top.random_neighbors_index([0] * 50)))
+
+    def test_weights(self):
+        top = DynamicTopology.from_topology(CSRTopology.from_edges(
+            4, [(0, 1), (0, 2), (0, 3)], weights=[0., 1., 3.]))
+        self.assertEqual([0., 1., 3.], top.adj_weights[0])
+        chosen = [top.random_neighbor(0) for _ in xrange(2000)]
+        self.assertEqual(set([2, 3]), set(chosen))
+        self.assertTrue(1300 < chosen.count(3) < 1700)
+        chosen = top.random_neighbors_index([0] * 2000).tolist()
+        self.assertTrue(1300 < chosen.count(3) < 1700)
+        top.remove_edge(0, 1)
+        self.assertEqual([3., 1.], top.adj_weights[0])
+        self.assertEqual([3, 2], top.neighbors(0))
+        self.assertTrue(top.add_edge(1, 0, 0.))
+        self.assertEqual(0, top.random_neighbor(1))
+        self.assertEqual(None,
+            DynamicTopology.from_topology(CompleteTopology(3)).adj_weights)
+
+    def test_big_complete(self):
+        class Limited(DynamicTopology):
+            MAX_COMPLETE_EDGES = 10
+        self.assertEqual(10, Limited.from_topology(
+            CompleteTopology(5)).num_edges())
+        self.assertRaises(ValueError, Limited.from_topology,
+                          CompleteTopology(6))
+
+    def test_rewiring(self):
+        network = Network(ring_graph(10))
+        agents = ["agent%d" % i for i in xrange(10)]
+        for i, a in enumerate(agents):
+            network.add_agent(a, i)
+        rewiring = Rewiring(1, remove_prob=0.2, add_rate=2., move_prob=0.3,
+                            seed=4)
+        rewiring.prepare(network)
+        for version in xrange(1, 21):
+            rewiring.apply(network, agents)
+            self.assertEqual(version, network.graph.version)
+            top = network.graph
+            for i in xrange(10):
+                for j in top.neighbors_index(i):
+                    self.assertTrue(i in top.neighbors_index(j))
+            self.assertEqual(10, sum(len(n) for n in network.nodes.values()))
+            for a in agents:
+                self.assertTrue(a in network.nodes[network.agents[a]].agents)
+
+
+    def test_seeded_moves(self):
+        placements = []
+        for _ in xrange(2):
+            network = Network(ring_graph(10))
+            agents = ["agent%d" % i for i in xrange(10)]
+            for i, a in enumerate(agents):
+                network.add_agent(a, i)
+            rewiring = Rewiring(1, move_prob=0.5, seed=7)
+            rewiring.prepare(network)
+            random.seed(1)
+            state = random.getstate()
+            for _ in xrange(10):
+                rewiring.apply(network, agents)
+            self.assertEqual(state, random.getstate())
+            placements.append([network.agents[a] for a in agents])
+        self.assertEqual(placements[0], placements[1])
+        self.assertNotEqual(range(10), placements[0])
+
+
+class TestNetwork(unittest.TestCase):
+
+    def test_pygraph_network(self):
+        network = Network(ring_graph(5))
+        for i in xrange(5):
+            network.add_agent("agent%d" % i, i)
+        for _ in xrange(20):
+            neighbour = network.get_random_neighbour("agent0")
+            self.assertTrue(neighbour in ("agent1", "agent4"))
+        self.assertEqual([1, 4], sorted(network.get_neighbour_nodes(0)))
+
+    def test_batch(self):
+        network = Network(CompleteTopology(4))
+        agents = ["agent%d" % i for i in xrange(4)]
+        for i, a in enumerate(agents):
+            network.add_agent(a, i)
+        firsts = agents * 25
+        for a, b in zip(firsts, network.get_random_neighbour_batch(firsts)):
+            self.assertNotEqual(a, b)
+
+    def test_batch_sparse(self):
+        network = Network(ring_graph(10))
+        # nodes 1, 3, 8 and 9 are empty
+        for a, node in [("a", 0), ("b", 2), ("c", 4), ("d", 5), ("e", 6),
+                        ("f", 7)]:
+            network.add_agent(a, node)
+        expected = {"c": "d", "d": "ce", "e": "df", "f": "e"}
+        firsts = sorted(expected) * 40
+        chosen = network.get_random_neighbour_batch(firsts)
+        for a, b in zip(firsts, chosen):
+            self.assertTrue(b in expected[a])
+        self.assertEqual(set("df"), set(b for a, b in zip(firsts, chosen)
+                                        if a == "e"))
+        self.assertRaises(ValueError, network.get_random_neighbour_batch,
+                          ["c", "a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
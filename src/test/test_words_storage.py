@@ -4,10 +4,17 @@ Created on Dec 29, 2012
 
 @author: mlukasik
 '''
+import os
+import shutil
 import sys
+import tempfile
 sys.path.append('../')
 import unittest
-from cog_abm.extras.words_storage import get_agents_words, convert2numerical
+import numpy as np
+from cog_abm.extras.words_storage import get_agents_words, convert2numerical, \
+    naming_matrix, mode_names, consensus, synonymy, category_matrix, \
+    load_categories, store_classification, CATEGORIES_FILE, WORDS_FILE
+from cog_abm.extras.color import Color
 
 
 class TestGetAgentsWords(unittest.TestCase):
@@ -41,6 +48,87 @@ class TestGetAgentsWords(unittest.TestCase):
         self.assertEqual(get_agents_words(agents, colour_order),
                          expected_result)
 
+class TestNamingMatrix(unittest.TestCase):
+
+    def setUp(self):
+        # agent k names colour c with its parity, agent 2 doesn't know
+        # name of colours 0 and 1
+        self.agents = [TestGetAgentsWords.Agent() for _ in xrange(3)]
+        for agent in self.agents:
+            for col in xrange(6):
+                agent.namings[col] = str(col % 2)
+        self.agents[2].namings[0] = self.agents[2].namings[1] = None
+
+    def test_matrix(self):
+        matrix, words = naming_matrix(self.agents, range(6))
+        self.assertEqual(np.int32, matrix.dtype)
+        self.assertEqual((3, 6), matrix.shape)
+        for row, agent in zip(matrix, self.agents):
+            self.assertEqual([agent.namings[c] for c in xrange(6)],
+                             [None if w == -1 else words[w] for w in row])
+
+    def test_statistics(self):
+        matrix, words = naming_matrix(self.agents, range(6))
+        names, fractions = mode_names(matrix)
+        self.assertEqual(["0", "1"] * 3, [words[w] for w in names])
+        self.assertEqual([2. / 3] * 2 + [1.] * 4, fractions.tolist())
+        self.assertEqual([1] * 6, synonymy(matrix).tolist())
+        self.assertAlmostEqual((2 * (1. / 3) + 4 * 1.) / 6, consensus(matrix))
+
+        self.agents[0].namings[5] = "2"
+        matrix, words = naming_matrix(self.agents, range(6))
+        self.assertEqual(2, synonymy(matrix)[5])
+        self.assertEqual(2. / 3, mode_names(matrix)[1][5])
+
+
+class TestCategoryMatrix(unittest.TestCase):
+
+    class Agent(object):
+        """ Agent with integer categories, naming category k with "w<k>" """
+        def __init__(self, aid, categories):
+            self.id = aid
+            self.categories = categories
+            self.state = self
+        def sense(self, stimulus):
+            return stimulus
+        def sense_and_classify(self, stimulus):
+            return self.categories[stimulus.L]
+        def word_for(self, category):
+            return None if category is None else "w%s" % category
+
+    def setUp(self):
+        self.colours = [Color(i, 0, 0) for i in xrange(5)]
+        self.agents = [self.Agent(1, [0, 0, 1, 2, 2]),
+                       self.Agent(2, [None] * 5)]
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_matrix(self):
+        matrix = category_matrix(self.agents, self.colours)
+        self.assertEqual(np.int32, matrix.dtype)
+        self.assertEqual([[0, 0, 1, 2, 2], [-1] * 5], matrix.tolist())
+        self.assertEqual(naming_matrix(self.agents, self.colours)[0].tolist(),
+            naming_matrix(self.agents, self.colours, matrix)[0].tolist())
+
+    def test_store_and_load(self):
+        prefix = os.path.join(self.dir, "10")
+        matrix = store_classification(self.agents, self.colours, prefix)
+        self.assertTrue(os.path.exists(prefix + WORDS_FILE))
+        # columns are matched by values of stimuli
+        stimuli = [self.colours[3], Color(0, 0, 0)]
+        self.assertEqual(matrix[:, [3, 0]].tolist(),
+            load_categories(prefix + CATEGORIES_FILE, self.agents,
+                            stimuli).tolist())
+        self.assertEqual(None, load_categories(prefix + CATEGORIES_FILE,
+            self.agents, [Color(7, 0, 0)]))
+        self.assertEqual(None, load_categories(prefix + CATEGORIES_FILE,
+            self.agents[::-1], self.colours))
+        self.assertEqual(None, load_categories(prefix + "x.npz",
+            self.agents, self.colours))
+
+
 class TestConvert2numerical(unittest.TestCase):
 
     def test_simple(self):